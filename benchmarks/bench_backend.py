@@ -0,0 +1,147 @@
+# Time to first token in the simulator with the endpoints of backend.py:
+#   cloud     only the API, the mock answering after 300 ms like the cloud
+#   lan       a LAN server answering after 50 ms listed before the cloud
+#   failover  the LAN server down, the cloud takes over before the first
+#             token, and the next prompt goes straight to the cloud
+#   dropped   the LAN server takes the connection but drops every request,
+#             the request fails over after it was sent
+#   unreachable  the LAN server never answers the connect, with the default
+#             timeouts. The cloud must take over after the connect timeout,
+#             not the read timeout.
+# Every prompt must come back complete, from the endpoint expected.
+#
+#   python benchmarks/bench_backend.py [--rate 100]
+import argparse
+import asyncio
+import os
+import re
+import socket
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from simulator import Board, MockAPI, load_events, socketpool  # noqa: E402
+from bench_e2e import CAPTURE, ENVIRONMENT, submit  # noqa: E402
+from http_client import CONNECT_TIMEOUT  # noqa: E402
+
+LAN_HOST = "192.168.43.10"
+LAN_PORT = 8080
+LAN = {
+    "API_ENDPOINTS": "lan,openai",
+    "API_LAN_URL": "http://%s:%d/v1/chat/completions" % (LAN_HOST, LAN_PORT),
+    "API_LAN_MODEL": "llama-3-8b-instruct",
+    "API_LAN_TIMEOUT": "2",
+}
+PROMPTS = ("Write a haiku about keyboards", "Write a haiku about screens")
+
+
+def closed_port():
+    # A port nothing listens on, connecting is refused
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class FullServer:
+    # Never accepts, once its backlog is full connecting hangs like with a
+    # host that is down
+    def __init__(self):
+        self._listener = socket.socket()
+        self._listener.bind(("127.0.0.1", 0))
+        self._listener.listen(0)
+        self.port = self._listener.getsockname()[1]
+        self._waiting = socket.create_connection(("127.0.0.1", self.port))
+
+    def close(self):
+        self._waiting.close()
+        self._listener.close()
+
+
+class DroppingServer:
+    # Accepts connections and closes them once a request comes in
+    def __init__(self):
+        self._listener = socket.socket()
+        self._listener.bind(("127.0.0.1", 0))
+        self._listener.listen(4)
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._drop, args=(conn,), daemon=True).start()
+
+    def _drop(self, conn):
+        conn.recv(1)
+        conn.close()
+
+    def close(self):
+        self._listener.close()
+
+
+async def run(name, events, rate):
+    cloud = MockAPI(events, rate, first_token_delay=0.3)
+    lan = MockAPI(events, rate, first_token_delay=0.05)
+    environment = dict(ENVIRONMENT)
+    if name != "cloud":
+        environment.update(LAN)
+    if name == "unreachable":
+        del environment["API_LAN_TIMEOUT"]
+    board = Board(cloud, environment)
+    dropping = DroppingServer()
+    full = FullServer()
+    lan_port = {"lan": lan.port, "dropped": dropping.port, "unreachable": full.port}.get(name) or closed_port()
+    socketpool.ROUTES[(LAN_HOST, LAN_PORT)] = ("127.0.0.1", lan_port)
+    await board.start()
+    results = []
+    for prompt in PROMPTS:
+        board.reset()
+        submitted = await submit(board, prompt)
+        if not await board.idle():
+            raise RuntimeError("%s didn't finish:\n%s" % (name, board.output.getvalue()[-2000:]))
+        results.append(round((board.arrivals[0] - submitted) * 1e3, 1))
+    await board.stop()
+    cloud.close()
+    lan.close()
+    dropping.close()
+    full.close()
+    output = board.output.getvalue()
+    endpoints = re.findall(r"Time to first token from (\w+):", output)
+    assert "Request failed" not in output, output[-2000:]
+    # Connecting ahead of time finds the server down before the prompt does
+    return results, endpoints, output.count("No answer from") + output.count("Couldn't connect to")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=100, help="tokens per second from the mock APIs")
+    args = parser.parse_args()
+    events = load_events(CAPTURE)
+    expected = {"cloud": ["openai", "openai"], "lan": ["lan", "lan"],
+                "failover": ["openai", "openai"], "dropped": ["openai", "openai"],
+                "unreachable": ["openai", "openai"]}
+    print("  scenario     ttft ms         endpoints        failed attempts")
+    for name in ("cloud", "lan", "failover", "dropped", "unreachable"):
+        start = time.perf_counter()
+        ttft, endpoints, failures = asyncio.run(run(name, events, args.rate))
+        assert endpoints == expected[name], (name, endpoints)
+        # Only the first prompt tries the LAN server while it is down
+        assert failures == (1 if name in ("failover", "dropped", "unreachable") else 0), failures
+        if name == "unreachable":
+            assert ttft[0] < (CONNECT_TIMEOUT + 1) * 1e3, ttft
+        print("  %-11s  %-14s  %-15s  %d  (%.1f s)" % (
+            name, "/".join("%.0f" % t for t in ttft), ",".join(endpoints), failures,
+            time.perf_counter() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
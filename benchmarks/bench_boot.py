@@ -0,0 +1,121 @@
+# Boot of code.py in the simulator, with Wi-Fi that takes its time like the
+# real one: 1 s to join, plus 1.5 s scanning for the network when there is
+# no cached access point to go to. Keys are typed from the moment code.py
+# starts, by a thread like the keyboard Pico would, a report every 30 ms
+# like a fast typist, and must come out the other end while Wi-Fi comes up.
+# While an attempt blocks they wait in the UART buffer.
+#   scan      first boot, the access point is found by scanning
+#   cached    the next boot, connecting straight to the cached access point
+#   no wifi   the network only shows up after three failed attempts
+#   no range  no network at all. Wi-Fi must give up after its rounds and only
+#             try again, and connect, once a prompt is sent.
+# Stages are in ms from the end of the imports, forwarding as p50/max ms.
+#
+#   python benchmarks/bench_boot.py
+import asyncio
+import os
+import shutil
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from simulator import Board, MockAPI, load_events, report, type_reports, chord_reports, LEFT_GUI, ENTER  # noqa: E402
+from bench_e2e import CAPTURE, ENVIRONMENT  # noqa: E402
+from framing import cobs_encode  # noqa: E402
+
+CONNECT_SECONDS = 1.0
+SCAN_SECONDS = 1.5
+STAGES = ("keyboard", "first_key", "display", "features", "wifi", "online")
+KEY_A = 0x04
+KEY_INTERVAL = 0.03
+
+
+class Typing(threading.Thread):
+    # Presses and releases a key on the UART until stopped
+    def __init__(self, board):
+        super().__init__(daemon=True)
+        self.board = board
+        self.stop = threading.Event()
+        self.fed = []
+
+    def run(self):
+        uart = self.board.uart
+        # Drops what comes before the first delimiter, see Board.start
+        uart.feed(b"\x00")
+        i = 0
+        while not self.stop.is_set():
+            uart.feed(cobs_encode(report(0, KEY_A) if i % 2 == 0 else report()))
+            self.fed.append(time.perf_counter())
+            i += 1
+            time.sleep(KEY_INTERVAL)
+
+
+async def give_up(board, typing):
+    # Waits for the rounds to run out, then has a prompt wake Wi-Fi once the
+    # network is there
+    while board.code.wifi_manager is None:
+        await asyncio.sleep(0.01)
+    manager = board.code.wifi_manager
+    while len(board.radio.attempts) < manager.rounds * len(manager.networks):
+        await asyncio.sleep(0.01)
+    attempts = len(board.radio.attempts)
+    await asyncio.sleep(5)
+    assert len(board.radio.attempts) == attempts, "Wi-Fi kept trying"
+    typing.stop.set()
+    typing.join()
+    board.radio.failures = 0
+    await board.feed(chord_reports(LEFT_GUI, ENTER) + type_reports("hi") + chord_reports(LEFT_GUI, ENTER),
+                     KEY_INTERVAL)
+
+
+async def boot(name, api, cache=None):
+    board = Board(api, ENVIRONMENT)
+    board.radio.connect_seconds = CONNECT_SECONDS
+    board.radio.scan_seconds = SCAN_SECONDS
+    if name == "no wifi":
+        board.radio.failures = 3
+    if name == "no range":
+        board.radio.failures = 1000
+    if cache is not None:
+        shutil.copy(cache, os.path.join(board.root, "wifi.txt"))
+    typing = Typing(board)
+    typing.start()
+    await board.start(online=False)
+    if name == "no range":
+        await give_up(board, typing)
+    while not board.state.online:
+        await asyncio.sleep(0.01)
+    # Let the last keys through
+    await asyncio.sleep(0.1)
+    typing.stop.set()
+    typing.join()
+    await asyncio.sleep(0.05)
+    await board.stop()
+    timer = board.code.boot_timer
+    imports = timer.get("imports")
+    stages = [timer.get(stage) - imports for stage in STAGES]
+    latencies = sorted(sent[0] - fed for fed, sent in zip(typing.fed, board.forwarded))
+    assert not board.uart.overruns and len(board.forwarded) >= len(typing.fed) - 1, (
+        board.uart.overruns, len(board.forwarded), len(typing.fed))
+    return board, stages, latencies
+
+
+def main():
+    api = MockAPI(load_events(CAPTURE), 100)
+    print("  boot      " + "".join("%11s" % stage for stage in STAGES) + "  attempts  forwarding")
+    cache = None
+    for name in ("scan", "cached", "no wifi", "no range"):
+        board, stages, latencies = asyncio.run(boot(name, api, None if name == "no range" else cache))
+        cache = os.path.join(board.root, "wifi.txt")
+        print("  %-8s  %s  %8d  %.1f/%.1f" % (
+            name, "".join("%11d" % stage for stage in stages), len(board.radio.attempts),
+            latencies[len(latencies) // 2] * 1e3, latencies[-1] * 1e3))
+    api.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+# Response latency on a cache miss, streamed from a local mock of the API
+# with a realistic delay, against a hit replayed from response_cache. Both
+# go through TextLayout like call_chatgpt and replay_response, and must end
+# up with the same pages. Then fills a small cache with distinct prompts to
+# show the LRU eviction and the counters, and checks that with a TTL the
+# entries of an earlier boot are expired.
+#
+#   python benchmarks/bench_cache.py [capture.sse]
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from http_client import HTTPConnection  # noqa: E402
+from response_cache import ResponseCache, cache_key, iter_tokens, TOKEN_SEPARATOR  # noqa: E402
+from sse import SSEDecoder  # noqa: E402
+from text_layout import TextLayout  # noqa: E402
+from bench_http import Pool  # noqa: E402
+
+# Time to first byte of the mock API and the gap between its chunks
+API_DELAY = 0.4
+CHUNK_DELAY = 0.002
+CHUNK = 256
+ROUNDS = 5
+PROMPT = "Correct any mistakes you find in this text: I has went to the store yesterday."
+
+
+def serve(listener, stream):
+    while True:
+        conn, _ = listener.accept()
+        f = conn.makefile("rb")
+        length = 0
+        line = f.readline()
+        while line not in (b"\r\n", b""):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+            line = f.readline()
+        f.read(length)
+        time.sleep(API_DELAY)
+        conn.sendall(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n")
+        for i in range(0, len(stream), CHUNK):
+            part = stream[i:i + CHUNK]
+            conn.sendall(b"%x\r\n%s\r\n" % (len(part), part))
+            time.sleep(CHUNK_DELAY)
+        conn.sendall(b"0\r\n\r\n")
+        conn.close()
+
+
+async def miss(port):
+    start = time.perf_counter()
+    first = None
+    layout = TextLayout(120, 9, 6)
+    text = []
+    connection = HTTPConnection(Pool, None, "127.0.0.1", port)
+    await connection.request("POST", "/v1/chat/completions", {}, PROMPT.encode())
+    decoder = SSEDecoder()
+    buf = bytearray(512)
+    while True:
+        size = await connection.readinto(buf)
+        if size == 0:
+            break
+        for word in decoder.feed(buf, size):
+            if first is None:
+                first = time.perf_counter() - start
+            layout.add(word)
+            text.append(word + TOKEN_SEPARATOR)
+    connection.close()
+    layout.finish()
+    return first, time.perf_counter() - start, "".join(text), layout.pages
+
+
+def hit(cache, key):
+    start = time.perf_counter()
+    first = None
+    layout = TextLayout(120, 9, 6)
+    text = cache.get(key)
+    for word in iter_tokens(text):
+        if first is None:
+            first = time.perf_counter() - start
+        layout.add(word)
+    layout.finish()
+    return first, time.perf_counter() - start, text, layout.pages
+
+
+def check_ttl(text):
+    key = cache_key("gpt-3.5-turbo", PROMPT)
+    cache = ResponseCache(tempfile.mkdtemp(), ttl=60, boot="first")
+    cache.put(key, text)
+    assert ResponseCache(cache.directory, ttl=60, boot="first").get(key) == text
+    # After a reboot, however far the clock got
+    rebooted = ResponseCache(cache.directory, ttl=60, boot="second")
+    assert rebooted.get(key) is None and len(rebooted) == 0
+    # Without a TTL entries outlive reboots
+    cache.put(key, text)
+    assert ResponseCache(cache.directory, boot="second").get(key) == text
+    # Older than the TTL in the same boot
+    cache.ttl = 0
+    time.sleep(1.1)
+    assert cache.get(key) is None
+
+
+def main(path):
+    with open(path, "rb") as f:
+        stream = f.read()
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(4)
+    threading.Thread(target=serve, args=(listener, stream), daemon=True).start()
+    port = listener.getsockname()[1]
+
+    cache = ResponseCache(tempfile.mkdtemp())
+    key = cache_key("gpt-3.5-turbo", PROMPT)
+    assert cache.get(key) is None
+    first, total, text, pages = asyncio.run(miss(port))
+    cache.put(key, text)
+    print("%s, mock API answers after %d ms" % (os.path.basename(path), API_DELAY * 1e3))
+    print("  miss  first output %7.2f ms  done %7.2f ms" % (first * 1e3, total * 1e3))
+    best = None
+    for _ in range(ROUNDS):
+        result = hit(cache, key)
+        assert result[2] == text and result[3] == pages
+        if best is None or result[1] < best[1]:
+            best = result
+    print("  hit   first output %7.2f ms  done %7.2f ms" % (best[0] * 1e3, best[1] * 1e3))
+
+    # A cache that fits about four responses
+    small = ResponseCache(tempfile.mkdtemp(), max_bytes=4 * (len(text.encode()) + 200))
+    for n in range(10):
+        small.put(cache_key("gpt-3.5-turbo", "prompt %d" % n), text)
+        # Keep the first prompt in use so it survives eviction
+        assert small.get(cache_key("gpt-3.5-turbo", "prompt 0")) is not None
+    assert small.get(cache_key("gpt-3.5-turbo", "prompt 1")) is None
+    assert small.get(cache_key("gpt-3.5-turbo", "prompt 9")) is not None
+    reloaded = ResponseCache(small.directory, max_bytes=small.max_bytes)
+    assert len(reloaded) == len(small) and reloaded.total == small.total
+    print("  lru   %d entries %d bytes, %d hits %d misses %d evictions" % (
+        len(small), small.total, small.hits, small.misses, small.evictions))
+    check_ttl(text)
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "openai_chat_stream.sse")
+    sys.exit(main(path))
@@ -0,0 +1,72 @@
+# Per-report cost of chords.ChordTable.dispatch as the number of registered
+# shortcuts grows, on recorded keyboard reports. The reports are decoded once
+# up front, only dispatch is timed.
+#
+#   python benchmarks/bench_chords.py [capture.hid]
+import os
+import sys
+import time
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from chords import ChordTable, CONTROL, SHIFT, ALT, GUI  # noqa: E402
+from hid_report import ReportDecoder  # noqa: E402
+from bench_framing import load  # noqa: E402
+from bench_hid_report import HID_KEYCODE_TO_CHARACTER, positions  # noqa: E402
+
+ROUNDS = 20
+MODIFIER_SETS = (CONTROL | ALT, GUI, GUI | SHIFT, CONTROL | SHIFT, ALT | SHIFT, CONTROL | ALT | GUI)
+
+
+def table(size):
+    chords = ChordTable()
+    fired = []
+    for n in range(size):
+        modifiers = MODIFIER_SETS[n % len(MODIFIER_SETS)]
+        keycode = 4 + n // len(MODIFIER_SETS)
+        chords.add(modifiers, keycode, fired.append)
+    return chords
+
+
+def decoded(reports):
+    # What dispatch reads of the decoder, after every report
+    keys = ReportDecoder(HID_KEYCODE_TO_CHARACTER)
+    states = []
+    for report in reports:
+        modifier_pos, first_key_pos, last_key_pos = positions(report)
+        keys.decode(report, modifier_pos, first_key_pos, last_key_pos)
+        states.append(types.SimpleNamespace(
+            pressed=bytes(keys.pressed), pressed_count=keys.pressed_count,
+            released=bytes(keys.released), released_count=keys.released_count,
+            current=types.SimpleNamespace(modifiers=keys.current.modifiers)))
+    return states
+
+
+def run(states, chords):
+    dispatch = chords.dispatch
+    for keys in states:
+        dispatch(keys, None)
+
+
+def main(path):
+    reports = [r for r in load(path) if len(r) in (8, 13)]
+    states = decoded(reports)
+    print(os.path.basename(path), len(reports), "keyboard reports")
+    for size in (0, 5, 50, 500):
+        chords = table(size)
+        best = None
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            run(states, chords)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        print("  %3d chords  %6.2f us/report for dispatch" % (size, best * 1e6 / len(reports)))
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "typing_rollover.hid")
+    sys.exit(main(path))
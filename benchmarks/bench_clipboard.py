@@ -0,0 +1,203 @@
+# Clipboard transfer throughput and peak heap, with a CPython client sending
+# over loopback to clipboard.ClipboardReceiver. The old accept_packet did a
+# single recv_into a 512 byte buffer, its row shows how much of each payload
+# made it through.
+#   receive  peak heap while the transfer comes in
+#   to body  peak heap for what code.py does next: the clipboard goes into
+#            the prompt, the prompt into the conversation and out as the
+#            request body, checked to be valid JSON with the clipboard in it
+#   read()   the same the way it was before prompt.py, the whole clipboard
+#            read back into a str
+# A receive that no PC connects to must come back empty, not raise.
+#
+#   python benchmarks/bench_clipboard.py
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from clipboard import ClipboardReceiver, Utf8Decoder, encode_clipboard, ACK  # noqa: E402
+from conversation import Conversation, RequestBody  # noqa: E402
+from prompt import Prompt  # noqa: E402
+
+SIZES = (400, 4000, 64000)
+TEMPLATE = "Correct any mistakes you find in this text: "
+MODEL = "gpt-3.5-turbo"
+ROUNDS = 3
+WORDS = ("def", "return", "self.value", "înțeles", "după", "ștergere", "日本語", "🙂", "\n    ", "x = 1")
+
+
+def payload(size, seed):
+    rng = random.Random(seed)
+    out = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS) + " "
+        out.append(word)
+        length += len(word.encode())
+    return "".join(out)
+
+
+def old_accept_packet(server):
+    # accept_packet before ClipboardReceiver, returns how many bytes it kept
+    buf = bytearray(512)
+    conn, addr = server.accept()
+    size = conn.recv_into(buf, 512)
+    conn.close()
+    return size
+
+
+def send(port, data, segment):
+    # Writes in uneven segments so characters get split between reads
+    rng = random.Random(len(data))
+    client = socket.create_connection(("127.0.0.1", port))
+    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    pos = 0
+    try:
+        while pos < len(data):
+            n = rng.randint(1, segment)
+            client.sendall(data[pos:pos + n])
+            pos += n
+        client.shutdown(socket.SHUT_WR)
+        reply = client.recv(1)
+    except ConnectionResetError:
+        # The old server closes after its single read
+        reply = None
+    client.close()
+    return reply
+
+
+def check_decoder():
+    for seed in range(200):
+        rng = random.Random(seed)
+        data = payload(rng.randint(1, 300), seed).encode()
+        decoder = Utf8Decoder()
+        out = []
+        pos = 0
+        while pos < len(data):
+            n = rng.randint(1, 7)
+            chunk = data[pos:pos + n]
+            out.append(decoder.decode(bytearray(chunk), len(chunk)))
+            pos += n
+        out.append(decoder.finish())
+        assert "".join(out) == data.decode(), seed
+
+
+def check_no_client(server, root):
+    # Nobody connects in time, the transfer fails instead of raising
+    receiver = ClipboardReceiver(spill_dir=os.path.join(root, "clipboard"), timeout=0.2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert asyncio.run(receiver.receive(server)) is None
+
+
+def send_body(conversation):
+    # What http_client does with the body, minus the socket
+    size = 0
+    for piece in RequestBody(conversation, MODEL):
+        size += len(piece)
+    return size
+
+
+def to_body(clipboard, directory):
+    prompt = Prompt()
+    prompt.paste(clipboard)
+    conversation = Conversation(directory=directory)
+    conversation.add("user", prompt.build(TEMPLATE))
+    del prompt
+    send_body(conversation)
+    return conversation
+
+
+def read_to_body(clipboard, directory):
+    selection = clipboard.read()
+    current_prompt = "" + selection
+    conversation = Conversation(directory=directory)
+    conversation.add("user", TEMPLATE + current_prompt)
+    send_body(conversation)
+    conversation.clear()
+
+
+def peak(fn, *args):
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn(*args)
+    return result, tracemalloc.get_traced_memory()[1] - before
+
+
+def run(server, port, data, frame_size, root, legacy=False):
+    receiver = ClipboardReceiver(spill_threshold=4096, spill_dir=os.path.join(root, "clipboard"))
+    wire = data if legacy else encode_clipboard(data, frame_size)
+    replies = []
+    client = threading.Thread(target=lambda: replies.append(send(port, wire, 1400)))
+    # Connect before the clock starts, accept is polled every 50 ms and that
+    # latency isn't what's measured here
+    client.start()
+    time.sleep(0.02)
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        clipboard = asyncio.run(receiver.receive(server))
+    elapsed = time.perf_counter() - start
+    received = tracemalloc.get_traced_memory()[1]
+    directory = os.path.join(root, "context")
+    _, old = peak(read_to_body, clipboard, directory)
+    conversation, new = peak(to_body, clipboard, directory)
+    tracemalloc.stop()
+    client.join()
+    body = json.loads(b"".join(RequestBody(conversation, MODEL)))
+    assert body["messages"][0]["content"] == TEMPLATE + data.decode(), "payload mismatch"
+    assert legacy or replies == [ACK]
+    spilled = clipboard.path
+    conversation.clear()
+    # The conversation took the file over and removed it
+    assert spilled is None or not os.path.exists(spilled)
+    return elapsed, (received, new, old), spilled
+
+
+def main():
+    check_decoder()
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", 0))
+    server.listen(2)
+    port = server.getsockname()[1]
+    root = tempfile.mkdtemp()
+
+    for size in SIZES:
+        data = payload(size, size).encode()
+        server.setblocking(True)
+        client = threading.Thread(target=send, args=(port, data, 1400))
+        client.start()
+        kept = old_accept_packet(server)
+        client.join()
+        print("%6d bytes  old accept_packet kept %d bytes" % (len(data), kept))
+
+        server.setblocking(False)
+        for name, frame_size, legacy in (("raw", 0, True), ("framed", 0, False), ("crc32", 1024, False)):
+            best = None
+            for _ in range(ROUNDS):
+                elapsed, peaks, spilled = run(server, port, data, frame_size, root, legacy)
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, peaks, spilled)
+            elapsed, peaks, spilled = best
+            print("    %-7s %8.0f KB/s  peak heap KB: receive %6.1f  to body %6.1f  read() %6.1f%s" % (
+                (name, len(data) / 1024 / elapsed) + tuple(peak / 1024 for peak in peaks) +
+                ("  (spilled)" if spilled is not None else "",)))
+    check_no_client(server, root)
+    server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
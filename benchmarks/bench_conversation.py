@@ -0,0 +1,87 @@
+# Request body size, serialization time and peak heap over a long session in
+# retained context mode. Old: the whole history in current_prompt, sent as
+# one user message with json.dumps. New: conversation.Conversation under a
+# token budget, serialized piece by piece through RequestBody. Every turn
+# checks that the streamed body is valid JSON of the expected length.
+#
+#   python benchmarks/bench_conversation.py [capture.sse]
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from conversation import Conversation, RequestBody, CONTEXT_TOKENS  # noqa: E402
+from sse import SSEDecoder  # noqa: E402
+
+TURNS = 40
+REPORT = (1, 5, 10, 20, 40)
+MODEL = "gpt-3.5-turbo"
+PROMPT = "Refactor this code, don't write any other comments: def parse(packet): return [k for k in packet[2:8] if k != 0] # turn %d"
+
+
+def old_body(current_prompt):
+    full_prompt = [{"role": "user", "content": current_prompt},]
+    return json.dumps({"model": MODEL, "messages": full_prompt, "stream": True}).encode()
+
+
+def send(body):
+    # What http_client does with a streamed body, minus the socket
+    out = bytearray()
+    sent = 0
+    for piece in body:
+        out.extend(piece)
+        if len(out) >= 1024:
+            sent += len(out)
+            out = bytearray()
+    return sent + len(out)
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main(path):
+    with open(path, "rb") as f:
+        answer = "".join(SSEDecoder().iter_content([f.read()]))
+    print("%d turns, %d character answers, budget %d tokens" % (TURNS, len(answer), CONTEXT_TOKENS))
+    print("  turn   old body   time    peak |  new body   time    peak  messages")
+
+    current_prompt = ""
+    conversation = Conversation(directory=tempfile.mkdtemp())
+    for turn in range(1, TURNS + 1):
+        prompt = PROMPT % turn
+        current_prompt += prompt
+        old = measure(lambda: len(old_body(current_prompt)))
+        current_prompt += answer
+
+        conversation.add("user", prompt)
+        body = RequestBody(conversation, MODEL)
+        new = measure(lambda: send(body))
+        streamed = b"".join(body)
+        assert new[0] == len(body) == len(streamed)
+        messages = json.loads(streamed)["messages"]
+        assert messages[-1] == {"role": "user", "content": prompt}
+        assert messages[0]["role"] == "user"
+        conversation.add("assistant", answer)
+
+        if turn in REPORT:
+            print("  %4d  %7d B %5.2f ms %5.1f KB | %6d B %5.2f ms %5.1f KB  %3d" % (
+                turn, old[0], old[1] * 1e3, old[2] / 1024,
+                new[0], new[1] * 1e3, new[2] / 1024, len(messages)))
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "openai_chat_stream.sse")
+    sys.exit(main(path))
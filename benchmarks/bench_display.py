@@ -0,0 +1,146 @@
+# Screen area redrawn by display_text and display_list, on a fake display.
+# Old: one label for all rows, every update replaces its text, so displayio
+# redraws the union of the old and new text boxes and auto_refresh pushes it.
+# New: row_display.RowDisplay, one label per row, only rows whose text
+# changed are set and redrawn, with one refresh per update. Both must end up
+# showing the same lines.
+#
+#   python benchmarks/bench_display.py [capture.sse]
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from row_display import RowDisplay  # noqa: E402
+from sse import SSEDecoder  # noqa: E402
+from text_layout import TextLayout  # noqa: E402
+from bench_layout import wrap_text_to_pixels, FONT, DISPLAY_WIDTH, SCALE_FACTOR, MAX_ROWS, CHAR_WIDTH  # noqa: E402
+
+ROW_HEIGHT = 15
+TEXT_ROWS = MAX_ROWS + 1
+CHARACTER_LIMIT = 165
+OPTIONS = ["Simple prompt", "Translate", "Refactor", "Document", "Correct"]
+MENU_STEPS = 50
+
+
+class FakeLabel:
+    # Counts the pixels displayio would mark dirty when the text changes
+    def __init__(self):
+        self._text = ""
+        self.updates = 0
+        self.area = 0
+
+    @staticmethod
+    def size(text):
+        lines = text.split("\n") if text else []
+        width = max([len(line) for line in lines] + [0]) * CHAR_WIDTH
+        return width, len(lines) * ROW_HEIGHT
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        old_width, old_height = self.size(self._text)
+        width, height = self.size(text)
+        self.area += max(old_width, width) * max(old_height, height) * SCALE_FACTOR * SCALE_FACTOR
+        self.updates += 1
+        self._text = text
+
+
+def wrap(text):
+    return wrap_text_to_pixels(text[:CHARACTER_LIMIT], max_width=DISPLAY_WIDTH / SCALE_FACTOR, font=FONT)
+
+
+def old_screen():
+    return FakeLabel()
+
+
+def old_text(label, text):
+    label.text = "\n".join(wrap(text))
+
+
+def old_list(label, options, current_option):
+    displayed_options = options.copy()
+    displayed_options[current_option] = options[current_option] + " <-"
+    label.text = "\n".join(displayed_options)
+
+
+def new_screen():
+    return RowDisplay([FakeLabel() for _ in range(TEXT_ROWS)])
+
+
+def new_text(text_area, text):
+    text_area.show_lines(wrap(text))
+
+
+def new_list(text_area, options, current_option):
+    displayed_options = options.copy()
+    displayed_options[current_option] = options[current_option] + " <-"
+    text_area.show_lines(displayed_options)
+
+
+def menu(show_list):
+    current = 0
+    steps = []
+    for i in range(MENU_STEPS):
+        current = (current + (1 if i % 12 < 8 else -1)) % len(OPTIONS)
+        steps.append((show_list, OPTIONS, current))
+    return steps
+
+
+def response(show_text, tokens):
+    layout = TextLayout(DISPLAY_WIDTH / SCALE_FACTOR, MAX_ROWS, CHAR_WIDTH)
+    steps = [(show_text, "Listening for prompt..."), (show_text, "Correct any mistakes you find in this text: ")]
+    for token in tokens:
+        page = layout.add(token)
+        if page is not None:
+            steps.append((show_text, page))
+    steps.append((show_text, layout.finish()))
+    return steps
+
+
+def shown(screen):
+    if isinstance(screen, FakeLabel):
+        return screen.text.split("\n") if screen.text else []
+    lines = [row.text for row in screen.rows]
+    while lines and lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def run(make_screen, steps):
+    screen = make_screen()
+    for step in steps:
+        step[0](screen, *step[1:])
+    if isinstance(screen, FakeLabel):
+        # auto_refresh pushes every change
+        return screen.updates, len(steps), screen.area, shown(screen)
+    rows = screen.rows
+    return screen.updates, screen.refreshes, sum(row.area for row in rows), shown(screen)
+
+
+def main(path):
+    with open(path, "rb") as f:
+        tokens = list(SSEDecoder().iter_content([f.read()]))
+    scenarios = [
+        ("menu", menu(old_list), menu(new_list)),
+        ("response", response(old_text, tokens), response(new_text, tokens)),
+        ("long response", response(old_text, tokens * 8), response(new_text, tokens * 8)),
+    ]
+    print("%s, %d rows of %d px" % (os.path.basename(path), TEXT_ROWS, ROW_HEIGHT * SCALE_FACTOR))
+    print("  scenario       screens | old labels set  refreshes  redrawn      | new labels set  refreshes  redrawn")
+    for name, old_steps, new_steps in scenarios:
+        old = run(old_screen, old_steps)
+        new = run(new_screen, new_steps)
+        assert old[3] == new[3]
+        print("  %-14s %6d  | %14d  %9d  %7.1f Kpx  | %14d  %9d  %7.1f Kpx  x%.1f" % (
+            name, len(old_steps), old[0], old[1], old[2] / 1000, new[0], new[1], new[2] / 1000, old[2] / new[2]))
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "openai_chat_stream.sse")
+    sys.exit(main(path))
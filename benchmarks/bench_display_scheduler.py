@@ -0,0 +1,124 @@
+# Tokens per second through the stream loop while the display draws, with a
+# draw that blocks like an SPI transfer to the ILI9341. Tokens arrive at a
+# fixed rate, like chunks read from the API.
+#   pages:  the old pipeline, a page queued on BoundedQueue(4) when complete
+#   tokens: the same queue fed the page so far after every token
+#   fps:    display_scheduler.DisplayScheduler fed after every token
+# Also reports how late the latest token was processed and the longest time
+# the screen went without an update while streaming. The last frame drawn
+# must be the last page in every case.
+#
+#   python benchmarks/bench_display_scheduler.py [capture.sse]
+import asyncio
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from display_scheduler import DisplayScheduler, MAX_FPS  # noqa: E402
+from queues import BoundedQueue  # noqa: E402
+from sse import SSEDecoder  # noqa: E402
+from text_layout import TextLayout  # noqa: E402
+
+TOKENS_PER_SECOND = 250
+DRAW_MS = (5, 20, 60)
+
+
+class FakeScreen:
+    def __init__(self, draw_ms):
+        self.draw_ms = draw_ms
+        self.frames = 0
+        self.text = None
+        self.drawn_at = []
+
+
+def draw(screen, text):
+    time.sleep(screen.draw_ms / 1000)
+    screen.frames += 1
+    screen.text = text
+    screen.drawn_at.append(time.perf_counter())
+
+
+async def stream(tokens, on_token):
+    start = time.perf_counter()
+    done = 0
+    lag = 0
+    while done < len(tokens):
+        now = time.perf_counter() - start
+        available = min(len(tokens), int(now * TOKENS_PER_SECOND) + 1)
+        if available > done:
+            lag = max(lag, now - done / TOKENS_PER_SECOND)
+        while done < available:
+            on_token(tokens[done])
+            done += 1
+        # Waiting for the next chunk from the socket
+        await asyncio.sleep(0.001)
+    return start, time.perf_counter() - start, lag
+
+
+async def display_task(queue, screen):
+    # The old display_task from code.py
+    while True:
+        item = await queue.get()
+        item[0](screen, *item[1:])
+        await asyncio.sleep(0)
+
+
+async def run(mode, tokens, screen):
+    layout = TextLayout(120, 9, 6)
+    if mode == "fps":
+        scheduler = DisplayScheduler()
+        task = asyncio.create_task(scheduler.run(screen))
+
+        def on_token(token):
+            layout.add(token)
+            scheduler.show(draw, layout.text())
+        busy = lambda: scheduler.pending
+    else:
+        queue = BoundedQueue(4, drop_oldest=True)
+        task = asyncio.create_task(display_task(queue, screen))
+
+        def on_token(token):
+            page = layout.add(token)
+            if mode == "tokens":
+                queue.put_nowait((draw, layout.text()))
+            elif page is not None:
+                queue.put_nowait((draw, page))
+        busy = lambda: len(queue) > 0
+    start, elapsed, lag = await stream(tokens, on_token)
+    last = layout.text()
+    if mode == "pages":
+        queue.put_nowait((draw, layout.finish()))
+    while busy():
+        await asyncio.sleep(0.001)
+    # Let the last frame finish drawing
+    await asyncio.sleep(0.1)
+    task.cancel()
+    assert screen.text == last, mode
+    times = [start] + [t for t in screen.drawn_at if t < start + elapsed] + [start + elapsed]
+    stale = max(times[i + 1] - times[i] for i in range(len(times) - 1))
+    return elapsed, lag, stale
+
+
+def main(path):
+    with open(path, "rb") as f:
+        tokens = list(SSEDecoder().iter_content([f.read()]))
+    ideal = len(tokens) / TOKENS_PER_SECOND
+    print("%s, %d tokens arriving at %d/s, %d fps limit" % (
+        os.path.basename(path), len(tokens), TOKENS_PER_SECOND, MAX_FPS))
+    print("  draw    mode    tokens/s  frames  stream time         token lag  screen stale")
+    for draw_ms in DRAW_MS:
+        for mode in ("pages", "tokens", "fps"):
+            screen = FakeScreen(draw_ms)
+            elapsed, lag, stale = asyncio.run(run(mode, tokens, screen))
+            print("  %3d ms  %-6s  %8.0f  %6d  %7.0f ms (%+4.0f%%)  %6.0f ms  %9.0f ms" % (
+                draw_ms, mode, len(tokens) / elapsed, screen.frames, elapsed * 1e3,
+                (elapsed / ideal - 1) * 100, lag * 1e3, stale * 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "openai_chat_stream.sse")
+    sys.exit(main(path))
@@ -0,0 +1,202 @@
+# End to end latencies of code.py in the simulator, see simulator.py.
+#   keystrokes  recorded typing replayed over UART while idle
+#   prompt      a prompt typed and sent, the mock API streams the response
+#   cached      the same prompt again, answered from the response cache
+#   busy        keystrokes replayed while a response streams and gets typed,
+#               then the next prompt typed and sent. The typist has to wait
+#               while keys are held and the prompt is typed, and still type
+#               both answers whole.
+# Each scenario runs twice, once for the timings and once under tracemalloc
+# with the probes only counting, so the heap is that of code.py and the mock
+# API thread. The results are printed and, with --json, written out for
+# comparing runs.
+#
+#   python benchmarks/bench_e2e.py [--rate 100] [--repeat 1] [--json out.json] [scenario ...]
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from simulator import Board, MockAPI, load_events, type_reports, chord_reports, LEFT_GUI, ENTER  # noqa: E402
+from bench_framing import load  # noqa: E402
+from bench_typist import typed_text  # noqa: E402
+
+CAPTURE = os.path.join(HERE, "captures", "openai_chat_stream.sse")
+KEYSTROKES = os.path.join(HERE, "captures", "typing_rollover.hid")
+PROMPT = "Write a haiku about keyboards"
+NEXT_PROMPT = "Write a haiku about screens"
+# Between reports from the keyboard Pico while typing
+KEY_INTERVAL = 0.008
+# Reports of the keyboard capture replayed
+KEYSTROKE_REPORTS = 500
+# Fast enough that typing the response doesn't take minutes
+ENVIRONMENT = {"TYPING_RATE": "1000"}
+SCENARIOS = ("keystrokes", "prompt", "cached", "busy")
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(fraction):
+        return round(values[min(len(values) - 1, int(fraction * len(values)))] * 1e3, 2)
+    return {"p50": at(0.5), "p95": at(0.95), "max": at(1.0), "count": len(values)}
+
+
+def forward_latency(board):
+    # The n-th keyboard report fed goes out as the n-th forwarded report
+    return [sent[0] - fed for fed, sent in zip(board.fed, board.forwarded)]
+
+
+def screen_latency(board):
+    latencies = []
+    frame = 0
+    for i, arrival in enumerate(board.arrivals):
+        while frame < len(board.frames) and board.frames[frame][1] <= i:
+            frame += 1
+        if frame == len(board.frames):
+            break
+        latencies.append(board.frames[frame][0] - arrival)
+    return latencies
+
+
+def hid_latency(board):
+    presses = [sent for sent, data in board.typed if data[2]]
+    latencies = []
+    typed = 0
+    for arrival, token in zip(board.arrivals, board.tokens):
+        count = board.typeable(token)
+        if not count:
+            continue
+        typed += count
+        if typed > len(presses):
+            break
+        latencies.append(presses[typed - 1] - arrival)
+    return latencies
+
+
+def typed_answer(board):
+    # What the typist typed on the PC, a report from the keyboard in between
+    # lets go of its key
+    return typed_text([report if typed else bytes(8) for typed, report in board.sent])
+
+
+async def submit(board, prompt):
+    start = chord_reports(LEFT_GUI, ENTER)
+    end = chord_reports(LEFT_GUI, ENTER)
+    await board.feed(start + type_reports(prompt) + end, KEY_INTERVAL)
+    # The last release was just written, the prompt goes out once it's read
+    return time.perf_counter()
+
+
+async def scenario(name, board, keystrokes):
+    # Returns the submit time, None when nothing was submitted
+    if name == "keystrokes":
+        await board.feed(keystrokes[:KEYSTROKE_REPORTS], KEY_INTERVAL)
+        return None
+    if name == "cached":
+        await submit(board, PROMPT)
+        await board.idle()
+        board.reset()
+    submitted = await submit(board, PROMPT)
+    if name == "busy":
+        # Wait for the stream to start, then type over it
+        while not board.token_count:
+            await asyncio.sleep(0.001)
+        await board.feed(keystrokes[:KEYSTROKE_REPORTS], KEY_INTERVAL)
+        await submit(board, NEXT_PROMPT)
+    return submitted
+
+
+async def run(name, events, rate, keystrokes, trace):
+    api = MockAPI(events, rate)
+    board = Board(api, ENVIRONMENT, record=not trace)
+    await board.start()
+    if trace:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    submitted = await scenario(name, board, keystrokes)
+    if not await board.idle():
+        raise RuntimeError("%s didn't finish:\n%s" % (name, board.output.getvalue()[-2000:]))
+    elapsed = time.perf_counter() - start
+    if trace:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    await board.stop()
+    api.close()
+    if trace:
+        return {"peak_kb": round((peak - before) / 1024, 1), "retained_kb": round((current - before) / 1024, 1)}
+    if name == "busy":
+        assert board.collisions == 0, "%d typist reports while the keyboard was in use" % board.collisions
+        table = board.code.typist.table
+        answer = "".join(c for c in "".join(board.tokens) if ord(c) < 128 and table[ord(c)])
+        assert typed_answer(board) == answer, "answers typed wrong"
+
+    result = {
+        "scenario": name,
+        "seconds": round(elapsed, 3),
+        "forward_ms": percentiles(forward_latency(board)),
+        "uart_overruns": board.uart.overruns,
+    }
+    if submitted is not None:
+        if not board.arrivals:
+            raise RuntimeError("%s got no tokens:\n%s" % (name, board.output.getvalue()[-2000:]))
+        stream = board.arrivals[-1] - board.arrivals[0]
+        result.update({
+            "tokens": len(board.arrivals),
+            "tokens_per_s": round((len(board.arrivals) - 1) / stream, 1) if stream else None,
+            "ttft_ms": round((board.arrivals[0] - submitted) * 1e3, 2),
+            "token_to_screen_ms": percentiles(screen_latency(board)),
+            "token_to_hid_ms": percentiles(hid_latency(board)),
+            "frames": len(board.frames),
+            "refreshed_kpx": round(sum(pixels for _, pixels in board.display.refreshes) / 1000, 1),
+        })
+    return result
+
+
+def short(stats):
+    if stats is None:
+        return "-"
+    return "%.1f/%.1f/%.1f" % (stats["p50"], stats["p95"], stats["max"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scenarios", nargs="*", default=SCENARIOS)
+    parser.add_argument("--rate", type=float, default=100, help="tokens per second from the mock API")
+    parser.add_argument("--repeat", type=int, default=1, help="times the recorded response is repeated")
+    parser.add_argument("--capture", default=CAPTURE)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    events = load_events(args.capture, args.repeat)
+    keystrokes = [r for r in load(KEYSTROKES) if len(r) in (8, 13)]
+    results = []
+    print("%s x%d at %g tokens/s, latencies in ms as p50/p95/max" % (
+        os.path.basename(args.capture), args.repeat, args.rate))
+    print("  scenario    forward          ttft      to screen            to HID               tok/s  peak KB")
+    for name in args.scenarios:
+        result = asyncio.run(run(name, events, args.rate, keystrokes, False))
+        result.update(asyncio.run(run(name, events, args.rate, keystrokes, True)))
+        results.append(result)
+        print("  %-10s  %-15s  %7s  %-19s  %-19s  %5s  %7.1f" % (
+            name, short(result["forward_ms"]), result.get("ttft_ms", "-"),
+            short(result.get("token_to_screen_ms")), short(result.get("token_to_hid_ms")),
+            result.get("tokens_per_s", "-"), result["peak_kb"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rate": args.rate, "repeat": args.repeat, "time": int(time.time()),
+                       "results": results}, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
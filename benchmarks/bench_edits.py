@@ -0,0 +1,172 @@
+# Answers to the editing templates typed over the selection in a model of a
+# text editor, once in full like before and once as the edit edits.py
+# plans. The text is history.py, or the file given:
+#   correct   five typos fixed in a function selected without its last
+#             newline
+#   document  the whole file selected without its comments, the answer
+#             puts them back
+#   refactor  the whole file, every "response" renamed to "answer"
+#   rewrite   the answer is another file, the edit falls back to typing it
+# Keys are the ones that go down, reports what typist.Typist sends for
+# them, time is for those reports at the default 100 a second. Plan is how
+# long plan_edit took here. The editor must end up with the answer.
+#
+#   python benchmarks/bench_edits.py [file.py]
+import asyncio
+import os
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(HERE, "..", "circuit-python-processor")
+sys.path.insert(0, SOURCE)
+
+from edits import plan_edit, RIGHT, LEFT, END, DELETE, BACKSPACE  # noqa: E402
+from typist import Typist, build_report_table, LEFT_SHIFT, KEYS_PER_SECOND  # noqa: E402
+from bench_hid_report import HID_KEYCODE_TO_ASCII  # noqa: E402
+
+TYPOS = (("return", "retrun"), ("self.", "slef."), ("page", "pgae"), ("None", "Nnoe"), ("len(", "lne("))
+
+
+class Editor:
+    # Text with a cursor and a selection, keys as most editors take them
+    def __init__(self, text, start, end):
+        self.text = text
+        self.anchor = start
+        self.cursor = end
+
+    def _selection(self):
+        if self.anchor is None or self.anchor == self.cursor:
+            return None
+        return min(self.anchor, self.cursor), max(self.anchor, self.cursor)
+
+    def _delete_selection(self):
+        selection = self._selection()
+        self.anchor = None
+        if selection is None:
+            return False
+        self.text = self.text[:selection[0]] + self.text[selection[1]:]
+        self.cursor = selection[0]
+        return True
+
+    def type(self, character):
+        self._delete_selection()
+        self.text = self.text[:self.cursor] + character + self.text[self.cursor:]
+        self.cursor += 1
+
+    def press(self, keycode, shift):
+        selection = self._selection()
+        if shift:
+            if self.anchor is None:
+                self.anchor = self.cursor
+        elif keycode in (LEFT, RIGHT, END):
+            self.anchor = None
+        if keycode == LEFT:
+            self.cursor = selection[0] if selection and not shift else max(self.cursor - 1, 0)
+        elif keycode == RIGHT:
+            self.cursor = selection[1] if selection and not shift else min(self.cursor + 1, len(self.text))
+        elif keycode == END:
+            end = self.text.find("\n", self.cursor)
+            self.cursor = len(self.text) if end < 0 else end
+        elif keycode == DELETE:
+            if not self._delete_selection():
+                self.text = self.text[:self.cursor] + self.text[self.cursor + 1:]
+        elif keycode == BACKSPACE:
+            if not self._delete_selection() and self.cursor:
+                self.text = self.text[:self.cursor - 1] + self.text[self.cursor:]
+                self.cursor -= 1
+        else:
+            self.type(HID_KEYCODE_TO_ASCII[keycode][1 if shift else 0])
+
+
+class FakeKeyboard:
+    def __init__(self):
+        self.reports = []
+
+    def send_report(self, report):
+        self.reports.append(bytes(report))
+
+
+def replay(editor, reports):
+    # A key goes down whenever the report's key changes to another one
+    held = 0
+    for report in reports:
+        if report[2] and report[2] != held:
+            editor.press(report[2], report[0] & LEFT_SHIFT)
+        held = report[2]
+
+
+async def type_items(items):
+    keyboard = FakeKeyboard()
+    # Fast, the time is worked out from the reports
+    typist = Typist(keyboard, build_report_table(HID_KEYCODE_TO_ASCII), 1000000)
+    task = asyncio.create_task(typist.run())
+    for item in items:
+        await typist.put(item)
+    await typist.flush()
+    task.cancel()
+    return keyboard.reports
+
+
+def scenarios(text):
+    lines = text.split("\n")
+    # The longest function, selected from its def to the end of its body
+    starts = [i for i, line in enumerate(lines) if line.lstrip().startswith("def ")] + [len(lines)]
+    first, last = max(zip(starts, starts[1:]), key=lambda span: span[1] - span[0])
+    while not lines[last - 1].strip():
+        last -= 1
+    function = "\n".join(lines[first:last])
+    typos = function
+    for right, wrong in TYPOS:
+        typos = typos.replace(right, wrong, 1)
+    yield "correct", text.replace(function, typos), typos, function
+    bare = "\n".join(line for line in lines if not line.lstrip().startswith("#"))
+    yield "document", bare, bare, text
+    yield "refactor", text, text, re.sub(r"\bresponse\b", "answer", text)
+    with open(os.path.join(SOURCE, "sse.py")) as f:
+        other = f.read()
+    yield "rewrite", text, text, other
+
+
+def expected(original, answer):
+    # What plan_edit leaves: the answer ends with a newline when the
+    # selection did
+    if original.endswith("\n"):
+        return answer if answer.endswith("\n") else answer + "\n"
+    return answer.rstrip("\n")
+
+
+def main(path):
+    with open(path) as f:
+        text = f.read()
+    print("%s, %d lines" % (os.path.basename(path), text.count("\n")))
+    print("  edit      how      keys  reports  time s  plan ms")
+    for name, document, original, answer in scenarios(text):
+        start = document.index(original)
+        end = start + len(original)
+        for how in ("retype", "edit"):
+            if how == "retype":
+                items, plan_ms = [answer], 0
+                result = document[:start] + answer + document[end:]
+            else:
+                begin = time.perf_counter()
+                items = plan_edit(original, answer)
+                plan_ms = (time.perf_counter() - begin) * 1e3
+                if items is None:
+                    print("  %-8s  %-6s  fell back to typing it" % (name, how))
+                    continue
+                result = document[:start] + expected(original, answer) + document[end:]
+            reports = asyncio.run(type_items(items))
+            editor = Editor(document, start, end)
+            replay(editor, reports)
+            assert editor.text == result, (name, how)
+            keys = sum(len(item) for item in items)
+            print("  %-8s  %-6s  %5d  %7d  %6.1f  %7.1f" % (
+                name, how, keys, len(reports), len(reports) / KEYS_PER_SECOND, plan_ms))
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(SOURCE, "history.py")
+    sys.exit(main(path))
@@ -0,0 +1,118 @@
+# Replays a capture of keyboard reports over a simulated UART, once with the
+# old raw + 0xFF framing and the packet splitting from the code.py main loop,
+# once COBS encoded through framing.FrameDecoder. Reads are cut at random
+# points, the way in_waiting sees them while the main loop is busy.
+#
+#   python benchmarks/bench_framing.py [capture.hid]
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from framing import FrameDecoder, cobs_encode  # noqa: E402
+
+KEYBOARD_LENGTHS = (8, 13)
+ROUNDS = 5
+
+
+def load(path):
+    reports = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            reports.append(bytes.fromhex(line))
+    return reports
+
+
+def reads(stream, seed, max_read):
+    rng = random.Random(seed)
+    pos = 0
+    out = []
+    while pos < len(stream):
+        n = rng.randint(1, max_read)
+        out.append(stream[pos:pos + n])
+        pos += n
+    return out
+
+
+def old_framing(chunks):
+    # The splitting from the main loop before FrameDecoder
+    received = []
+    current_uart_data = bytearray()
+    for chunk in chunks:
+        current_uart_data.extend(chunk)
+        if len(current_uart_data) > 0 and current_uart_data[-1] == 255:
+            packet_count = 0
+            for i in range(len(current_uart_data)):
+                if current_uart_data[i] == 255:
+                    packet_count += 1
+            packet_length = len(current_uart_data) // packet_count
+            packets = [current_uart_data[i:i+packet_length]
+                       for i in range(0, len(current_uart_data), packet_length)]
+            for packet in packets:
+                if len(packet) == 14 or len(packet) == 9:
+                    received.append(bytes(packet[:-1]))
+            current_uart_data = bytearray()
+    return received
+
+
+def new_framing(chunks):
+    received = []
+    decoder = FrameDecoder()
+    for chunk in chunks:
+        for frame in decoder.feed(chunk, len(chunk)):
+            if len(frame) in KEYBOARD_LENGTHS:
+                received.append(bytes(frame))
+    return received
+
+
+def lost(expected, received):
+    # Reports missing from received, in order
+    i = 0
+    missing = 0
+    for report in expected:
+        if i < len(received) and received[i] == report:
+            i += 1
+        else:
+            missing += 1
+    return missing, len(received) - i
+
+
+def timed(fn, chunks):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = fn(chunks)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main(path):
+    reports = load(path)
+    expected = [r for r in reports if len(r) in KEYBOARD_LENGTHS]
+    old_stream = b"".join(r + b"\xff" for r in reports)
+    # capture_hid_report.c sends a delimiter at boot to sync the receiver
+    new_stream = b"\x00" + b"".join(cobs_encode(r) for r in reports)
+    print(os.path.basename(path), len(reports), "reports,", len(expected), "from keyboards")
+    for max_read in (16, 64, 256):
+        old_time, old = timed(old_framing, reads(old_stream, max_read, max_read))
+        new_time, new = timed(new_framing, reads(new_stream, max_read, max_read))
+        old_lost, old_bad = lost(expected, old)
+        new_lost, new_bad = lost(expected, new)
+        print("  reads <= %3d bytes   0xFF split: %4d lost %4d corrupt %6.2f us/report   COBS: %d lost %d corrupt %6.2f us/report" % (
+            max_read, old_lost, old_bad, old_time * 1e6 / len(reports),
+            new_lost, new_bad, new_time * 1e6 / len(reports)))
+        if new_lost or new_bad:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "typing_rollover.hid")
+    sys.exit(main(path))
@@ -0,0 +1,169 @@
+# Per-report cost of the old parse_packet + list_diff key diffing from
+# code.py against hid_report.ReportDecoder, on recorded keyboard reports.
+# Both must agree on which keys get pressed and released. Also times raw
+# report passthrough and counts the USB reports each way sends to the PC.
+#
+#   python benchmarks/bench_hid_report.py [capture.hid]
+import ast
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(HERE, "..", "circuit-python-processor")
+sys.path.insert(0, SOURCE)
+
+from hid_report import ReportDecoder, ReportForwarder  # noqa: E402
+from bench_framing import load  # noqa: E402
+
+ROUNDS = 20
+
+
+def hid_table(name):
+    # hid.py needs adafruit_hid, read the plain tables out of its source
+    with open(os.path.join(SOURCE, "hid.py")) as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and node.targets[0].id == name:
+            return ast.literal_eval(node.value)
+
+
+HID_KEYCODE_TO_ASCII = hid_table("HID_KEYCODE_TO_ASCII")
+HID_KEYCODE_TO_CHARACTER = [entry[0] for entry in HID_KEYCODE_TO_ASCII] + \
+    [0] * (256 - len(HID_KEYCODE_TO_ASCII))
+# Keycode.LEFT_CONTROL ... Keycode.RIGHT_GUI
+L_MODIFIER_LIST = [0xE0, 0xE1, 0xE2, 0xE3]
+R_MODIFIER_LIST = [0xE4, 0xE5, 0xE6, 0xE7]
+
+
+# Old implementation, as it was in code.py
+def list_diff(l1, l2):
+    return [x for x in l1 if x not in l2]
+
+
+def parse_packet(packet, modifier_pos, first_key_pos, last_key_pos):
+    keycodes = []
+    modifiers = []
+    characters = []
+    L_modifiers_mask = packet[modifier_pos] & 0b00001111
+    R_modifiers_mask = (packet[modifier_pos] & 0b11110000) >> 4
+    L_modifiers = [L_MODIFIER_LIST[i] for i in range(
+        len(L_MODIFIER_LIST)) if (L_modifiers_mask >> i) & 1]
+    R_modifiers = [R_MODIFIER_LIST[i] for i in range(
+        len(R_MODIFIER_LIST)) if (R_modifiers_mask >> i) & 1]
+    modifiers.extend(L_modifiers)
+    modifiers.extend(R_modifiers)
+    keycodes.extend(modifiers)
+
+    for i in range(first_key_pos, last_key_pos + 1):
+        character = HID_KEYCODE_TO_ASCII[packet[i]][0]
+        if character != 0:
+            characters.append(character)
+        keycodes.append(packet[i])
+
+    return keycodes, characters
+
+
+def positions(report):
+    if len(report) == 13:
+        return 1, 3, 7
+    return 0, 2, 6
+
+
+def old_decode(reports, events):
+    last_pressed_keycodes = []
+    last_pressed_characters = []
+    for report in reports:
+        modifier_pos, first_key_pos, last_key_pos = positions(report)
+        keycodes, characters = parse_packet(report, modifier_pos, first_key_pos, last_key_pos)
+        pressed_keycodes = list_diff(keycodes, last_pressed_keycodes)
+        released_keycodes = list_diff(last_pressed_keycodes, keycodes)
+        pressed_characters = list_diff(characters, last_pressed_characters)
+        typing = not all(i == 0 for i in keycodes)
+        if events is not None:
+            events.append((
+                [k for k in pressed_keycodes if k], [k for k in released_keycodes if k],
+                pressed_characters[0] if pressed_characters else None, typing))
+        last_pressed_keycodes = keycodes
+        last_pressed_characters = characters
+
+
+def new_decode(reports, events):
+    keys = ReportDecoder(HID_KEYCODE_TO_CHARACTER)
+    for report in reports:
+        modifier_pos, first_key_pos, last_key_pos = positions(report)
+        keys.decode(report, modifier_pos, first_key_pos, last_key_pos)
+        pressed_character = keys.pressed_character()
+        typing = not keys.idle
+        if events is not None:
+            events.append((
+                list(keys.pressed[:keys.pressed_count]), list(keys.released[:keys.released_count]),
+                pressed_character, typing))
+
+
+class CountingDevice:
+    # Stand-in for the usb_hid keyboard device
+    def __init__(self):
+        self.reports = 0
+
+    def send_report(self, report):
+        self.reports += 1
+
+
+def replayed_reports(reports):
+    # Keyboard.press/release send one USB report per key change
+    keys = ReportDecoder(HID_KEYCODE_TO_CHARACTER)
+    sent = 0
+    for report in reports:
+        modifier_pos, first_key_pos, last_key_pos = positions(report)
+        keys.decode(report, modifier_pos, first_key_pos, last_key_pos)
+        sent += keys.pressed_count + keys.released_count
+    return sent
+
+
+def forward(reports, events):
+    forwarder = ReportForwarder(CountingDevice())
+    for report in reports:
+        modifier_pos, first_key_pos, last_key_pos = positions(report)
+        forwarder.forward(report, modifier_pos, first_key_pos)
+    return forwarder.device.reports
+
+
+def timed(fn, reports):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn(reports, None)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main(path):
+    reports = [r for r in load(path) if len(r) in (8, 13)]
+    expected = []
+    old_decode(reports, expected)
+    events = []
+    new_decode(reports, events)
+    if events != expected:
+        for i, (a, b) in enumerate(zip(expected, events)):
+            if a != b:
+                print("MISMATCH at report", i, reports[i].hex(" "), a, b)
+                break
+        return 1
+    old_time = timed(old_decode, reports)
+    new_time = timed(new_decode, reports)
+    print(os.path.basename(path), len(reports), "keyboard reports")
+    print("  parse_packet + list_diff  %6.2f us/report" % (old_time * 1e6 / len(reports)))
+    print("  ReportDecoder             %6.2f us/report  x%.1f" % (new_time * 1e6 / len(reports), old_time / new_time))
+    forward_time = timed(forward, reports)
+    print("  ReportForwarder           %6.2f us/report" % (forward_time * 1e6 / len(reports)))
+    print("  USB reports to the PC: %d replaying key changes, %d with passthrough" % (
+        replayed_reports(reports), forward(reports, None)))
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "typing_rollover.hid")
+    sys.exit(main(path))
@@ -0,0 +1,116 @@
+# Heap held by past responses and the time to scroll through them. Old: every
+# response keeps its TextLayout pages in a list until the next one replaces
+# it. New: history.ResponseHistory with pages on flash behind an offset index
+# and a small LRU. Pages read back must equal the TextLayout pages, and the
+# encoder has to reach every page of every stored response. The new peak is
+# mostly the 8 KB buffer CPython gives open files, it stays flat with length.
+#
+#   python benchmarks/bench_history.py [capture.sse]
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from history import ResponseHistory  # noqa: E402
+from sse import SSEDecoder  # noqa: E402
+from text_layout import TextLayout  # noqa: E402
+
+WIDTH, ROWS, CHAR = 120, 9, 6
+LENGTHS = (1, 4, 16)
+RESPONSES = 30
+ROUNDS = 5
+
+
+def old_store(tokens):
+    layout = TextLayout(WIDTH, ROWS, CHAR)
+    for token in tokens:
+        layout.add(token)
+    layout.finish()
+    return layout.pages
+
+
+def new_store(history, tokens):
+    history.begin()
+    for token in tokens:
+        history.add(token)
+    history.finish()
+
+
+def scroll(history):
+    # From the last page of the newest response back to the first of the oldest
+    pages = [history.current()]
+    while True:
+        position = (history.response, history.page)
+        page = history.previous_page()
+        if (history.response, history.page) == position:
+            return pages[::-1]
+        pages.append(page)
+
+
+def main(path):
+    with open(path, "rb") as f:
+        tokens = list(SSEDecoder().iter_content([f.read()]))
+    print("%s, %d tokens per answer, %d answers stored" % (os.path.basename(path), len(tokens), RESPONSES))
+    print("  length  pages |  old kept  peak  |  new kept  peak   flash")
+    for repeat in LENGTHS:
+        response = tokens * repeat
+        expected = old_store(response)
+
+        tracemalloc.start()
+        kept = old_store(response)
+        old = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        directory = tempfile.mkdtemp()
+        history = ResponseHistory(WIDTH, ROWS, CHAR, directory, max_responses=RESPONSES)
+        tracemalloc.start()
+        for _ in range(RESPONSES):
+            new_store(history, response)
+        new = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert len(history) == RESPONSES
+        assert scroll(history) == expected * RESPONSES
+        flash = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print("  %5dx  %5d | %6.1f KB %5.1f KB | %6.1f KB %5.1f KB %5d KB" % (
+            repeat, len(kept), old[0] / 1024, old[1] / 1024, new[0] / 1024, new[1] / 1024, flash // 1024))
+
+    # Nothing to scroll through on a fresh board, before the first response
+    # begins
+    empty = ResponseHistory(WIDTH, ROWS, CHAR, tempfile.mkdtemp())
+    assert empty.next_page() is None and empty.previous_page() is None and empty.current() is None
+
+    # The history survives a reboot and keeps its limit
+    reloaded = ResponseHistory(WIDTH, ROWS, CHAR, directory, max_responses=RESPONSES)
+    new_store(reloaded, tokens)
+    assert len(reloaded) == RESPONSES and reloaded.current() == old_store(tokens)[-1]
+
+    # Scrolling back and forth over a few pages mostly hits the cache
+    pages = len(expected)
+    best_cold = best_warm = None
+    for _ in range(ROUNDS):
+        history = ResponseHistory(WIDTH, ROWS, CHAR, directory, max_responses=RESPONSES)
+        start = time.perf_counter()
+        for i in range(pages):
+            history.previous_page()
+        cold = (time.perf_counter() - start) / pages
+        start = time.perf_counter()
+        for i in range(pages):
+            if i % 4 < 2:
+                history.next_page()
+            else:
+                history.previous_page()
+        warm = (time.perf_counter() - start) / pages
+        best_cold = cold if best_cold is None else min(best_cold, cold)
+        best_warm = warm if best_warm is None else min(best_warm, warm)
+    print("  scroll  %.1f us per page from flash, %.1f us back and forth" % (best_cold * 1e6, best_warm * 1e6))
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "openai_chat_stream.sse")
+    sys.exit(main(path))
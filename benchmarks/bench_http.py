@@ -0,0 +1,208 @@
+# Time to first token through http_client.HTTPConnection against a local
+# HTTPS stand-in for the API, which answers every request with the recorded
+# chat completion stream. Compares a new connection per prompt, as before,
+# with a kept-alive connection and with one pre-warmed while the prompt is
+# being typed. Also checks that a connection the server dropped is reopened
+# without the request failing. The buffers are bytearrays without the str
+# methods, like on MicroPython, so a find() on one fails here too.
+#
+# Loopback TLS on a PC takes a few ms, on the Pico W the handshake alone is
+# over a second, so only the relative difference carries over.
+#
+#   python benchmarks/bench_http.py [capture.sse]
+import asyncio
+import errno
+import os
+import socket
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from http_client import HTTPConnection, RAW_SIZE  # noqa: E402
+from sse import SSEDecoder  # noqa: E402
+
+PROMPTS = 20
+CHUNK = 256
+
+
+class MicroBytearray(bytearray):
+    # MicroPython's bytearray has none of the searching str methods
+    def _missing(self, *args):
+        raise AttributeError("'bytearray' object has no attribute")
+    find = rfind = index = startswith = endswith = split = strip = _missing
+
+
+class Pool:
+    # socketpool.SocketPool on top of the socket module
+    AF_INET = socket.AF_INET
+    SOCK_STREAM = socket.SOCK_STREAM
+    getaddrinfo = staticmethod(socket.getaddrinfo)
+    socket = staticmethod(socket.socket)
+
+
+class TLSSocket:
+    # CPython reports a non-blocking TLS read or write that would block as
+    # SSLWantReadError, CircuitPython as OSError(EAGAIN)
+    def __init__(self, sock):
+        self.sock = sock
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def connect(self, addr):
+        self.sock.connect(addr)
+
+    def close(self):
+        self.sock.close()
+
+    def send(self, data):
+        try:
+            return self.sock.send(data)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            raise OSError(errno.EAGAIN)
+
+    def recv_into(self, buf):
+        try:
+            return self.sock.recv_into(buf)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            raise OSError(errno.EAGAIN)
+        except (ssl.SSLEOFError, ssl.SSLZeroReturnError):
+            return 0
+
+
+class TLSContext:
+    def __init__(self):
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        self.context.check_hostname = False
+        self.context.verify_mode = ssl.CERT_NONE
+
+    def wrap_socket(self, sock, server_hostname=None):
+        return TLSSocket(self.context.wrap_socket(sock, server_hostname=server_hostname))
+
+
+class Server:
+    def __init__(self, stream):
+        self.stream = stream
+        self.drop_after_response = False
+        self.handshakes = 0
+        directory = tempfile.mkdtemp()
+        cert = os.path.join(directory, "cert.pem")
+        key = os.path.join(directory, "key.pem")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                        "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+                       check=True, capture_output=True)
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(cert, key)
+        self.listener = socket.socket()
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(8)
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            conn, _ = self.listener.accept()
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        try:
+            conn = self.context.wrap_socket(conn, server_side=True)
+        except (ssl.SSLError, OSError):
+            return
+        self.handshakes += 1
+        f = conn.makefile("rb")
+        try:
+            while True:
+                length = 0
+                line = f.readline()
+                if not line:
+                    return
+                while line not in (b"\r\n", b""):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                    line = f.readline()
+                f.read(length)
+                out = [b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n"]
+                for i in range(0, len(self.stream), CHUNK):
+                    part = self.stream[i:i + CHUNK]
+                    out.append(b"%x\r\n%s\r\n" % (len(part), part))
+                out.append(b"0\r\n\r\n")
+                conn.sendall(b"".join(out))
+                if self.drop_after_response:
+                    return
+        except (ssl.SSLError, OSError):
+            pass
+        finally:
+            conn.close()
+
+
+async def prompt(connection):
+    # Milliseconds to the first token, and the tokens
+    start = time.perf_counter()
+    first = None
+    tokens = []
+    status = await connection.request("POST", "/v1/chat/completions",
+                                      {"Content-Type": "application/json"}, b'{"stream": true}')
+    assert status == 200
+    decoder = SSEDecoder()
+    buf = MicroBytearray(512)
+    while True:
+        size = await connection.readinto(buf)
+        if size == 0:
+            break
+        for token in decoder.feed(buf, size):
+            if first is None:
+                first = (time.perf_counter() - start) * 1e3
+            tokens.append(token)
+    return first, tokens
+
+
+async def scenario(server, mode, expected):
+    times = []
+    connection = HTTPConnection(Pool, TLSContext(), "127.0.0.1", server.port)
+    connection._raw = MicroBytearray(RAW_SIZE)
+    connection._raw_view = memoryview(connection._raw)
+    for _ in range(PROMPTS):
+        if mode == "cold":
+            connection.close()
+        elif mode == "pre-warmed":
+            connection.close()
+            # Done while the prompt is typed, off the clock
+            connection.ensure_connected()
+        ttft, tokens = await prompt(connection)
+        assert tokens == expected, mode
+        times.append(ttft)
+    connection.close()
+    return statistics.median(times)
+
+
+def main(path):
+    with open(path, "rb") as f:
+        stream = f.read()
+    expected = list(SSEDecoder().iter_content([stream]))
+    server = Server(stream)
+    print("%s, %d prompts each, median time to first token" % (os.path.basename(path), PROMPTS))
+    for mode in ("cold", "kept-alive", "pre-warmed"):
+        before = server.handshakes
+        ttft = asyncio.run(scenario(server, mode, expected))
+        print("  %-10s %6.2f ms  %2d handshakes" % (mode, ttft, server.handshakes - before))
+
+    # The server closes after every response without saying so
+    server.drop_after_response = True
+    before = server.handshakes
+    asyncio.run(scenario(server, "kept-alive", expected))
+    print("  dropped by server: %d prompts, %d reconnects, none failed" % (PROMPTS, server.handshakes - before))
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "openai_chat_stream.sse")
+    sys.exit(main(path))
@@ -0,0 +1,69 @@
+# Prompts per minute in the simulator, three prompts typed at about eight
+# characters a second while the mock API streams the answers.
+#   waiting  each prompt typed once the answer before it is complete, the
+#            only way before the job queue
+#   queued   each prompt typed and sent right after the one before, the
+#            next one is typed while the last streams
+# Every answer must come back complete, the queued ones in order.
+#
+#   python benchmarks/bench_jobs.py [--rate 100]
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from simulator import Board, MockAPI, load_events, type_reports, chord_reports, LEFT_GUI, ENTER  # noqa: E402
+from bench_e2e import CAPTURE, ENVIRONMENT  # noqa: E402
+
+PROMPTS = ("Write a haiku about keyboards", "Write a haiku about screens", "Write a haiku about cables")
+# Between reports, a press and a release per character
+KEY_INTERVAL = 0.06
+
+
+async def send(board, prompt):
+    reports = chord_reports(LEFT_GUI, ENTER) + type_reports(prompt) + chord_reports(LEFT_GUI, ENTER)
+    await board.feed(reports, KEY_INTERVAL)
+
+
+async def run(mode, events, rate):
+    api = MockAPI(events, rate)
+    board = Board(api, ENVIRONMENT)
+    await board.start()
+    jobs = board.code.prompt_queue
+    start = time.perf_counter()
+    for prompt in PROMPTS:
+        if mode == "waiting":
+            await board.idle()
+        await send(board, prompt)
+    await board.idle()
+    elapsed = time.perf_counter() - start
+    await board.stop()
+    api.close()
+    output = board.output.getvalue()
+    assert "Request failed" not in output and "Too many" not in output, output[-2000:]
+    assert len(api.requests) == len(PROMPTS), len(api.requests)
+    for i, prompt in enumerate(PROMPTS):
+        # The last user message of every request is its prompt, in order
+        assert api.requests[i][1].rfind(prompt.encode()) > api.requests[i][1].rfind(b'"user"'), i
+    assert jobs.status() == "Job %d done" % len(PROMPTS), jobs.status()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=100, help="tokens per second from the mock API")
+    args = parser.parse_args()
+    events = load_events(CAPTURE)
+    print("%d prompts at %g tokens/s" % (len(PROMPTS), args.rate))
+    for mode in ("waiting", "queued"):
+        elapsed = asyncio.run(run(mode, events, args.rate))
+        print("  %-8s  %5.1f s  %5.1f prompts/min" % (mode, elapsed, len(PROMPTS) / elapsed * 60))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
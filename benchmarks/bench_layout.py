@@ -0,0 +1,202 @@
+# Compares the per-token wrap_text_to_pixels paging from call_chatgpt with
+# text_layout.TextLayout on long streamed responses, and checks that both
+# produce the same pages.
+#
+#   python benchmarks/bench_layout.py
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from sse import SSEDecoder  # noqa: E402
+from text_layout import TextLayout  # noqa: E402
+
+DISPLAY_WIDTH = 240
+SCALE_FACTOR = 2
+MAX_ROWS = 9
+CHAR_WIDTH = 6
+ROUNDS = 5
+
+
+class Glyph:
+    shift_x = CHAR_WIDTH
+
+
+class MonospaceFont:
+    # Stand-in for terminalio.FONT
+    glyph = Glyph()
+
+    def get_glyph(self, codepoint):
+        return self.glyph
+
+
+FONT = MonospaceFont()
+
+
+# adafruit_display_text.wrap_text_to_pixels (2.28.1, MIT licensed), the
+# function code.py used for paging
+def wrap_text_to_pixels(string, max_width, font=None, indent0="", indent1=""):
+    if font is None:
+        def measure(text):
+            return len(text)
+    else:
+        def measure(text):
+            total_len = 0
+            for char in text:
+                this_glyph = font.get_glyph(ord(char))
+                if this_glyph:
+                    total_len += this_glyph.shift_x
+            return total_len
+
+    lines = []
+    partial = [indent0]
+    width = measure(indent0)
+    swidth = measure(" ")
+    firstword = True
+    for line_in_input in string.split("\n"):
+        newline = True
+        for index, word in enumerate(line_in_input.split(" ")):
+            wwidth = measure(word)
+            word_parts = []
+            cur_part = ""
+
+            if wwidth > max_width:
+                for char in word:
+                    if newline:
+                        extraspace = 0
+                        leadchar = ""
+                    else:
+                        extraspace = swidth
+                        leadchar = " "
+                    if (
+                        measure("".join(partial))
+                        + measure(cur_part)
+                        + measure(char)
+                        + measure("-")
+                        + extraspace
+                        > max_width
+                    ):
+                        if cur_part:
+                            word_parts.append(
+                                "".join(partial) + leadchar + cur_part + "-"
+                            )
+
+                        else:
+                            word_parts.append("".join(partial))
+                        cur_part = char
+                        partial = [indent1]
+                        newline = True
+                    else:
+                        cur_part += char
+                if cur_part:
+                    word_parts.append(cur_part)
+                for line in word_parts[:-1]:
+                    lines.append(line)
+                partial.append(word_parts[-1])
+                width = measure(word_parts[-1])
+                if firstword:
+                    firstword = False
+            else:
+                if firstword:
+                    partial.append(word)
+                    firstword = False
+                    width += wwidth
+                elif width + swidth + wwidth < max_width:
+                    if index > 0:
+                        partial.append(" ")
+                    partial.append(word)
+                    width += wwidth + swidth
+                else:
+                    lines.append("".join(partial))
+                    partial = [indent1, word]
+                    width = measure(indent1) + wwidth
+            if newline:
+                newline = False
+
+        lines.append("".join(partial))
+        partial = [indent1]
+        width = measure(indent1)
+
+    return lines
+
+
+def old_pages(tokens):
+    # The loop from call_chatgpt before TextLayout
+    pages = []
+    current_display_prompt = ""
+    for word in tokens:
+        current_display_prompt += word
+        wrapped_text = "\n".join(wrap_text_to_pixels(
+            current_display_prompt, max_width=DISPLAY_WIDTH/SCALE_FACTOR, font=FONT))
+        if (wrapped_text.count("\n") > MAX_ROWS):
+            current_display_prompt = current_display_prompt[:-len(word)]
+            pages.append(current_display_prompt)
+            current_display_prompt = word
+    if current_display_prompt != "":
+        pages.append(current_display_prompt)
+    return pages
+
+
+def new_pages(tokens):
+    layout = TextLayout(DISPLAY_WIDTH / SCALE_FACTOR, MAX_ROWS, CHAR_WIDTH)
+    for word in tokens:
+        layout.add(word)
+    layout.finish()
+    return layout.pages
+
+
+def capture_tokens():
+    with open(os.path.join(HERE, "captures", "openai_chat_stream.sse"), "rb") as f:
+        data = f.read()
+    return list(SSEDecoder().iter_content([data]))
+
+
+def random_tokens(count, seed):
+    # Words, long unbroken runs, repeated spaces and newlines
+    rng = random.Random(seed)
+    alphabet = "abcdefghij    \n-.,"
+    tokens = []
+    for _ in range(count):
+        if rng.random() < 0.02:
+            tokens.append("x" * rng.randint(15, 60))
+        else:
+            tokens.append("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 6))))
+    return tokens
+
+
+def timed(fn, tokens):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = fn(tokens)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    for seed in range(200):
+        tokens = random_tokens(300, seed)
+        if old_pages(tokens) != new_pages(tokens):
+            print("MISMATCH on random stream", seed)
+            return 1
+
+    tokens = capture_tokens()
+    for repeat in (1, 4, 16):
+        stream = tokens * repeat
+        old_time, expected = timed(old_pages, stream)
+        new_time, pages = timed(new_pages, stream)
+        if pages != expected:
+            print("MISMATCH on capture x%d" % repeat)
+            return 1
+        print("%5d tokens %3d pages  wrap_text_to_pixels %9.2f ms  TextLayout %7.2f ms  x%.0f" % (
+            len(stream), len(pages), old_time * 1000, new_time * 1000, old_time / new_time))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
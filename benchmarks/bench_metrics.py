@@ -0,0 +1,93 @@
+# Cost of the metrics.Stage spans code.py puts around its hot paths, enabled
+# and disabled, against the same loop without them. Then a prompt in the
+# simulator with METRICS on, fetching the summary from the clipboard port
+# like curl would, and the same prompt with METRICS off for comparison.
+#
+#   python benchmarks/bench_metrics.py
+import asyncio
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from simulator import Board, MockAPI, load_events  # noqa: E402
+from bench_e2e import CAPTURE, PROMPT, ENVIRONMENT, submit, percentiles, screen_latency  # noqa: E402
+from metrics import Metrics  # noqa: E402
+
+SPANS = 200000
+ROUNDS = 5
+RATE = 100
+STAGES = ("uart_read", "frame_decode", "parse_packet", "hid_forward", "keys",
+          "sse_parse", "layout", "wrap", "refresh", "hid_type", "gc")
+
+
+def span_cost(enabled):
+    stage = Metrics(enabled).stage("span")
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        if enabled is None:
+            for _ in range(SPANS):
+                pass
+        else:
+            for _ in range(SPANS):
+                stage.end(stage.start())
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / SPANS
+
+
+async def fetch(port, request):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response.decode()
+
+
+async def prompt(metrics):
+    api = MockAPI(load_events(CAPTURE), RATE)
+    environment = dict(ENVIRONMENT, METRICS="1" if metrics else "0")
+    board = Board(api, environment)
+    servers = []
+    initialize = board.code.initialize_tcp_server
+    board.code.initialize_tcp_server = lambda pool: servers.append(initialize(pool)) or servers[-1]
+    await board.start()
+    submitted = await submit(board, PROMPT)
+    if not await board.idle():
+        raise RuntimeError(board.output.getvalue()[-2000:])
+    port = servers[0].getsockname()[1]
+    summary = None
+    if metrics:
+        summary = await fetch(port, b"GET /metrics HTTP/1.1\r\nHost: board\r\n\r\n")
+        plain = await fetch(port, b"metrics reset\n")
+        assert summary.startswith("HTTP/1.0 200 OK"), summary
+        assert not plain.startswith("HTTP"), plain
+        assert all(stage.count == 0 for stage in board.code.metrics.stages)
+    await board.stop()
+    api.close()
+    stats = percentiles(screen_latency(board))
+    return round((board.arrivals[0] - submitted) * 1e3, 2), stats, summary
+
+
+def main():
+    baseline = span_cost(None)
+    for name, enabled in (("disabled", False), ("enabled", True)):
+        print("span %-8s  %.3f us" % (name, (span_cost(enabled) - baseline) * 1e6))
+    ttft, stats, summary = asyncio.run(prompt(True))
+    body = summary.split("\r\n\r\n", 1)[1]
+    for stage in STAGES:
+        assert ("\n%s " % stage) in body, stage
+    print(body)
+    print("METRICS=1  ttft %.1f ms, to screen p50 %.1f ms" % (ttft, stats["p50"]))
+    ttft, stats, _ = asyncio.run(prompt(False))
+    print("METRICS=0  ttft %.1f ms, to screen p50 %.1f ms" % (ttft, stats["p50"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+# Answers whose stream breaks off, in the simulator. The mock API cuts
+# connections at random points: it closes them, or stops sending until the
+# board times out. A request to go on, see resume.py, gets the rest of the
+# answer, backed up a few tokens or started over like models do.
+#   resume      the board picks the answer up again and drops what repeats
+#   start over  like before, STREAM_RETRIES = 0 and the prompt is sent
+#               again until an answer comes through whole
+# The answer is the README, a word a token. The recorded one repeats the
+# same sentence, and a continuation that goes on right after one can't be
+# told from one that repeats it. "hopeless" cuts every response and the
+# board gives up with the answer cut short. Generated is the content events
+# the API streamed over all requests, of the answer's own. Typed must be the
+# answer exactly once for resume. resume.Overlap is checked on its own first,
+# on short continuations too.
+#
+#   python benchmarks/bench_resume.py [--rate 100]
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from simulator import Board, MockAPI, socketpool, API_PORT  # noqa: E402
+from bench_e2e import submit  # noqa: E402
+from bench_typist import typed_text  # noqa: E402
+from resume import CONTINUE_PROMPT, Overlap  # noqa: E402
+
+PROMPT = "Write a haiku about keyboards"
+CUT = "Hello world. This is a test"
+# Continuation of CUT -> what of it goes out
+OVERLAPS = (
+    (".", "."),
+    ("s", "s"),
+    ("This is", "This is"),
+    (" world", " world"),
+    ("This is a test, done.", ", done."),
+    ("is a test. Next", ". Next"),
+    ("a test. Next", "a test. Next"),
+    (CUT + " and more.", " and more."),
+    (" And more.", " And more."),
+)
+README = os.path.join(HERE, "..", "README.md")
+# Name, seed, chance a response is cut and that a cut stalls instead of
+# closing the connection
+SCENARIOS = (
+    ("clean", 0, 0, 0),
+    ("cuts", 1, 0.6, 0),
+    ("stalls", 3, 0.6, 1),
+    ("hopeless", 4, 1, 0.5),
+)
+# How far a continuation backs up
+BACK_UP = (0, 3, 10)
+TRIES = 8
+RESUME = {
+    "TYPING_RATE": "1000",
+    "STREAM_RETRIES": "4",
+    "STREAM_RETRY_SECONDS": "0.2",
+    "API_OPENAI_TIMEOUT": "1",
+}
+
+
+def answer_events(text):
+    # A chat completion stream with a word, and the space before it, a chunk
+    chunk = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"role": "assistant"}}]}
+    events = [b"data: " + json.dumps(chunk).encode() + b"\n\n"]
+    for word in re.findall(r"\s*\S+", text):
+        chunk["choices"][0]["delta"] = {"content": word}
+        events.append(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+    chunk["choices"][0]["delta"] = {}
+    chunk["choices"][0]["finish_reason"] = "stop"
+    events.append(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+    events.append(b"data: [DONE]\n\n")
+    return events
+
+
+def content(event):
+    try:
+        return json.loads(event.split(b"data:", 1)[1])["choices"][0]["delta"].get("content")
+    except (ValueError, KeyError, IndexError):
+        return None
+
+
+class CuttingAPI(MockAPI):
+    # The mock API, cutting responses where seed says
+    def __init__(self, events, events_per_second, seed, cut_chance, stall_chance, transliterate):
+        super().__init__(events, events_per_second)
+        self.random = random.Random(seed)
+        self.cut_chance = cut_chance
+        self.stall_chance = stall_chance
+        self.transliterate = transliterate
+        self.head = [event for event in events if content(event) is None and b"[DONE]" not in event][:1]
+        self.content = [event for event in events if content(event) is not None]
+        self.tail = events[events.index(self.content[-1]) + 1:]
+        self.generated = 0
+        self.cuts = 0
+
+    def _start(self, body):
+        # Where the answer goes on from, after the assistant message sent
+        messages = json.loads(body)["messages"]
+        if messages[-1]["content"] != CONTINUE_PROMPT:
+            return 0
+        answer = messages[-2]["content"]
+        text = ""
+        for i, event in enumerate(self.content):
+            text += self.transliterate(content(event))
+            if len(text) > len(answer):
+                at = i
+                break
+        else:
+            at = len(self.content)
+        if self.random.random() < 0.2:
+            # Starts over
+            return 0
+        return max(at - self.random.choice(BACK_UP), 0)
+
+    def _serve(self, conn):
+        f = conn.makefile("rb")
+        try:
+            while True:
+                line = f.readline()
+                if not line:
+                    return
+                length = 0
+                while line not in (b"\r\n", b""):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                    line = f.readline()
+                body = f.read(length)
+                self.requests.append((time.perf_counter(), body))
+                start = self._start(body)
+                events = self.content[start:]
+                cut = None
+                if self.random.random() < self.cut_chance:
+                    cut = self.random.randint(1, max(len(events) - 1, 1))
+                    stall = self.random.random() < self.stall_chance
+                time.sleep(self.first_token_delay)
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+                begin = time.perf_counter()
+                for i, event in enumerate(self.head + events + self.tail):
+                    if cut is not None and i == cut + len(self.head):
+                        self.cuts += 1
+                        if stall:
+                            # Until the board gives up on the connection
+                            while conn.recv(1):
+                                pass
+                        conn.shutdown(socket.SHUT_RDWR)
+                        return
+                    wait = begin + i * self.interval - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                    conn.sendall(b"%x\r\n%s\r\n" % (len(event), event))
+                    if content(event) is not None:
+                        self.generated += 1
+                conn.sendall(b"0\r\n\r\n")
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+
+async def run(how, scenario, events, rate):
+    environment = dict(RESUME)
+    if how == "start over":
+        environment["STREAM_RETRIES"] = "0"
+    # The board's transliteration decides what the answer is on its side,
+    # it is only loaded once the board starts
+    board = Board(MockAPI(events, rate), environment)
+    api = CuttingAPI(events, rate, *scenario[1:], transliterate=lambda text: board.code.transliterate(text))
+    board.api.close()
+    board.api = api
+    socketpool.ROUTES[("api.openai.com", API_PORT)] = ("127.0.0.1", api.port)
+    await board.start()
+    begin = time.perf_counter()
+    jobs = board.code.prompt_queue
+    for _ in range(TRIES):
+        await submit(board, PROMPT)
+        if not await board.idle(120):
+            raise RuntimeError("%s didn't finish:\n%s" % (how, board.output.getvalue()[-2000:]))
+        if jobs.last.status == "done" or how == "resume":
+            break
+    elapsed = time.perf_counter() - begin
+    await board.stop()
+    api.close()
+    typed = typed_text([report for _, report in board.typed])
+    answer = "".join(board.code.transliterate(content(event)) for event in api.content)
+    table = board.code.typist.table
+    answer = "".join(c for c in answer if ord(c) < 128 and table[ord(c)])
+    return api, jobs.last.status, typed, answer, elapsed, board.output.getvalue()
+
+
+def check_overlap():
+    for text, expected in OVERLAPS:
+        # Whole and a character at a time
+        for pieces in ([text], list(text)):
+            overlap = Overlap(CUT)
+            out = "".join(overlap.feed(piece) for piece in pieces) + overlap.finish()
+            assert out == expected, (text, out)
+            assert overlap.repeated == len(text) - len(expected), (text, overlap.repeated)
+
+
+def main():
+    check_overlap()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=100, help="tokens per second from the mock API")
+    args = parser.parse_args()
+    with open(README) as f:
+        events = answer_events(f.read())
+    print("  scenario   how         requests  cuts  generated  typed  status  time s")
+    for scenario in SCENARIOS:
+        name = scenario[0]
+        for how in ("resume", "start over"):
+            api, status, typed, answer, elapsed, output = asyncio.run(run(how, scenario, events, args.rate))
+            if how == "resume" and name != "hopeless":
+                assert status == "done" and typed == answer, (name, status, output[-2000:])
+            if name == "hopeless" and how == "resume":
+                # What came before stays, once
+                assert status == "failed" and answer.startswith(typed), (status, output[-2000:])
+            print("  %-9s  %-10s  %8d  %4d  %4d/%-4d  %5.2f  %-6s  %6.1f" % (
+                name, how, len(api.requests), api.cuts, api.generated, len(api.content),
+                len(typed) / len(answer), status, elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# Selections over the USB serial data channel, with a pty standing in for
+# usb_cdc.data: the board end is the pty, the PC end writes to its master
+# like a COM port. Compares the old read_from_serial_monitor loop, read(1)
+# while in_waiting, against serial_input.SerialReceiver reading everything
+# waiting at once into one buffer. The receiver runs next to a task polling
+# like keyboard_task, and reports how long that task was kept waiting.
+# Latency is from the last byte written to the ACK arriving on the PC end,
+# raw is text without the header like send-selection-to-com-port.ahk
+# writes, which ends after serial_input.RAW_IDLE.
+# Linux only.
+#
+#   python benchmarks/bench_serial.py
+import asyncio
+import fcntl
+import os
+import struct
+import sys
+import tempfile
+import termios
+import threading
+import time
+import tty
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from clipboard import encode_clipboard, END, ACK  # noqa: E402
+from serial_input import SerialReceiver  # noqa: E402
+
+SIZES = (200, 4096, 32768)
+ROUNDS = 3
+TEXT = "def wrap(text):\n    return [line.strip() for line in text.split('\\n')]  # ăîșțâ\n"
+
+
+class PtySerial:
+    # The calls code.py makes on usb_cdc.data, on the board end of a pty
+    def __init__(self, fd):
+        self.fd = fd
+        self.timeout = None
+        os.set_blocking(fd, False)
+
+    @property
+    def in_waiting(self):
+        return struct.unpack("i", fcntl.ioctl(self.fd, termios.FIONREAD, b"\0\0\0\0"))[0]
+
+    def read(self, size=1):
+        return os.read(self.fd, size)
+
+    def readinto(self, buf):
+        return os.readv(self.fd, [buf])
+
+    def write(self, data):
+        return os.write(self.fd, data)
+
+    def reset_input_buffer(self):
+        termios.tcflush(self.fd, termios.TCIFLUSH)
+
+
+def open_pty():
+    pc, board = os.openpty()
+    tty.setraw(pc)
+    tty.setraw(board)
+    return pc, board
+
+
+def payload(size):
+    text = (TEXT * (size // len(TEXT) + 1)).encode()[:size]
+    # Don't cut a character in half
+    return text.decode("utf-8", "ignore").encode()
+
+
+class Writer(threading.Thread):
+    # The PC end: writes the data, then waits for the answer byte
+    def __init__(self, fd, data, expect_reply):
+        super().__init__(daemon=True)
+        self.fd = fd
+        self.data = data
+        self.expect_reply = expect_reply
+        self.written = None
+        self.replied = None
+        self.reply = None
+
+    def run(self):
+        view = memoryview(self.data)
+        while view:
+            view = view[os.write(self.fd, view):]
+        self.written = time.perf_counter()
+        if self.expect_reply:
+            self.reply = os.read(self.fd, 1)
+            self.replied = time.perf_counter()
+
+
+async def poller(stats, stop):
+    # Like keyboard_task, yields and comes back
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0)
+        now = time.perf_counter()
+        stats["max_gap"] = max(stats["max_gap"], now - last)
+        last = now
+
+
+async def old_path(serial, size):
+    # read_from_serial_monitor from before, called from the main loop
+    in_data = bytearray()
+    while len(in_data) < size:
+        while serial.in_waiting:
+            byte = serial.read(1)
+            in_data.append(byte[0])
+        await asyncio.sleep(0)
+    return bytes(in_data)
+
+
+async def new_path(receiver):
+    while not receiver.waiting:
+        await asyncio.sleep(0)
+    clipboard = await receiver.receive()
+    text = clipboard.read()
+    clipboard.remove()
+    return text.encode()
+
+
+async def run(name, data, spill_dir):
+    pc, board = open_pty()
+    serial = PtySerial(board)
+    stats = {"max_gap": 0}
+    stop = asyncio.Event()
+    poll = asyncio.create_task(poller(stats, stop))
+    if name == "old":
+        writer = Writer(pc, data, False)
+        start = time.perf_counter()
+        writer.start()
+        received = await old_path(serial, len(data))
+        done = time.perf_counter()
+    elif name == "raw":
+        receiver = SerialReceiver(serial, spill_dir=spill_dir)
+        writer = Writer(pc, data, False)
+        start = time.perf_counter()
+        writer.start()
+        received = await new_path(receiver)
+        done = time.perf_counter()
+    else:
+        receiver = SerialReceiver(serial, spill_dir=spill_dir)
+        writer = Writer(pc, encode_clipboard(data, end=END), True)
+        start = time.perf_counter()
+        writer.start()
+        received = await new_path(receiver)
+        while writer.replied is None:
+            await asyncio.sleep(0.001)
+        assert writer.reply == ACK
+        done = writer.replied
+    stop.set()
+    await poll
+    writer.join()
+    os.close(pc)
+    os.close(board)
+    assert received == data
+    return done - start, done - writer.written, stats["max_gap"]
+
+
+def main():
+    spill_dir = tempfile.mkdtemp()
+    print("  bytes   path  KB/s      latency ms  longest stall ms")
+    for size in SIZES:
+        data = payload(size)
+        for name in ("old", "new", "raw"):
+            best = None
+            for _ in range(ROUNDS):
+                result = asyncio.run(run(name, data, spill_dir))
+                if best is None or result[0] < best[0]:
+                    best = result
+            elapsed, latency, stall = best
+            print("  %6d  %-4s  %8.0f  %10.2f  %16.2f" % (
+                len(data), name, len(data) / elapsed / 1024, latency * 1e3, stall * 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
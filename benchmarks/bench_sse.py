@@ -0,0 +1,85 @@
+# Compares the old byte-at-a-time iter_lines + json.loads loop from code.py
+# with sse.SSEDecoder on recorded OpenAI stream captures.
+#
+#   python benchmarks/bench_sse.py [capture.sse ...]
+import glob
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from sse import SSEDecoder, SSE_CHUNK_SIZE  # noqa: E402
+
+ROUNDS = 20
+
+
+def chunked(data, size):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+# Old implementation, as it was in code.py
+def iter_lines(chunks):
+    partial_line = []
+    for c in chunks:
+        if c == b'\n':
+            yield (b"".join(partial_line)).decode('utf-8')
+            del partial_line[:]
+        else:
+            partial_line.append(c)
+    if partial_line:
+        yield (b"".join(partial_line)).decode('utf-8')
+
+
+def old_tokens(data):
+    tokens = []
+    for line in iter_lines(chunked(data, 1)):
+        if line.startswith("data: [DONE]"):
+            break
+        if line.startswith("data: "):
+            data = json.loads(line[5:])
+            word = data.get('choices')[0].get('delta').get('content')
+            if word is not None:
+                tokens.append(word)
+    return tokens
+
+
+def new_tokens(data, chunk_size=SSE_CHUNK_SIZE):
+    decoder = SSEDecoder()
+    return list(decoder.iter_content(chunked(data, chunk_size)))
+
+
+def timed(fn, *args):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main(paths):
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        old_time, expected = timed(old_tokens, data)
+        print(os.path.basename(path), len(data), "bytes", len(expected), "tokens")
+        print("  %-28s %8.2f ms %10.0f tokens/s" % ("iter_lines + json.loads", old_time * 1000, len(expected) / old_time))
+        for chunk_size in (64, 256, SSE_CHUNK_SIZE):
+            new_time, tokens = timed(new_tokens, data, chunk_size)
+            if tokens != expected:
+                print("  MISMATCH with chunk size", chunk_size)
+                return 1
+            label = "SSEDecoder chunk=%d" % chunk_size
+            print("  %-28s %8.2f ms %10.0f tokens/s  x%.1f" % (label, new_time * 1000, len(tokens) / new_time, old_time / new_time))
+    return 0
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(HERE, "captures", "*.sse")))
+    sys.exit(main(paths))
@@ -0,0 +1,79 @@
+# Per-token cost of remove_diacritics from code.py against
+# transliterate.Transliterator with the table in transliteration.txt, on the
+# recorded English stream, Romanian text, and text full of smart quotes,
+# dashes and other European letters. Both must agree wherever the old
+# function changed something, and the new output must be plain ASCII.
+#
+#   python benchmarks/bench_transliterate.py [capture.sse]
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from sse import SSEDecoder  # noqa: E402
+from transliterate import Transliterator, load_table  # noqa: E402
+from bench_hid_report import hid_table  # noqa: E402
+
+DECODE_DIACRITICS = hid_table("DECODE_DIACRITICS")
+TABLE_PATH = os.path.join(HERE, "..", "circuit-python-processor", "transliteration.txt")
+ROUNDS = 20
+
+ROMANIAN = ("Învățarea automată este un domeniu în care sistemele își îmbunătățesc "
+            "performanța pe baza datelor. Ştiinţa datelor şi statistica stau la bază, "
+            "iar rețelele neuronale sunt folosite în recunoașterea imaginilor. ")
+EUROPEAN = ("“Größe” – the café’s crème brûlée costs 5 € … naïve façade, Ærøskøbing, "
+            "Łódź, Dvořák, smörgåsbord — «déjà vu» at 20 °C ± 2°, ½ price now, π ≈ 3.14 🙂 ")
+
+
+def remove_diacritics(word):
+    for diacritic in DECODE_DIACRITICS:
+        word = word.replace(diacritic, DECODE_DIACRITICS[diacritic])
+    return word
+
+
+def split_tokens(text, repeat=8):
+    # Roughly like the API, a word with its leading space per token
+    tokens = []
+    for word in (text * repeat).split(" "):
+        tokens.append(" " + word)
+    return tokens
+
+
+def timed(fn, tokens):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        out = [fn(token) for token in tokens]
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(tokens), out
+
+
+def main(path):
+    with open(path, "rb") as f:
+        english = list(SSEDecoder().iter_content([f.read()]))
+    table = load_table(TABLE_PATH)
+    transliterate = Transliterator(table)
+    for diacritic in DECODE_DIACRITICS:
+        assert table[ord(diacritic)] == DECODE_DIACRITICS[diacritic]
+    print("%d entries in transliteration.txt" % len(table))
+    print("  text       tokens  remove_diacritics  Transliterator")
+    for name, tokens in (("english", english), ("romanian", split_tokens(ROMANIAN)), ("european", split_tokens(EUROPEAN))):
+        old_time, old = timed(remove_diacritics, tokens)
+        new_time, new = timed(transliterate, tokens)
+        for before, after, token in zip(old, new, tokens):
+            assert after.encode().decode("ascii") == after
+            if before != token:
+                assert before == after, (before, after)
+        print("  %-9s  %6d  %11.2f us  %11.2f us  x%.1f" % (
+            name, len(tokens), old_time * 1e6, new_time * 1e6, old_time / new_time))
+    print("  %d characters fell back to %r" % (transliterate.unmapped, transliterate.fallback))
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "openai_chat_stream.sse")
+    sys.exit(main(path))
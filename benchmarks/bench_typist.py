@@ -0,0 +1,102 @@
+# Replays the tokens of a recorded chat completion stream, arriving one every
+# TOKEN_INTERVAL, and types them on a fake keyboard whose send_report blocks
+# for REPORT_COST, like USB waiting for the host to poll. Once the old way,
+# layout.write inline in the reader, once through typist.Typist. Prints when
+# the reader got through the stream, when typing finished, and the reports
+# sent. The reports are decoded back to text to check both typed the same.
+#
+#   python benchmarks/bench_typist.py [capture.sse]
+import asyncio
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "circuit-python-processor"))
+
+from sse import SSEDecoder  # noqa: E402
+from typist import Typist, build_report_table, SHIFT_FLAG, LEFT_SHIFT  # noqa: E402
+from bench_hid_report import HID_KEYCODE_TO_ASCII  # noqa: E402
+
+TOKEN_INTERVAL = 0.002
+REPORT_COST = 0.0005
+KEYS_PER_SECOND = 1000
+
+
+class FakeKeyboard:
+    def __init__(self):
+        self.reports = []
+
+    def send_report(self, report):
+        time.sleep(REPORT_COST)
+        self.reports.append(bytes(report))
+
+
+def typed_text(reports):
+    # A character for every key that goes down
+    characters = {}
+    for keycode, (plain, shifted) in enumerate(HID_KEYCODE_TO_ASCII):
+        characters[keycode, 0] = plain
+        characters[keycode, LEFT_SHIFT] = shifted
+    out = []
+    held = set()
+    for report in reports:
+        keys = set(k for k in report[2:] if k)
+        for keycode in keys - held:
+            out.append(characters[keycode, report[0] & LEFT_SHIFT])
+        held = keys
+    return "".join(out)
+
+
+def old_write(keyboard, table, text):
+    # KeyboardLayoutUS.write: press (shift and) the key, then release_all
+    for character in text:
+        code = table[ord(character)] if ord(character) < 128 else 0
+        if not code:
+            continue
+        keyboard.send_report(bytes((LEFT_SHIFT if code & SHIFT_FLAG else 0, 0, code & 0x7F, 0, 0, 0, 0, 0)))
+        keyboard.send_report(bytes(8))
+
+
+async def old_pipeline(tokens, table):
+    keyboard = FakeKeyboard()
+    start = time.perf_counter()
+    for token in tokens:
+        await asyncio.sleep(TOKEN_INTERVAL)
+        old_write(keyboard, table, token)
+    done = time.perf_counter() - start
+    return done, done, keyboard.reports
+
+
+async def new_pipeline(tokens, table):
+    keyboard = FakeKeyboard()
+    typist = Typist(keyboard, table, KEYS_PER_SECOND)
+    task = asyncio.create_task(typist.run())
+    start = time.perf_counter()
+    for token in tokens:
+        await asyncio.sleep(TOKEN_INTERVAL)
+        await typist.put(token)
+    read = time.perf_counter() - start
+    await typist.flush()
+    typed = time.perf_counter() - start
+    task.cancel()
+    return read, typed, keyboard.reports
+
+
+def main(path):
+    with open(path, "rb") as f:
+        tokens = list(SSEDecoder().iter_content([f.read()]))
+    table = build_report_table(HID_KEYCODE_TO_ASCII)
+    expected = "".join(c for c in "".join(tokens) if ord(c) < 128 and table[ord(c)])
+    print(os.path.basename(path), len(tokens), "tokens", len(expected), "characters")
+    for name, pipeline in (("layout.write", old_pipeline), ("Typist", new_pipeline)):
+        read, typed, reports = asyncio.run(pipeline(tokens, table))
+        assert typed_text(reports) == expected, name
+        print("  %-13s reader done %6.0f ms  typing done %6.0f ms  %5d reports" % (
+            name, read * 1e3, typed * 1e3, len(reports)))
+    return 0
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "captures", "openai_chat_stream.sse")
+    sys.exit(main(path))
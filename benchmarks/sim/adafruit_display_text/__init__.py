@@ -0,0 +1,6 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from bench_layout import wrap_text_to_pixels  # noqa: E402,F401
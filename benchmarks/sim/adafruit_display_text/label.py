@@ -0,0 +1,31 @@
+import displayio
+
+
+class Label:
+    def __init__(self, font, text="", color=0xFFFFFF, x=0, y=0, line_spacing=1.25, **kwargs):
+        self.font = font
+        self.color = color
+        self.x = x
+        self.y = y
+        self.parent = None
+        self._line_height = int(font.get_bounding_box()[1] * line_spacing)
+        self._text = ""
+        self.text = text
+
+    def _size(self, text):
+        lines = text.split("\n") if text else []
+        width = max([len(line) for line in lines] + [0]) * self.font.get_bounding_box()[0]
+        return width, len(lines) * self._line_height
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        # The old and the new text box are redrawn
+        old_width, old_height = self._size(self._text)
+        width, height = self._size(text)
+        scale = self.parent.total_scale if self.parent is not None else 1
+        self._text = text
+        displayio.mark_dirty(max(old_width, width) * max(old_height, height) * scale * scale)
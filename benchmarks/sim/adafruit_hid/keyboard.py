@@ -0,0 +1,38 @@
+from adafruit_hid import find_device
+from adafruit_hid.keycode import Keycode
+
+
+class Keyboard:
+    # Boot keyboard reports, up to six keys
+    def __init__(self, devices, timeout=None):
+        self._device = find_device(devices, usage_page=0x1, usage=0x06)
+        self.report = bytearray(8)
+        self._keys = memoryview(self.report)[2:]
+
+    def press(self, *keycodes):
+        for keycode in keycodes:
+            bit = Keycode.modifier_bit(keycode)
+            if bit:
+                self.report[0] |= bit
+            elif keycode not in self._keys:
+                for i in range(6):
+                    if self._keys[i] == 0:
+                        self._keys[i] = keycode
+                        break
+        self._device.send_report(self.report)
+
+    def release(self, *keycodes):
+        for keycode in keycodes:
+            bit = Keycode.modifier_bit(keycode)
+            if bit:
+                self.report[0] &= ~bit & 0xFF
+            else:
+                for i in range(6):
+                    if self._keys[i] == keycode:
+                        self._keys[i] = 0
+        self._device.send_report(self.report)
+
+    def release_all(self):
+        for i in range(8):
+            self.report[i] = 0
+        self._device.send_report(self.report)
@@ -0,0 +1,5 @@
+import displayio
+
+
+class ILI9341(displayio.Display):
+    pass
@@ -0,0 +1,4 @@
+# Pin names of the Pico W, pins are only passed around by the fakes
+for _n in range(29):
+    globals()["GP%d" % _n] = "GP%d" % _n
+LED = "LED"
@@ -0,0 +1,47 @@
+# UART with a receive buffer the simulator writes into, SPI that does nothing
+
+
+class UART:
+    instances = []
+
+    def __init__(self, tx, rx, baudrate=9600, timeout=1, receiver_buffer_size=64):
+        self.receiver_buffer_size = receiver_buffer_size
+        self._rx = bytearray()
+        self.overruns = 0
+        UART.instances.append(self)
+
+    def feed(self, data):
+        # Bytes arriving on RX, what doesn't fit in the buffer is lost
+        room = self.receiver_buffer_size - len(self._rx)
+        if len(data) > room:
+            self.overruns += len(data) - room
+            data = data[:room]
+        self._rx.extend(data)
+
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def readinto(self, buf):
+        size = min(len(buf), len(self._rx))
+        if not size:
+            return None
+        buf[:size] = self._rx[:size]
+        del self._rx[:size]
+        return size
+
+    def read(self, nbytes=None):
+        if not self._rx:
+            return None
+        size = len(self._rx) if nbytes is None else min(nbytes, len(self._rx))
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def write(self, data):
+        return len(data)
+
+
+class SPI:
+    def __init__(self, clock, MOSI=None, MISO=None):
+        pass
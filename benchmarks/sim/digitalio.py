@@ -0,0 +1,30 @@
+class Direction:
+    INPUT = "input"
+    OUTPUT = "output"
+
+
+class Pull:
+    UP = "up"
+    DOWN = "down"
+
+
+class DigitalInOut:
+    # Pins by name, so the simulator can press the encoder button
+    pins = {}
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self._pull = None
+        self.value = False
+        DigitalInOut.pins[pin] = self
+
+    @property
+    def pull(self):
+        return self._pull
+
+    @pull.setter
+    def pull(self, pull):
+        # An open button reads high with the pull-up
+        self._pull = pull
+        self.value = pull == Pull.UP
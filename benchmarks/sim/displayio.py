@@ -0,0 +1,91 @@
+# Enough of displayio for code.py. Labels report the area they change, the
+# display adds it up and pretends to push it over SPI on refresh.
+import time
+
+# Dirty pixels waiting for the next refresh
+_dirty = [0]
+
+
+def mark_dirty(pixels):
+    _dirty[0] += pixels
+    for display in Display.instances:
+        if display.auto_refresh:
+            display.refresh()
+
+
+def release_displays():
+    Display.instances = []
+
+
+class FourWire:
+    def __init__(self, spi, command=None, chip_select=None, reset=None, baudrate=24000000):
+        pass
+
+
+class Group(list):
+    def __init__(self, scale=1, x=0, y=0):
+        super().__init__()
+        self.scale = scale
+        self.x = x
+        self.y = y
+        self.parent = None
+
+    def append(self, item):
+        item.parent = self
+        super().append(item)
+
+    @property
+    def total_scale(self):
+        scale = self.scale
+        if self.parent is not None:
+            scale *= self.parent.total_scale
+        return scale
+
+
+class Bitmap:
+    def __init__(self, width, height, value_count):
+        self.width = width
+        self.height = height
+
+
+class Palette(list):
+    def __init__(self, color_count):
+        super().__init__([0] * color_count)
+
+
+class TileGrid:
+    def __init__(self, bitmap, pixel_shader=None, x=0, y=0, **kwargs):
+        self.bitmap = bitmap
+        self.x = x
+        self.y = y
+        self.parent = None
+
+
+class Display:
+    instances = []
+    # Time to push one pixel, about 24 MHz SPI at 16 bits a pixel
+    pixel_seconds = 0.7e-6
+
+    def __init__(self, display_bus, width, height, rotation=0, auto_refresh=True, **kwargs):
+        self.width = width
+        self.height = height
+        self.auto_refresh = auto_refresh
+        self.root_group = None
+        # (time.perf_counter(), pixels) for every refresh
+        self.refreshes = []
+        Display.instances.append(self)
+
+    def show(self, group):
+        self.root_group = group
+        mark_dirty(self.width * self.height)
+
+    def refresh(self, target_frames_per_second=None, minimum_frames_per_second=0):
+        pixels = _dirty[0]
+        _dirty[0] = 0
+        if pixels:
+            # Blocks like the real transfer does
+            end = time.perf_counter() + pixels * self.pixel_seconds
+            while time.perf_counter() < end:
+                pass
+        self.refreshes.append((time.perf_counter(), pixels))
+        return True
@@ -0,0 +1,6 @@
+class IncrementalEncoder:
+    instances = []
+
+    def __init__(self, pin_a, pin_b, divisor=4):
+        self.position = 0
+        IncrementalEncoder.instances.append(self)
@@ -0,0 +1,41 @@
+# socketpool on top of the socket module. Addresses the board would use,
+# the API host and its own IP, are routed to local ones by ROUTES.
+import socket
+
+# (host, port) -> (host, port), port None matches any port
+ROUTES = {}
+
+
+def route(address):
+    host, port = address[0], address[1]
+    target = ROUTES.get((host, port)) or ROUTES.get((host, None))
+    if target is None:
+        return (host, port)
+    return (target[0], port if target[1] is None else target[1])
+
+
+class Socket(socket.socket):
+    def bind(self, address):
+        super().bind(route(address))
+
+    def connect(self, address):
+        super().connect(route(address))
+
+
+class SocketPool:
+    AF_INET = socket.AF_INET
+    SOCK_STREAM = socket.SOCK_STREAM
+    EAGAIN = 11
+    ETIMEDOUT = 116
+
+    def __init__(self, radio):
+        self.radio = radio
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        # No DNS, connect goes through ROUTES
+        return [(socket.AF_INET, socket.SOCK_STREAM, 0, "", (host, port))]
+
+    def socket(self, family=socket.AF_INET, type=socket.SOCK_STREAM, proto=0):
+        sock = Socket(family, type, proto)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
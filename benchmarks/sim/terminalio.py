@@ -0,0 +1,16 @@
+class Glyph:
+    shift_x = 6
+
+
+class BuiltinFont:
+    # terminalio.FONT is 6x12, every glyph the same width
+    glyph = Glyph()
+
+    def get_bounding_box(self):
+        return (6, 12)
+
+    def get_glyph(self, codepoint):
+        return self.glyph
+
+
+FONT = BuiltinFont()
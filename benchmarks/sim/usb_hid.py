@@ -0,0 +1,26 @@
+# The composite USB HID devices. Reports are recorded with the time they
+# were sent instead of going to a PC.
+import time
+
+
+class Device:
+    def __init__(self, usage_page, usage, report_length):
+        self.usage_page = usage_page
+        self.usage = usage
+        self.report_length = report_length
+        # (time.perf_counter(), report)
+        self.reports = []
+
+    def send_report(self, report, report_id=None):
+        self.reports.append((time.perf_counter(), bytes(report)))
+
+
+KEYBOARD = Device(0x01, 0x06, 8)
+MOUSE = Device(0x01, 0x02, 4)
+CONSUMER_CONTROL = Device(0x0C, 0x01, 2)
+devices = [KEYBOARD, MOUSE, CONSUMER_CONTROL]
+
+
+def reset():
+    for device in devices:
+        device.reports = []
@@ -0,0 +1,46 @@
+import ipaddress
+import time
+
+
+class Network:
+    def __init__(self, ssid, channel, bssid):
+        self.ssid = ssid
+        self.channel = channel
+        self.bssid = bssid
+
+
+class Radio:
+    # connect blocks for connect_seconds, plus scan_seconds without a BSSID
+    # to go to, and fails while failures is above 0
+    def __init__(self):
+        self.ipv4_address = None
+        self.connected = False
+        self.ap_info = None
+        self.connect_seconds = 0
+        self.scan_seconds = 0
+        self.failures = 0
+        # (ssid, channel, bssid) for every connect call
+        self.attempts = []
+
+    def reset(self):
+        self.__init__()
+
+    def set_ipv4_address(self, ipv4, netmask, gateway, ipv4_dns=None):
+        self.ipv4_address = ipv4
+
+    def connect(self, ssid, password=None, *, channel=0, bssid=None, timeout=None):
+        self.attempts.append((ssid, channel, bssid))
+        time.sleep(self.connect_seconds + (0 if bssid else self.scan_seconds))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("No network with that ssid")
+        self.connected = True
+        self.ap_info = Network(ssid, 6, b"\x02\x00\x00\x00\x00\x01")
+        if self.ipv4_address is None:
+            self.ipv4_address = ipaddress.IPv4Address("192.168.4.2")
+
+    def ping(self, ip, timeout=0.5):
+        return 0.001
+
+
+radio = Radio()
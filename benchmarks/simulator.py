@@ -0,0 +1,355 @@
+# Runs code.py on CPython. The CircuitPython modules it imports are replaced
+# by the fakes in sim/, the API by a local server streaming a recorded
+# response at a set token rate, and the keyboard Pico by reports written into
+# the fake UART. Everything the board would send out, HID reports and screen
+# refreshes, is recorded with its time.
+#
+# Every Board loads a fresh copy of code.py with flash redirected to a
+# temporary directory, so runs don't share state.
+import asyncio
+import contextlib
+import functools
+import importlib.util
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROCESSOR = os.path.join(HERE, "..", "circuit-python-processor")
+sys.path.insert(0, PROCESSOR)
+sys.path.insert(0, os.path.join(HERE, "sim"))
+
+import busio  # noqa: E402
+import displayio  # noqa: E402
+import socketpool  # noqa: E402
+import usb_hid  # noqa: E402
+import wifi  # noqa: E402
+import transliterate  # noqa: E402
+from framing import cobs_encode  # noqa: E402
+from hid import HID_KEYCODE_TO_ASCII  # noqa: E402
+
+API_PORT = 443
+BOARD_IP = "192.168.43.164"
+LEFT_GUI = 0x08
+LEFT_SHIFT = 0x02
+ENTER = 0x28
+
+ENVIRONMENT = {
+    "WIFI_SSID": "simulator",
+    "WIFI_PASSWORD": "simulator",
+    "OPENAI_API_KEY": "sk-simulator",
+}
+
+# Character -> (keycode, shifted), for typing prompts
+_KEYS = {}
+for _keycode in range(len(HID_KEYCODE_TO_ASCII)):
+    for _shifted in (1, 0):
+        _character = HID_KEYCODE_TO_ASCII[_keycode][_shifted]
+        if isinstance(_character, str):
+            _KEYS[_character] = (_keycode, _shifted)
+
+
+def report(modifiers=0, *keycodes):
+    out = bytearray(8)
+    out[0] = modifiers
+    out[2:2 + len(keycodes)] = bytes(keycodes)
+    return bytes(out)
+
+
+def type_reports(text):
+    # A press and a release for every character
+    reports = []
+    for character in text:
+        keycode, shifted = _KEYS[character]
+        reports.append(report(LEFT_SHIFT if shifted else 0, keycode))
+        reports.append(report())
+    return reports
+
+
+def chord_reports(modifiers, keycode):
+    return [report(modifiers, keycode), report()]
+
+
+def load_events(path, repeat=1):
+    # The SSE events of a capture, the content ones repeated
+    with open(path, "rb") as f:
+        events = [event + b"\n\n" for event in f.read().split(b"\n\n") if event.strip()]
+    content = [event for event in events if b'"content"' in event]
+    first = events.index(content[0])
+    last = events.index(content[-1])
+    return events[:first] + content * repeat + events[last + 1:]
+
+
+class MockAPI:
+    # Chat completions over plain HTTP, kept alive like the real one. The
+    # first event goes out after first_token_delay, the rest paced at
+    # events_per_second.
+    def __init__(self, events, events_per_second, first_token_delay=0.3):
+        self.events = events
+        self.interval = 1 / events_per_second
+        self.first_token_delay = first_token_delay
+        # (time.perf_counter(), request body) for every request
+        self.requests = []
+        self._listener = socket.socket()
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(("127.0.0.1", 0))
+        self._listener.listen(4)
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        f = conn.makefile("rb")
+        try:
+            while True:
+                line = f.readline()
+                if not line:
+                    return
+                length = 0
+                while line not in (b"\r\n", b""):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                    line = f.readline()
+                self.requests.append((time.perf_counter(), f.read(length)))
+                time.sleep(self.first_token_delay)
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+                start = time.perf_counter()
+                for i, event in enumerate(self.events):
+                    wait = start + i * self.interval - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                    conn.sendall(b"%x\r\n%s\r\n" % (len(event), event))
+                conn.sendall(b"0\r\n\r\n")
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def close(self):
+        self._listener.close()
+
+
+class _SSLContext:
+    # The mock API has no TLS
+    def wrap_socket(self, sock, server_hostname=None):
+        return sock
+
+
+def _load_code(root, environment):
+    os.environ.update(ENVIRONMENT)
+    os.environ.update(environment)
+    busio.UART.instances = []
+    displayio.Display.instances = []
+    usb_hid.reset()
+    wifi.radio.reset()
+    # Called once the keyboard runs, the rest is patched in then too
+    transliterate.load_table.__defaults__ = (os.path.join(PROCESSOR, "transliteration.txt"),)
+    spec = importlib.util.spec_from_file_location("code_simulated", os.path.join(PROCESSOR, "code.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    import_features = module.import_features
+
+    def patched_import_features():
+        # The feature modules are only imported once the keyboard runs
+        import_features()
+        module.ssl = types.SimpleNamespace(create_default_context=_SSLContext)
+        module.ResponseHistory = functools.partial(module.ResponseHistory, directory=root + "/history")
+        module.Conversation = functools.partial(module.Conversation, directory=root + "/context")
+        module.ResponseCache = functools.partial(module.ResponseCache, directory=root + "/cache")
+        module.ClipboardReceiver = functools.partial(module.ClipboardReceiver, spill_dir=root + "/clipboard")
+        module.WifiManager = functools.partial(module.WifiManager, cache_path=root + "/wifi.txt")
+    module.import_features = patched_import_features
+    return module
+
+
+class Tail:
+    # What code.py prints, only the end is kept for error messages
+    def __init__(self, size=4000):
+        self.size = size
+        self.text = ""
+
+    def write(self, text):
+        self.text = (self.text + text)[-self.size:]
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return self.text
+
+
+class Board:
+    # code.py running in an event loop, with probes on the points where
+    # tokens come in, the screen gets drawn and HID reports go out. Without
+    # record the probes only count, for measuring the heap of code.py alone.
+    def __init__(self, api, environment=None, record=True):
+        self.api = api
+        self.record = record
+        self.root = tempfile.mkdtemp()
+        socketpool.ROUTES.clear()
+        socketpool.ROUTES[("api.openai.com", API_PORT)] = ("127.0.0.1", api.port)
+        socketpool.ROUTES[(BOARD_IP, None)] = ("127.0.0.1", 0)
+        self.output = Tail()
+        with contextlib.redirect_stdout(self.output):
+            self.code = _load_code(self.root, environment or {})
+        self.uart = busio.UART.instances[-1]
+        self.radio = wifi.radio
+        self.state = None
+        self.reset()
+        self._probe()
+
+    def reset(self):
+        # Forget what was recorded so far
+        self.fed = []
+        self.forwarded = []
+        self.typed = []
+        # Both in the order they went out, True for the typist's
+        self.sent = []
+        # Typist reports sent while the keyboard held keys or a prompt was
+        # typed, they land inside what the user types
+        self.collisions = 0
+        self._held = False
+        self.arrivals = []
+        self.tokens = []
+        self.token_count = 0
+        self.frames = []
+        self._shown = 0
+        if self.display is not None:
+            self.display.refreshes = []
+
+    @property
+    def display(self):
+        # Set up by code.py after the keyboard
+        return displayio.Display.instances[-1] if displayio.Display.instances else None
+
+    def _probe(self):
+        code = self.code
+        board = self
+        states = []
+
+        class State(code.State):
+            def __init__(self):
+                super().__init__()
+                states.append(self)
+        code.State = State
+        self._states = states
+
+        output_word = code.output_word
+
+        async def probed_output_word(word, history, show, typed=True):
+            board.token_count += 1
+            if board.record:
+                board.arrivals.append(time.perf_counter())
+                board.tokens.append(word)
+            await output_word(word, history, show, typed)
+        code.output_word = probed_output_word
+
+        scheduler = code.display_scheduler
+        show = scheduler.show
+
+        def probed_show(draw, *args):
+            # Tokens on the screen once this update is drawn
+            board._shown = board.token_count
+            show(draw, *args)
+        scheduler.show = probed_show
+
+        display_text = code.display_text
+
+        def probed_display_text(text_area, text):
+            shown = board._shown
+            display_text(text_area, text)
+            if board.record:
+                board.frames.append((time.perf_counter(), shown))
+        code.display_text = probed_display_text
+
+        device = usb_hid.KEYBOARD
+        typist_report = code.typist._report if code.typist is not None else None
+
+        def send_report(report, report_id=None):
+            if not board.record:
+                return
+            now = time.perf_counter()
+            typed = report is typist_report
+            if typed:
+                board.typed.append((now, bytes(report)))
+                if board._held or board.state.listening_for_prompt:
+                    board.collisions += 1
+            else:
+                board.forwarded.append((now, bytes(report)))
+                board._held = any(report)
+            board.sent.append((typed, bytes(report)))
+        device.send_report = send_report
+
+    async def start(self, online=True):
+        # Returns once code.py is up, with online once it reached the API
+        self._main = asyncio.create_task(self._run())
+        while not self._states:
+            await asyncio.sleep(0.001)
+        self.state = self._states[-1]
+        while online and not self.state.online:
+            await asyncio.sleep(0.001)
+        # The decoder drops what comes before the first delimiter, the
+        # keyboard Pico would have sent frames before this
+        self.uart.feed(b"\x00")
+        # Let every task get going
+        await asyncio.sleep(0.05)
+
+    async def _run(self):
+        with contextlib.redirect_stdout(self.output):
+            await self.code.main()
+
+    async def stop(self):
+        self._main.cancel()
+        try:
+            await self._main
+        except asyncio.CancelledError:
+            pass
+        if self.code.typist is not None:
+            self.code.typist.cancel()
+
+    async def feed(self, reports, interval):
+        # Writes reports to the UART like the keyboard Pico, one per interval
+        start = time.perf_counter()
+        for i, data in enumerate(reports):
+            wait = start + i * interval - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.uart.feed(cobs_encode(data))
+            if self.record and len(data) in (8, 13):
+                self.fed.append(time.perf_counter())
+
+    async def idle(self, timeout=60):
+        # Waits for the response, the typing and the screen to be done
+        end = time.perf_counter() + timeout
+        code = self.code
+        while time.perf_counter() < end:
+            busy = (self.state.streaming or len(code.prompt_queue) > 0
+                    or (code.typist is not None and code.typist.busy)
+                    or code.display_scheduler.pending or self.uart.in_waiting)
+            if not busy:
+                await asyncio.sleep(0.05)
+                return True
+            await asyncio.sleep(0.01)
+        return False
+
+    def typeable(self, text):
+        table = self.code.typist.table
+        count = 0
+        for character in text:
+            code = ord(character)
+            if code < 128 and table[code]:
+                count += 1
+        return count
@@ -0,0 +1,130 @@
+# OpenAI-compatible chat completion endpoints, like the cloud API and a
+# llama.cpp or vLLM server on the LAN. Every request goes to the endpoint
+# with the best score, the average time to first token plus a penalty for
+# recent errors, and moves on to the next one when an endpoint fails before
+# the first token.
+#
+# Endpoints come from settings.toml, names listed in API_ENDPOINTS:
+#   API_ENDPOINTS = "lan,openai"
+#   API_LAN_URL = "http://192.168.43.10:8080/v1/chat/completions"
+#   API_LAN_MODEL = "llama-3-8b-instruct"
+#   API_LAN_TIMEOUT = 5
+#   API_LAN_CONNECT_TIMEOUT = 1
+# API_<NAME>_KEY is sent as the bearer token. The endpoint named openai
+# defaults to the cloud API, gpt-3.5-turbo and OPENAI_API_KEY.
+import os
+import time
+from http_client import HTTPConnection, TIMEOUT, CONNECT_TIMEOUT
+
+ENDPOINTS = "openai"
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+OPENAI_MODEL = "gpt-3.5-turbo"
+# Score of an endpoint that didn't answer yet, about what the cloud takes.
+# Endpoints listed first are tried first, and stay in use when faster.
+UNKNOWN_TTFT_MS = 1000
+# Weight of the newest sample in the averages
+SMOOTHING = 0.25
+# Milliseconds added to the score per unit of error rate
+ERROR_PENALTY_MS = 10000
+# Seconds for the error rate to halve. An endpoint that failed gets another
+# chance once its penalty no longer outweighs the others, later the more
+# often it failed.
+ERROR_HALF_LIFE = 60
+
+
+def parse_url(url):
+    # (tls, host, port, path)
+    scheme, _, rest = url.partition("://")
+    tls = scheme.lower() == "https"
+    host, slash, path = rest.partition("/")
+    host, _, port = host.partition(":")
+    return tls, host, int(port) if port else (443 if tls else 80), slash + path
+
+
+class Endpoint:
+    def __init__(self, name, connection, path, model, api_key=None):
+        self.name = name
+        self.connection = connection
+        self.path = path
+        self.model = model
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["Authorization"] = "Bearer " + api_key
+        # Averages, None until the first answer
+        self.ttft_ms = None
+        self.error_rate = 0
+        self._decayed_at = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+
+    def _decay(self):
+        now = time.monotonic()
+        if self.error_rate:
+            self.error_rate *= 0.5 ** ((now - self._decayed_at) / ERROR_HALF_LIFE)
+        self._decayed_at = now
+
+    def score(self):
+        # Lower is better
+        self._decay()
+        score = UNKNOWN_TTFT_MS if self.ttft_ms is None else self.ttft_ms
+        return score + self.error_rate * ERROR_PENALTY_MS
+
+    def answered(self, ttft_ms):
+        self.requests += 1
+        if self.ttft_ms is None:
+            self.ttft_ms = ttft_ms
+        else:
+            self.ttft_ms += (ttft_ms - self.ttft_ms) * SMOOTHING
+        self._decay()
+        self.error_rate -= self.error_rate * SMOOTHING
+
+    def failed(self):
+        self.requests += 1
+        self.errors += 1
+        self._decay()
+        self.error_rate += (1 - self.error_rate) * SMOOTHING
+
+    def describe(self):
+        return "%s: %s ms to first token, %d of %d requests failed" % (
+            self.name, "?" if self.ttft_ms is None else int(self.ttft_ms), self.errors, self.requests)
+
+
+class Backend:
+    def __init__(self, endpoints):
+        self.endpoints = endpoints
+        # The answer depends on which models can give it, for the cache key
+        self.models = ",".join(endpoint.model for endpoint in endpoints)
+
+    def order(self):
+        # Best first, ties keep the order of the settings
+        return sorted(self.endpoints, key=lambda endpoint: endpoint.score())
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.connection.close()
+
+    def summary(self):
+        return "\n".join(endpoint.describe() for endpoint in self.endpoints)
+
+
+def load_endpoints(pool, ssl_context, getenv=os.getenv):
+    endpoints = []
+    for name in getenv("API_ENDPOINTS", ENDPOINTS).split(","):
+        name = name.strip()
+        if not name:
+            continue
+        prefix = "API_%s_" % name.upper()
+        openai = name.lower() == "openai"
+        url = getenv(prefix + "URL", OPENAI_URL if openai else None)
+        model = getenv(prefix + "MODEL", OPENAI_MODEL if openai else None)
+        if url is None or model is None:
+            print("Skipping endpoint", name + ",", prefix + "URL and", prefix + "MODEL are needed")
+            continue
+        api_key = getenv(prefix + "KEY", getenv("OPENAI_API_KEY") if openai else None)
+        timeout = int(getenv(prefix + "TIMEOUT", TIMEOUT))
+        connect_timeout = int(getenv(prefix + "CONNECT_TIMEOUT", CONNECT_TIMEOUT))
+        tls, host, port, path = parse_url(url)
+        connection = HTTPConnection(pool, ssl_context if tls else None, host, port, timeout,
+                                    connect_timeout=connect_timeout)
+        endpoints.append(Endpoint(name, connection, path, model, api_key))
+    return Backend(endpoints)
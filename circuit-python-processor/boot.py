@@ -0,0 +1,19 @@
+import board
+import storage
+import usb_cdc
+from digitalio import DigitalInOut, Direction, Pull
+
+# CircuitPython can only write to flash when the PC can't. Hold the encoder
+# button while plugging in to keep the drive writable from the PC, for
+# copying new code. Otherwise code.py gets write access, big clipboards are
+# spilled there.
+button = DigitalInOut(board.GP18)
+button.direction = Direction.INPUT
+button.pull = Pull.UP
+if button.value:
+    storage.remount("/", readonly=False)
+button.deinit()
+
+# A second COM port for prompts and selections from the PC, see
+# serial_input.py. The console stays on the first one.
+usb_cdc.enable(console=True, data=True)
@@ -0,0 +1,26 @@
+# Milliseconds from the start of code.py to every boot stage, like the
+# keyboard being forwarded or the API becoming reachable. Each stage is
+# kept the first time it's reached.
+import time
+
+
+class BootTimer:
+    def __init__(self, start=None):
+        self.start = time.monotonic_ns() if start is None else start
+        # (name, ms), in the order they were reached
+        self.stages = []
+
+    def mark(self, name):
+        for stage in self.stages:
+            if stage[0] == name:
+                return
+        self.stages.append((name, (time.monotonic_ns() - self.start) // 1000000))
+
+    def get(self, name):
+        for stage in self.stages:
+            if stage[0] == name:
+                return stage[1]
+        return None
+
+    def summary(self):
+        return "Boot: " + ", ".join("%s %d ms" % stage for stage in self.stages)
@@ -0,0 +1,49 @@
+# Keyboard shortcuts. A chord is a set of modifiers plus one trigger key,
+# stored in a dict under (trigger key << 4 | modifier bits), so a report is
+# matched with one lookup per newly pressed key however many chords exist.
+# Actions fire on the edge: on_press when the trigger key goes down with
+# exactly those modifiers held, on_release when that key comes back up.
+
+# Modifier bits, the left and right keys count as the same modifier
+CONTROL = 0x01
+SHIFT = 0x02
+ALT = 0x04
+GUI = 0x08
+
+# Modifier byte of a report -> modifier bits
+MODIFIER_MASKS = bytes((byte | byte >> 4) & 0x0F for byte in range(256))
+
+
+class ChordTable:
+    def __init__(self):
+        self._chords = {}
+        # Trigger keycode -> chord, for chords that fired and are still held
+        self._held = {}
+
+    def add(self, modifiers, keycode, on_press=None, on_release=None):
+        key = keycode << 4 | modifiers
+        if key in self._chords:
+            raise ValueError("Chord already registered")
+        self._chords[key] = (on_press, on_release)
+
+    def __len__(self):
+        return len(self._chords)
+
+    def dispatch(self, keys, *args):
+        # keys is a ReportDecoder that just decoded a report. Returns True if
+        # a chord fired on this report.
+        for i in range(keys.released_count):
+            chord = self._held.pop(keys.released[i], None)
+            if chord is not None and chord[1] is not None:
+                chord[1](*args)
+        fired = False
+        modifiers = MODIFIER_MASKS[keys.current.modifiers]
+        for i in range(keys.pressed_count):
+            keycode = keys.pressed[i]
+            chord = self._chords.get(keycode << 4 | modifiers)
+            if chord is not None:
+                self._held[keycode] = chord
+                fired = True
+                if chord[0] is not None:
+                    chord[0](*args)
+        return fired
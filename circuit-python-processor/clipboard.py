@@ -0,0 +1,358 @@
+# Clipboard transfer from the PC over TCP.
+#
+# A transfer starts with an 8 byte header: b"PNP", a flags byte and the
+# payload length as a big endian u32. Without FLAG_CHECKSUMS the payload
+# follows as is. With it, the payload is sent as frames of a big endian u16
+# size, the data and the big endian crc32 of the data. The server answers
+# ACK once the whole payload arrived intact, NAK otherwise.
+#
+# Anything that doesn't start with the magic is the old format, raw text
+# until the PC closes the connection.
+#
+# The same transfers come in over the USB serial data channel, see
+# serial_input.py. There the payload is followed by END, so a byte lost on
+# the way shows up as a transfer that doesn't end where the length says.
+import asyncio
+import binascii
+import os
+import time
+from http_client import would_block, ETIMEDOUT
+
+MAGIC = b"PNP"
+FLAG_CHECKSUMS = 1
+HEADER_SIZE = 8
+ACK = b"\x06"
+NAK = b"\x15"
+END = b"\x03"
+
+# Size of the reusable receive buffer
+RECV_SIZE = 512
+# Payloads bigger than this go to flash instead of staying in RAM, a file
+# each until the prompt they went into is done with, see prompt.py
+SPILL_THRESHOLD = 4096
+SPILL_DIR = "/clipboard"
+# Seconds to wait for the PC to connect, and between two reads after that
+TIMEOUT = 7
+
+
+def _sequence_length(byte):
+    if byte < 0x80:
+        return 1
+    if byte & 0xE0 == 0xC0:
+        return 2
+    if byte & 0xF0 == 0xE0:
+        return 3
+    if byte & 0xF8 == 0xF0:
+        return 4
+    # Stray continuation byte, let the decode fail on it
+    return 1
+
+
+def _decode(view):
+    try:
+        return str(view, "utf-8")
+    except UnicodeError:
+        return "".join([chr(b) if b < 0x80 else "?" for b in view])
+
+
+class Utf8Decoder:
+    # Decodes a byte stream read by read. A character split between two
+    # reads is held back until the rest of it arrives.
+
+    def __init__(self):
+        self._pending = bytearray(4)
+        self._pending_len = 0
+        self._need = 0
+
+    def reset(self):
+        self._pending_len = 0
+
+    def decode(self, buf, size):
+        view = memoryview(buf)
+        start = 0
+        head = ""
+        if self._pending_len:
+            take = min(self._need - self._pending_len, size)
+            self._pending[self._pending_len:self._pending_len + take] = view[:take]
+            self._pending_len += take
+            start = take
+            if self._pending_len < self._need:
+                return ""
+            head = _decode(memoryview(self._pending)[:self._pending_len])
+            self._pending_len = 0
+        # Only the last 3 bytes can be the start of an unfinished character
+        end = size
+        i = size - 1
+        while i >= start and i >= size - 3:
+            byte = buf[i]
+            if byte & 0xC0 != 0x80:
+                if i + _sequence_length(byte) > size:
+                    end = i
+                break
+            i -= 1
+        if end < size:
+            self._need = _sequence_length(buf[end])
+            self._pending_len = size - end
+            self._pending[:self._pending_len] = view[end:size]
+        if start == end:
+            return head
+        return head + _decode(view[start:end])
+
+    def pending(self):
+        # The bytes of an unfinished character
+        return memoryview(self._pending)[:self._pending_len]
+
+    def finish(self):
+        # Whatever is left can never complete
+        text = _decode(memoryview(self._pending)[:self._pending_len]) if self._pending_len else ""
+        self._pending_len = 0
+        return text
+
+
+class Clipboard:
+    # A received clipboard, either as text in RAM or as a file on flash
+
+    def __init__(self, text, path, size):
+        self._text = text
+        self.path = path
+        self.size = size
+
+    def chunks(self, chunk_size=RECV_SIZE):
+        # Yields the text piece by piece, without loading a spilled file whole
+        if self.path is None:
+            yield self._text
+            return
+        decoder = Utf8Decoder()
+        buf = bytearray(chunk_size)
+        with open(self.path, "rb") as f:
+            while True:
+                size = f.readinto(buf)
+                if not size:
+                    break
+                yield decoder.decode(buf, size)
+        yield decoder.finish()
+
+    def read(self):
+        if self.path is None:
+            return self._text
+        return "".join(self.chunks())
+
+    def remove(self):
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self._text = ""
+
+
+class ClipboardReceiver:
+    # Accepts one clipboard transfer at a time on a non-blocking server
+    # socket. Reads go into one preallocated buffer, small payloads are
+    # decoded into RAM as they arrive, big ones are written to flash.
+
+    def __init__(self, recv_size=RECV_SIZE, spill_threshold=SPILL_THRESHOLD,
+                 spill_dir=SPILL_DIR, timeout=TIMEOUT, end=None):
+        self._buf = bytearray(recv_size)
+        self._view = memoryview(self._buf)
+        self._decoder = Utf8Decoder()
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.spill_path = None
+        self._spills = 0
+        self.writable = True
+        # Files left over from before a reset
+        try:
+            for name in os.listdir(spill_dir):
+                os.remove(spill_dir + "/" + name)
+        except OSError:
+            try:
+                os.mkdir(spill_dir)
+            except OSError:
+                # Read-only filesystem, see boot.py
+                self.writable = False
+        self.timeout = timeout
+        # Expected after the payload, None when the length alone ends it
+        self.end = end
+        self._pieces = []
+        self._file = None
+        self._spill_failed = False
+        self.size = 0
+
+    async def _accept(self, server):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                return server.accept()
+            except OSError as e:
+                if not would_block(e):
+                    raise
+                if time.monotonic() > deadline:
+                    raise OSError(ETIMEDOUT)
+                await asyncio.sleep(0.05)
+
+    async def _recv(self, conn, start, end):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                return conn.recv_into(self._view[start:end])
+            except OSError as e:
+                if not would_block(e):
+                    raise
+                if time.monotonic() > deadline:
+                    raise OSError(ETIMEDOUT)
+                await asyncio.sleep(0)
+
+    async def _read_exact(self, conn, size):
+        # Fills the start of the buffer, returns less than size on EOF
+        got = 0
+        while got < size:
+            n = await self._recv(conn, got, size)
+            if n == 0:
+                break
+            got += n
+        return got
+
+    def _spill(self):
+        if not self.writable:
+            self._spill_failed = True
+            return
+        self._spills += 1
+        self.spill_path = "%s/%d.txt" % (self.spill_dir, self._spills)
+        try:
+            self._file = open(self.spill_path, "wb")
+        except OSError:
+            print("Can't write", self.spill_path, "keeping clipboard in RAM")
+            self._spill_failed = True
+            return
+        for piece in self._pieces:
+            self._file.write(piece.encode())
+        self._pieces = []
+        self._file.write(self._decoder.pending())
+        self._decoder.reset()
+
+    def _store(self, size):
+        # Takes the first size bytes of the buffer
+        self.size += size
+        if self._file is None and not self._spill_failed and self.size > self.spill_threshold:
+            self._spill()
+        if self._file is not None:
+            self._file.write(self._view[:size])
+        else:
+            self._pieces.append(self._decoder.decode(self._buf, size))
+
+    async def _read_body(self, conn, length):
+        recv_size = len(self._buf)
+        while length is None or self.size < length:
+            want = recv_size if length is None else min(recv_size, length - self.size)
+            n = await self._recv(conn, 0, want)
+            if n == 0:
+                return length is None
+            self._store(n)
+        return True
+
+    async def _read_frames(self, conn, length):
+        recv_size = len(self._buf)
+        while self.size < length:
+            if await self._read_exact(conn, 2) < 2:
+                return False
+            frame_size = self._buf[0] << 8 | self._buf[1]
+            crc = 0
+            while frame_size:
+                n = await self._recv(conn, 0, min(recv_size, frame_size))
+                if n == 0:
+                    return False
+                crc = binascii.crc32(self._view[:n], crc)
+                self._store(n)
+                frame_size -= n
+            if await self._read_exact(conn, 4) < 4:
+                return False
+            expected = self._buf[0] << 24 | self._buf[1] << 16 | self._buf[2] << 8 | self._buf[3]
+            if crc & 0xFFFFFFFF != expected:
+                print("Clipboard checksum mismatch")
+                return False
+        return self.size == length
+
+    def _finish(self, ok):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            clipboard = Clipboard(None, self.spill_path, self.size)
+        else:
+            self._pieces.append(self._decoder.finish())
+            clipboard = Clipboard("".join(self._pieces), None, self.size)
+        self._pieces = []
+        self._decoder.reset()
+        if not ok:
+            clipboard.remove()
+            return None
+        return clipboard
+
+    async def receive(self, server):
+        # Returns a Clipboard, or None when the transfer failed or no PC
+        # connected in time
+        try:
+            conn, addr = await self._accept(server)
+        except OSError as e:
+            print("Clipboard transfer failed:", e)
+            return None
+        print("Accepted from", addr)
+        return await self.receive_from(conn)
+
+    async def receive_from(self, conn):
+        # The transfer on a connection, or anything with the same calls
+        self.size = 0
+        self._spill_failed = False
+        ok = False
+        try:
+            conn.settimeout(0)
+            got = await self._read_exact(conn, HEADER_SIZE)
+            if got == HEADER_SIZE and self._buf[:3] == MAGIC:
+                flags = self._buf[3]
+                length = self._buf[4] << 24 | self._buf[5] << 16 | self._buf[6] << 8 | self._buf[7]
+                if length > self.spill_threshold:
+                    self._spill()
+                if flags & FLAG_CHECKSUMS:
+                    ok = await self._read_frames(conn, length)
+                else:
+                    ok = await self._read_body(conn, length)
+                if ok and self.end is not None:
+                    size = len(self.end)
+                    ok = await self._read_exact(conn, size) == size and self._buf[:size] == self.end
+                try:
+                    conn.send(ACK if ok else NAK)
+                except OSError:
+                    pass
+            else:
+                # Old clients send raw text until they close
+                self._store(got)
+                ok = got < HEADER_SIZE or await self._read_body(conn, None)
+        except OSError as e:
+            print("Clipboard transfer failed:", e)
+        finally:
+            conn.close()
+        return self._finish(ok)
+
+
+def encode_clipboard(data, frame_size=0, end=b""):
+    # The bytes a client sends for data. With a frame_size, the payload is
+    # split into checksummed frames of at most that many bytes. end goes
+    # after the payload, END over serial.
+    length = len(data)
+    flags = FLAG_CHECKSUMS if frame_size else 0
+    out = bytearray(MAGIC)
+    out.append(flags)
+    out.extend(bytes((length >> 24 & 0xFF, length >> 16 & 0xFF, length >> 8 & 0xFF, length & 0xFF)))
+    if not frame_size:
+        out.extend(data)
+        out.extend(end)
+        return out
+    for i in range(0, length, frame_size):
+        frame = data[i:i + frame_size]
+        crc = binascii.crc32(frame) & 0xFFFFFFFF
+        out.extend(bytes((len(frame) >> 8, len(frame) & 0xFF)))
+        out.extend(frame)
+        out.extend(bytes((crc >> 24 & 0xFF, crc >> 16 & 0xFF, crc >> 8 & 0xFF, crc & 0xFF)))
+    out.extend(end)
+    return out
@@ -1,29 +1,39 @@
+import time
+# Boot stages are timed from here, see boot_timer.py
+BOOT_START = time.monotonic_ns()
+# Only what the keyboard needs, the rest is imported once it is forwarded,
+# see import_features
 import usb_hid
 import board
 import busio
 import os
-import time
-import ssl
-import wifi
-import socketpool
-import ipaddress
-import adafruit_requests
-import json
+import asyncio
 import usb_cdc
 import rotaryio
-import displayio
-import adafruit_ili9341
 import terminalio
-import gc
-from adafruit_display_text import label, wrap_text_to_pixels
+from adafruit_hid import find_device
 from adafruit_hid.keyboard import Keyboard
 from adafruit_hid.keycode import Keycode
-from adafruit_hid.keyboard_layout_us import KeyboardLayoutUS
-from hid import HID_KEYCODE_TO_ASCII, L_MODIFIER_LIST, R_MODIFIER_LIST, SHIFTED_CHARACTERS, DECODE_DIACRITICS
+from hid import HID_KEYCODE_TO_ASCII, HID_KEYCODE_TO_CHARACTER, SHIFTED_CHARACTERS, DECODE_DIACRITICS
+from framing import FrameDecoder, RX_SIZE
+from hid_report import ReportDecoder, ReportForwarder
+from chords import ChordTable, MODIFIER_MASKS, CONTROL, SHIFT, ALT, GUI
+from queues import BoundedQueue
+from jobs import JobQueue, MAX_JOBS, DONE, FAILED, CANCELLED
+from display_scheduler import DisplayScheduler, MAX_FPS
+from metrics import Metrics, TimedDevice, serve
+from memory import MemoryManager, LOW_WATER
+from typist import Typist, build_report_table, KEYS_PER_SECOND
+from prompt import Prompt
+from boot_timer import BootTimer
 from digitalio import DigitalInOut, Direction, Pull
 
+boot_timer = BootTimer(BOOT_START)
+boot_timer.mark("imports")
+
 # Setup keybord UART communication
-keyboard_uart = busio.UART(board.GP0, board.GP1, baudrate=115200)
+# The buffer holds the reports that come in while the TLS handshake blocks
+keyboard_uart = busio.UART(board.GP0, board.GP1, baudrate=115200, timeout=0, receiver_buffer_size=2048)
 
 # Setup onboard led
 LED = DigitalInOut(board.LED)
@@ -32,12 +42,34 @@ LED.direction = Direction.OUTPUT
 # Setup USB monitor communication
 serial_monitor = usb_cdc.console
 serial_monitor.timeout = None
+# Prompts and selections from the PC, None unless boot.py enabled it
+serial_data = usb_cdc.data
+
+# Send keyboard reports to the PC unchanged, instead of replaying key presses
+HID_PASSTHROUGH = os.getenv("HID_PASSTHROUGH", 1) not in (0, "0")
+# Ceiling for typing responses, lower it for applications that drop keys
+TYPING_RATE = int(os.getenv("TYPING_RATE", KEYS_PER_SECOND))
+# Type the answers to the editing templates as edits of the selection, see
+# edits.py, instead of typing them whole
+TYPE_EDITS = os.getenv("TYPE_EDITS", 1) not in (0, "0")
+
+# Time the hot paths, see metrics.py. Disabled, a span costs one check
+METRICS = os.getenv("METRICS", 1) not in (0, "0")
+# Also count the bytes every stage allocates, this slows the spans down
+METRICS_ALLOCATIONS = os.getenv("METRICS_ALLOCATIONS", 0) not in (0, "0")
+metrics = Metrics(METRICS, allocations=METRICS_ALLOCATIONS)
 
 # Set up a keyboard device.
 connected_to_pc = True
+forwarder = None
+typist = None
 try:
     kbd = Keyboard(usb_hid.devices)
-    layout = KeyboardLayoutUS(kbd)
+    keyboard_device = find_device(usb_hid.devices, usage_page=0x1, usage=0x06)
+    typist = Typist(TimedDevice(keyboard_device, metrics.stage("hid_type")),
+                    build_report_table(HID_KEYCODE_TO_ASCII), TYPING_RATE)
+    if HID_PASSTHROUGH:
+        forwarder = ReportForwarder(keyboard_device)
 except:
     connected_to_pc = False
 
@@ -53,50 +85,83 @@ DIRECTIONS = ["up", "down", "left", "right", "center"]
 DISPLAY_WIDTH = 240
 DISPLAY_HEIGHT = 320
 SCALE_FACTOR = 2
-CHARACTER_LIMIT = 165
 MAX_ROWS = 9
-displayio.release_displays()
-spi = busio.SPI(clock=board.GP10, MOSI=board.GP11)
-display_bus = displayio.FourWire(
-    spi, command=board.GP12, chip_select=board.GP13, reset=board.GP14)
-display = adafruit_ili9341.ILI9341(
-    display_bus, width=DISPLAY_WIDTH, height=DISPLAY_HEIGHT, rotation=180)
+FONT_WIDTH = terminalio.FONT.get_bounding_box()[0]
+# Rows on screen, a page can wrap to one more than MAX_ROWS
+TEXT_ROWS = MAX_ROWS + 1
+# What fits on the screen, longer text like a pasted prompt is cut
+CHARACTER_LIMIT = TEXT_ROWS * (DISPLAY_WIDTH // SCALE_FACTOR // FONT_WIDTH)
+FONT_HEIGHT = terminalio.FONT.get_bounding_box()[1]
+# Label's default line spacing
+ROW_HEIGHT = int(FONT_HEIGHT * 1.25)
+# The job status gets a line of its own at the top, at the font's own size
+STATUS_HEIGHT = FONT_HEIGHT + 2
+# Labels are placed by the middle of their first line, the text starts below
+# the status line
+TEXT_TOP = STATUS_HEIGHT + FONT_HEIGHT * SCALE_FACTOR // 2
+# Set up once the keyboard is forwarded, see initialize_display
+display = None
+# Brings Wi-Fi back, see start_features
+wifi_manager = None
 
 
-API_LINK = "https://api.openai.com/v1/engines/chat/completions"
 SSID = os.getenv("WIFI_SSID")
 PASSWORD = os.getenv("WIFI_PASSWORD")
 SSID_AUX = os.getenv("WIFI_SSID_AUX")
 PASSWORD_AUX = os.getenv("WIFI_PASSWORD_AUX")
-API_KEY = os.getenv("OPENAI_API_KEY")
-if API_KEY is None:
+# Other endpoints are set up in settings.toml, see backend.py
+if os.getenv("OPENAI_API_KEY") is None and os.getenv("API_ENDPOINTS") is None:
     print("API KEY not found")
 
 PORT = 5000
 TIMEOUT = 7
 BACKLOG = 2
-MAXBUF = 512
 
-DEBUGGING = False
+# Prompts wait their turn in the background, see jobs.py. Clipboard
+# requests are refused while one is in flight.
+PROMPT_QUEUE = int(os.getenv("PROMPT_QUEUE", MAX_JOBS))
+prompt_queue = JobQueue(PROMPT_QUEUE)
+clipboard_queue = BoundedQueue(1)
+
+# Seconds a cached response stays valid, unset to keep them until evicted
+CACHE_TTL = os.getenv("CACHE_TTL")
+
+# Screen updates only need the latest one, drawn at most this often
+DISPLAY_FPS = int(os.getenv("DISPLAY_FPS", MAX_FPS))
+display_scheduler = DisplayScheduler(DISPLAY_FPS)
+
+# Seconds between polls for a metrics request while no clipboard is expected
+METRICS_POLL = 0.1
+# Seconds without a keystroke while a prompt is typed before the API
+# connection is opened for it. The handshake blocks the keyboard for over
+# a second, so not while typing. 0 never opens it ahead of time.
+PREWARM_GAP = float(os.getenv("PREWARM_GAP", 1.5))
+
+uart_read_stage = metrics.stage("uart_read")
+frame_decode_stage = metrics.stage("frame_decode")
+parse_packet_stage = metrics.stage("parse_packet")
+hid_forward_stage = metrics.stage("hid_forward")
+keys_stage = metrics.stage("keys")
+sse_parse_stage = metrics.stage("sse_parse")
+layout_stage = metrics.stage("layout")
+wrap_stage = metrics.stage("wrap")
+refresh_stage = metrics.stage("refresh")
+
+# Collections at a low watermark and in idle gaps, see memory.py
+GC_LOW_WATER = int(os.getenv("GC_LOW_WATER", LOW_WATER))
+memory = MemoryManager(GC_LOW_WATER, stage=metrics.stage("gc"))
+metrics.reporters.append(memory.summary)
 
 
 class Result:
-    def __init__(self, full_prompt, prompt_list):
+    def __init__(self, full_prompt, complete=True):
         self.full_prompt = full_prompt
-        self.prompt_list = prompt_list
-        self.current_counter = len(prompt_list) - 1
-
-    def display_next_prompt(self, label):
-        self.current_counter += 1
-        if self.current_counter >= len(self.prompt_list):
-            self.current_counter = len(self.prompt_list) - 1
-        display_text(label, self.prompt_list[self.current_counter])
-
-    def display_previous_prompt(self, label):
-        self.current_counter -= 1
-        if self.current_counter < 0:
-            self.current_counter = 0
-        display_text(label, self.prompt_list[self.current_counter])
+        # False when the stream was cancelled or cut short
+        self.complete = complete
+        # The streamed tokens, kept until they are in the response cache
+        self.tokens = None
+        # Why the stream broke off for good, the text is what came before
+        self.error = None
 
 
 class Menu:
@@ -108,6 +173,8 @@ class Menu:
         "Add comments throughout this code, don't return any other text, only the commented code:",
         "Correct any mistakes you find in this text: "
     ]
+    # Whose answer is the text sent along, changed
+    edits = [False, False, True, True, True]
     current_option = 0
 
     def next_option(self):
@@ -116,38 +183,119 @@ class Menu:
     def previous_option(self):
         self.current_option = (self.current_option - 1) % len(self.options)
 
+
+class State:
+    def __init__(self):
+        # Typed text and clipboards, see prompt.py
+        self.current_prompt = Prompt()
+        # The last clipboard from the PC, still selected there, see edits.py
+        self.selection = None
+        # Earlier prompts and answers, for retained context. Set up with the
+        # features, see start_features.
+        self.conversation = None
+        self.forget_conversation = False
+        self.listening_for_prompt = False
+        self.listening_notification = False
+        # Whether a key on the keyboard is down
+        self.keys_held = False
+        self.listening_for_clipboard = False
+        self.viewing_response = False
+        self.call_api = False
+        self.option_selected = True
+        self.inside_IDE = False
+        # Pages of past responses, browsed with the encoder, see
+        # start_features
+        self.history = None
+        self.streaming = False
+        self.cancel_stream = False
+        # Set once Wi-Fi and the API are ready, the keyboard works before
+        self.online = False
+        # Whether the streaming response is drawn, not while a prompt is
+        # typed or earlier responses are scrolled through
+        self.following = False
+        self.browsing = False
+
+
+def import_features():
+    # Everything past the keyboard, once it is forwarded. Compiling these
+    # takes a while on the board. They go into the globals, like the
+    # imports at the top.
+    global ssl, wifi, socketpool, ipaddress, SSEDecoder, SSE_CHUNK_SIZE, ResponseHistory
+    global HTTPError, load_endpoints, ClipboardReceiver, SerialReceiver, SERIAL_POLL, plan_edit
+    global Overlap, continuation, MAX_RETRY_SECONDS, ResponseCache, cache_key, iter_tokens
+    global TOKEN_SEPARATOR, Conversation, RequestBody, WifiManager
+    global CONTEXT_BUDGET, STREAM_RETRIES, STREAM_RETRY_SECONDS, transliterate
+    import ssl
+    import wifi
+    import socketpool
+    import ipaddress
+    from sse import SSEDecoder, SSE_CHUNK_SIZE
+    from history import ResponseHistory
+    from http_client import HTTPError
+    from backend import load_endpoints
+    from transliterate import Transliterator, load_table, FALLBACK
+    from clipboard import ClipboardReceiver
+    from serial_input import SerialReceiver, POLL as SERIAL_POLL
+    from edits import plan_edit
+    from resume import Overlap, continuation, RETRIES, RETRY_SECONDS, MAX_RETRY_SECONDS
+    from response_cache import ResponseCache, cache_key, iter_tokens, TOKEN_SEPARATOR
+    from conversation import Conversation, RequestBody, CONTEXT_TOKENS
+    from wifi_manager import WifiManager
+
+    # Estimated tokens of history sent along with a prompt in retained context
+    CONTEXT_BUDGET = int(os.getenv("CONTEXT_TOKENS", CONTEXT_TOKENS))
+    # Times an answer whose stream broke off is asked to go on, and the pause
+    # before the first try, doubled every try. See resume.py.
+    STREAM_RETRIES = int(os.getenv("STREAM_RETRIES", RETRIES))
+    STREAM_RETRY_SECONDS = float(os.getenv("STREAM_RETRY_SECONDS", RETRY_SECONDS))
+
+    # Replaces characters missing from transliteration.txt, "keep" leaves them
+    fallback = os.getenv("TRANSLITERATION_FALLBACK", FALLBACK)
+    if fallback == "keep":
+        fallback = None
+    table = load_table()
+    if table is None:
+        print("transliteration.txt not found, only removing Romanian diacritics")
+        table = {ord(diacritic): DECODE_DIACRITICS[diacritic] for diacritic in DECODE_DIACRITICS}
+    transliterate = Transliterator(table, fallback)
+
+
 def initialize_tcp_server(pool):
     HOST = str(wifi.radio.ipv4_address)
     server = ipaddress.ip_address(pool.getaddrinfo(HOST, PORT)[0][4][0])
     print("Server ping", server, wifi.radio.ping(server), "ms")
     print("Create TCP Server socket", (HOST, PORT))
     s = pool.socket(pool.AF_INET, pool.SOCK_STREAM)
-    s.settimeout(TIMEOUT)
+    # Non-blocking, accept is polled from the clipboard task
+    s.settimeout(0)
 
     s.bind((HOST, PORT))
     s.listen(BACKLOG)
     print("Listening")
     return s
 
-def accept_packet(socket):
-    buf = bytearray(MAXBUF)
-    print("Accepting connections")
-    try:
-        conn, addr = socket.accept()
-        conn.settimeout(TIMEOUT)
-        print("Accepted from", addr)
-
-        size = conn.recv_into(buf, MAXBUF)
-        print("Received", buf[:size], size, "bytes")
-        print(str(buf, 'utf-8'))
 
-        conn.close()
-    except:
-        print("Connection timed out")
-    return buf
+def refresh_display():
+    start = refresh_stage.start()
+    display.refresh()
+    refresh_stage.end(start)
 
 
 def initialize_display():
+    global display, wrap_text_to_pixels
+    import displayio
+    import adafruit_ili9341
+    from adafruit_display_text import label, wrap_text_to_pixels
+    from row_display import RowDisplay
+    displayio.release_displays()
+    spi = busio.SPI(clock=board.GP10, MOSI=board.GP11)
+    display_bus = displayio.FourWire(
+        spi, command=board.GP12, chip_select=board.GP13, reset=board.GP14)
+    display = adafruit_ili9341.ILI9341(
+        display_bus, width=DISPLAY_WIDTH, height=DISPLAY_HEIGHT, rotation=180)
+    # Refreshed by RowDisplay once a screen is complete
+    display.auto_refresh = False
+
     splash = displayio.Group()
     display.show(splash)
 
@@ -159,344 +307,501 @@ def initialize_display():
         inner_bitmap, pixel_shader=inner_palette, x=0, y=0)
     splash.append(inner_sprite)
 
-    # Draw a label
+    # Draw a label for every row
 
-    text_group = displayio.Group(scale=SCALE_FACTOR, x=0, y=20)
-    text_area = label.Label(terminalio.FONT, text="", color=0x000000)
-    text_group.append(text_area)  # Subgroup for text scaling
+    text_group = displayio.Group(scale=SCALE_FACTOR, x=0, y=TEXT_TOP)
+    rows = []
+    for i in range(TEXT_ROWS):
+        row = label.Label(terminalio.FONT, text="", color=0x000000, y=i * ROW_HEIGHT)
+        text_group.append(row)  # Subgroup for text scaling
+        rows.append(row)
     splash.append(text_group)
+    # Job status on its own line above the text
+    status = label.Label(terminalio.FONT, text="", color=0x000000, x=2, y=STATUS_HEIGHT // 2)
+    splash.append(status)
+    text_area = RowDisplay(rows, refresh_display, status)
+    display.refresh()
     return text_area
 
 
-def display_text(label, text):
+def display_text(text_area, text):
     # Limit characters, otherwise it can overflow memory
+    start = wrap_stage.start()
     text_list = wrap_text_to_pixels(text[:CHARACTER_LIMIT], max_width=DISPLAY_WIDTH / SCALE_FACTOR, font=terminalio.FONT)
-    wrapped_text = "\n".join(text_list)
-    label.text = wrapped_text
-    gc.collect()
+    wrap_stage.end(start)
+    text_area.show_lines(text_list)
 
 
-def display_list(label, options, current_option):
+def display_list(text_area, options, current_option):
     displayed_options = options.copy()
     displayed_options[current_option] = options[current_option] + " <-"
-    wrapped_text = "\n".join(displayed_options)
-    label.text = wrapped_text
-    gc.collect()
+    # Moving the arrow only changes two rows
+    text_area.show_lines(displayed_options)
+
+
+# Drawing happens in the display scheduler task, everything else only sets
+# what to show next
+def show_text(text):
+    display_scheduler.show(display_text, text)
+
+
+def show_list(options, current_option):
+    display_scheduler.show(display_list, options, current_option)
 
 
-def connect_to_wifi(ssid, password):
-    tries = 0
+def show_status(text):
+    display_scheduler.show_status(text)
+
+
+def prompt_text(prompt):
+    # A prompt with a clipboard on flash only as far as the screen goes
+    return prompt if isinstance(prompt, str) else prompt.preview(CHARACTER_LIMIT)
+
+
+def configure_ipv4():
     ipv4 =  ipaddress.IPv4Address("192.168.43.164")
     netmask =  ipaddress.IPv4Address("255.255.255.0")
     gateway =  ipaddress.IPv4Address("192.168.43.150")
     wifi.radio.set_ipv4_address(ipv4=ipv4,netmask=netmask,gateway=gateway)
-    while tries < 5:
-        try:
-            wifi.radio.connect(ssid, password)
-            break
-        except:
-            tries += 1
-            print("Couldn't connect to WiFi")
-    if tries >= 5:
-        print("Maximum wifi tries reached")
-        return False
-    else:
-        print("IP address is", wifi.radio.ipv4_address)
-        return True
-
 
-def remove_diacritics(word):
-    for diacritic in DECODE_DIACRITICS:
-        word = word.replace(diacritic, DECODE_DIACRITICS[diacritic])
-    return word
 
-
-def iter_lines(resp):
-    partial_line = []
-    for c in resp.iter_content():
-        if c == b'\n':
-            yield (b"".join(partial_line)).decode('utf-8')
-            del partial_line[:]
-        else:
-            partial_line.append(c)
-    if partial_line:
-        yield (b"".join(partial_line)).decode('utf-8')
+async def output_word(word, history, show, typed=True):
+    # A full page comes back without the last word, in order to fill last row
+    # The word starts the next screen
+    memory.activity += 1
+    start = layout_stage.start()
+    history.add(word)
+    layout_stage.end(start)
+    if show:
+        # The page so far, frames that come too fast are skipped
+        show_text(history.text())
+    print(word, end="")
+    if typist is not None and typed:
+        await typist.put(word)
+
+
+def finish_response(text_response, history, complete, show):
+    page = history.finish(show)
+    if page is not None and show:
+        show_text(page)
+    print("Display:", display_scheduler.frames, "frames,", display_scheduler.skipped, "skipped")
+    print(memory.summary())
+    result = Result(text_response, complete)
+    return result
 
 
-def call_chatgpt(text, requests, label, inside_IDE):
-    text_response = ""
-    full_prompt = [{"role": "user", "content": text},]
-    current_display_prompt = ""
-    segmented_display_prompt = []
+async def call_chatgpt(conversation, backend, state, inside_IDE, typed=True):
+    # Tokens with TOKEN_SEPARATOR after each, for the response cache
+    tokens = ""
+    history = state.history
+    history.begin(state.following)
     print("RESPONSE: ")
-    with requests.post("https://api.openai.com/v1/chat/completions",
-                        json={"model": "gpt-3.5-turbo",
-                                "messages": full_prompt, "stream": True},
-                        headers={
-            "Authorization": f"Bearer {API_KEY}",
-                            },
-                        ) as response:
-        if response.status_code == 200:
-            for line in iter_lines(response):
-                if line.startswith("data: [DONE]"):
-                    break
-                if line.startswith("data: "):
-                    # If the user wants to end the prompt early
-                    if keyboard_uart.in_waiting:
+    first_token_ms = None
+    complete = False
+    error = None
+    buf = bytearray(SSE_CHUNK_SIZE)
+    # Sent after the conversation and held against the answer so far once
+    # the stream broke off, see resume.py
+    extra = ()
+    overlap = None
+    retries = 0
+    repeated = 0
+    delay = STREAM_RETRY_SECONDS
+    while True:
+        # Best endpoint first, the next one takes over while nothing came
+        for endpoint in backend.order():
+            connection = endpoint.connection
+            answered = False
+            start = time.monotonic_ns()
+            try:
+                # Written out from the conversation while sending
+                body = RequestBody(conversation, endpoint.model, extra)
+                status = await connection.request("POST", endpoint.path, endpoint.headers, body)
+                if status != 200:
+                    raise HTTPError("%d %s" % (status, await connection.read()))
+                decoder = SSEDecoder()
+                while not decoder.done:
+                    size = await connection.readinto(buf)
+                    if size == 0:
                         break
-                    data = json.loads(line[5:])
-                    word = data.get('choices')[0].get(
-                        'delta').get('content')
-                    if word is not None:
-                        word = remove_diacritics(word)
-                        text_response += word
-                        current_display_prompt += word
-                        if not inside_IDE:
-                            wrapped_text = "\n".join(wrap_text_to_pixels(
-                                current_display_prompt, max_width=DISPLAY_WIDTH/SCALE_FACTOR, font=terminalio.FONT))
-                            if (wrapped_text.count("\n") > MAX_ROWS):
-                                # Display the prompt, without the last word, in order to fill last row
-                                # We will reuse it in the next screen
-                                current_display_prompt = current_display_prompt[:-len(word)]
-                                display_text(label, current_display_prompt)
-                                segmented_display_prompt.append(
-                                    current_display_prompt)
-                                current_display_prompt = word
-                        print(word, end="")
-                        if connected_to_pc:
-                            try:
-                                layout.write(word)
-                            except:
-                                pass
-        else:
-            print("Error: ", response.status_code, response.content)
-    if current_display_prompt != "" and not inside_IDE:
-        segmented_display_prompt.append(current_display_prompt)
-        display_text(label, current_display_prompt)
-    gc.collect()
-    result = Result(text_response, segmented_display_prompt)
+                    start_parse = sse_parse_stage.start()
+                    words = list(decoder.feed(buf, size))
+                    sse_parse_stage.end(start_parse)
+                    for word in words:
+                        # If the user wants to end the prompt early
+                        if state.cancel_stream:
+                            break
+                        if not answered:
+                            answered = True
+                            ttft_ms = (time.monotonic_ns() - start) // 1000000
+                            endpoint.answered(ttft_ms)
+                            if first_token_ms is None:
+                                first_token_ms = ttft_ms
+                        word = transliterate(word)
+                        if overlap is not None:
+                            word = overlap.feed(word)
+                            if not word:
+                                continue
+                        tokens += word + TOKEN_SEPARATOR
+                        await output_word(word, history, state.following and not inside_IDE, typed)
+                    if state.cancel_stream:
+                        break
+                    # Let the keyboard and display tasks run between chunks
+                    await asyncio.sleep(0)
+                if decoder.done:
+                    if overlap is not None:
+                        word = overlap.finish()
+                        if word:
+                            tokens += word + TOKEN_SEPARATOR
+                            await output_word(word, history, state.following and not inside_IDE, typed)
+                    complete = not state.cancel_stream
+                    # Read up to the end of the body so the connection can be reused
+                    while await connection.readinto(buf):
+                        pass
+                elif not state.cancel_stream:
+                    raise HTTPError("Stream ended before the answer did")
+            except (OSError, HTTPError) as e:
+                connection.close()
+                if state.cancel_stream:
+                    raise
+                endpoint.failed()
+                error = e
+                if answered:
+                    print()
+                    print("Stream from", endpoint.name, "broke off,", e)
+                    break
+                print("No answer from", endpoint.name + ",", e)
+                continue
+            if state.cancel_stream:
+                # The rest of the response is still on the way
+                connection.close()
+            break
+        if complete or state.cancel_stream:
+            break
+        if first_token_ms is None:
+            raise HTTPError("No endpoint answered")
+        # The answer broke off, what is out stays and the rest is asked for
+        if retries == STREAM_RETRIES:
+            print("Giving up on the answer after", retries, "tries")
+            break
+        retries += 1
+        print("Picking the answer up again in", delay, "s, try", retries, "of", STREAM_RETRIES)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MAX_RETRY_SECONDS)
+        if state.cancel_stream:
+            break
+        if overlap is not None:
+            repeated += overlap.repeated
+        answer = tokens.replace(TOKEN_SEPARATOR, "")
+        extra = continuation(answer)
+        overlap = Overlap(answer)
+    if overlap is not None:
+        print()
+        print("Picked up", retries, "times,", repeated + overlap.repeated, "repeated characters dropped")
+    print()
+    print("Time to first token from", endpoint.name + ":", first_token_ms, "ms, connecting took",
+          connection.connect_ms, "ms")
+    result = finish_response(tokens.replace(TOKEN_SEPARATOR, ""), history, complete,
+                             state.following and not inside_IDE)
+    result.tokens = tokens
+    if not complete and not state.cancel_stream:
+        result.error = error
     return result
 
 
-def read_uart(current_uart_data):
-    if keyboard_uart.in_waiting:
-        to_read = keyboard_uart.in_waiting
-        bytes = keyboard_uart.read(to_read)
-        current_uart_data.extend(bytes)
+async def replay_response(tokens, state, inside_IDE, typed=True):
+    # Same output as call_chatgpt, for a response that came from the cache
+    history = state.history
+    history.begin(state.following)
+    text_response = ""
+    print("CACHED RESPONSE: ")
+    for word in iter_tokens(tokens):
+        if state.cancel_stream:
+            break
+        text_response += word
+        await output_word(word, history, state.following and not inside_IDE, typed)
+        await asyncio.sleep(0)
+    print()
+    return finish_response(text_response, history, not state.cancel_stream, state.following and not inside_IDE)
+
+
+async def type_edit(original, answer):
+    # Only the keys that turn the selection into the answer, all of it when
+    # that takes fewer
+    if typist is None:
+        return
+    start = time.monotonic_ns()
+    original = original.read()
+    keys = plan_edit(original, answer)
+    if keys is None:
+        print("Edit: typing all", len(answer), "characters")
+        await typist.put(answer)
+        return
+    print("Edit:", sum(len(item) for item in keys), "keys instead of", len(answer), "planned in",
+          (time.monotonic_ns() - start) // 1000000, "ms")
+    for item in keys:
+        await typist.put(item)
 
 
 def read_from_serial_monitor():
-    in_data = bytearray()
     try:
-        while serial_monitor.in_waiting:
-            byte = serial_monitor.read(1)
-            in_data.append(byte[0])
+        waiting = serial_monitor.in_waiting
+        in_data = serial_monitor.read(waiting).decode('utf-8') if waiting else ""
     except Exception as e:
-        return e, in_data
-    return None, in_data.decode('utf-8')
-
-
-def list_diff(l1, l2):
-    return [x for x in l1 if x not in l2]
-
-
-def parse_packet(packet, modifier_pos, first_key_pos, last_key_pos):
-    keycodes = []
-    modifiers = []
-    characters = []
-    L_modifiers_mask = packet[modifier_pos] & 0b00001111
-    R_modifiers_mask = (packet[modifier_pos] & 0b11110000) >> 4
-    L_modifiers = [L_MODIFIER_LIST[i] for i in range(
-        len(L_MODIFIER_LIST)) if (L_modifiers_mask >> i) & 1]
-    R_modifiers = [R_MODIFIER_LIST[i] for i in range(
-        len(R_MODIFIER_LIST)) if (R_modifiers_mask >> i) & 1]
-    modifiers.extend(L_modifiers)
-    modifiers.extend(R_modifiers)
-    keycodes.extend(modifiers)
-
-    for i in range(first_key_pos, last_key_pos + 1):
-        character = HID_KEYCODE_TO_ASCII[packet[i]][0]
-        if character != 0:
-            characters.append(character)
-        keycodes.append(packet[i])
-
-    return keycodes, characters
-
-
-def process_keycodes(keycodes, characters, current_prompt, listening_for_prompt, listening_for_clipboard, listening_notification, option_selected, inside_IDE, LED, call_api, label):
-    if Keycode.GUI in keycodes and Keycode.ENTER in keycodes:
-        if listening_for_prompt == False:
-            # Without shift, don't retain context
-            if Keycode.SHIFT not in keycodes:
-                current_prompt = ""
-            listening_for_prompt = True
-            LED.value = True
-        else:
-            listening_for_prompt = False
-            LED.value = False
-            call_api = True
-
-    if Keycode.CONTROL in keycodes and Keycode.ALT in keycodes and Keycode.TWO in keycodes and listening_for_clipboard == False:
-        listening_for_clipboard = True
-
-    if Keycode.CONTROL in keycodes and Keycode.ALT in keycodes and Keycode.ONE in keycodes:
-        if inside_IDE == True:
-            inside_IDE = False
-            display_text(label, "OUTSIDE IDE")
-        else:
-            inside_IDE = True
-            display_text(label, "INSIDE IDE")
-            print("INSIDE IDE")
-
-    pressed_keycodes = list_diff(keycodes, last_pressed_keycodes)
-    released_keycodes = list_diff(last_pressed_keycodes, keycodes)
-    pressed_characters = list_diff(characters, last_pressed_characters)
-    # released_characters = list_diff(last_pressed_characters, characters)
-
-    if connected_to_pc:
-        for keycode in pressed_keycodes:
-            kbd.press(keycode)
-        for keycode in released_keycodes:
-            kbd.release(keycode)
-
-    if listening_for_prompt:
-        if (len(pressed_characters) > 0):
+        return e, ""
+    return None, in_data
+
+
+def forget_context(state):
+    state.current_prompt.remove()
+    state.selection = None
+    if state.streaming:
+        # The request being sent still reads from it, the network task
+        # clears it once the response is in
+        state.forget_conversation = True
+    elif state.conversation is not None:
+        state.conversation.clear()
+
+
+def toggle_prompt(state, retain_context):
+    if state.listening_for_prompt == False:
+        # Without shift, don't retain context
+        if not retain_context:
+            forget_context(state)
+        state.listening_for_prompt = True
+        # A response streaming meanwhile isn't drawn over the prompt
+        state.following = False
+        LED.value = True
+        # Have the connection ready by the time the prompt is, once typing
+        # pauses, see warm_up
+        if not state.streaming and PREWARM_GAP:
+            prompt_queue.warm_up()
+    else:
+        state.listening_for_prompt = False
+        LED.value = False
+        state.call_api = True
+
+
+def start_clipboard(state):
+    state.listening_for_clipboard = True
+
+
+def toggle_IDE(state):
+    if state.inside_IDE == True:
+        state.inside_IDE = False
+        show_text("OUTSIDE IDE")
+    else:
+        state.inside_IDE = True
+        show_text("INSIDE IDE")
+        print("INSIDE IDE")
+
+
+def toggle_typing(state):
+    if typist is None:
+        return
+    if typist.paused:
+        typist.resume()
+        show_text("Typing resumed")
+    else:
+        typist.pause()
+        show_text("Typing paused")
+
+
+def select_option(menu, option):
+    def action(state):
+        menu.current_option = option
+        state.option_selected = True
+    return action
+
+
+def register_chords(chords, menu):
+    chords.add(GUI, Keycode.ENTER,
+               lambda state: toggle_prompt(state, False))
+    chords.add(GUI | SHIFT, Keycode.ENTER,
+               lambda state: toggle_prompt(state, True))
+    chords.add(CONTROL | ALT, Keycode.ONE, toggle_IDE)
+    chords.add(CONTROL | ALT, Keycode.TWO, start_clipboard)
+    chords.add(CONTROL | ALT, Keycode.P, toggle_typing)
+    # One shortcut per prompt template, CTRL+ALT+SHIFT+1 selects the first
+    # one. Not CTRL+ALT+F1 and on, the PC gets the keys too and Linux
+    # switches to a virtual terminal on those.
+    for option in range(len(menu.options)):
+        chords.add(CONTROL | ALT | SHIFT, Keycode.ONE + option, select_option(menu, option))
+
+
+def process_keycodes(keys, state):
+    chord_fired = chords.dispatch(keys, state)
+
+    # With passthrough the report already went to the PC unchanged
+    if connected_to_pc and forwarder is None:
+        for i in range(keys.pressed_count):
+            kbd.press(keys.pressed[i])
+        for i in range(keys.released_count):
+            kbd.release(keys.released[i])
+
+    pressed_character = keys.pressed_character()
+    typing_response = typist is not None and typist.busy
+    # Escape stops a response that is still streaming or being typed, unless
+    # it leaves the next prompt
+    if (state.streaming or typing_response) and pressed_character == '\x1b' and not state.listening_for_prompt:
+        state.cancel_stream = True
+        if typist is not None:
+            typist.cancel()
+    elif state.listening_for_prompt and not chord_fired:
+        if pressed_character is not None:
+            modifiers = MODIFIER_MASKS[keys.current.modifiers]
             # Exit if escape is pressed
-            if pressed_characters[0] == '\x1b':
+            if pressed_character == '\x1b':
                 print("Exiting listening mode and deleting history")
-                current_prompt = ""
-                listening_for_prompt = False
-                listening_notification = False
+                forget_context(state)
+                state.listening_for_prompt = False
+                state.listening_notification = False
                 LED.value = False
-                option_selected = True
-            elif pressed_characters[0] == '\x08':
-                current_prompt = current_prompt[:-1]
-            elif (Keycode.CONTROL or Keycode.ALT or Keycode.GUI) not in keycodes:
-                shifted_character = SHIFTED_CHARACTERS.get(
-                    pressed_characters[0])
-                if Keycode.SHIFT in keycodes and shifted_character is not None:
-                    current_prompt += shifted_character
+                state.option_selected = True
+            elif pressed_character == '\x08':
+                state.current_prompt.backspace()
+            elif not modifiers & (CONTROL | ALT | GUI):
+                shifted_character = SHIFTED_CHARACTERS.get(pressed_character)
+                if modifiers & SHIFT and shifted_character is not None:
+                    state.current_prompt.type(shifted_character)
                 else:
-                    current_prompt += pressed_characters[0]
-    
-
-    return listening_for_prompt, listening_for_clipboard, listening_notification, option_selected, inside_IDE, call_api, current_prompt, keycodes, characters
+                    state.current_prompt.type(pressed_character)
+
+
+def submit_prompt(state, menu):
+    state.call_api = False
+    prompt = state.current_prompt.build(menu.prompts[menu.current_option])
+    original = None
+    # Keys typed into the prompt went to the PC as well, over the selection
+    if TYPE_EDITS and menu.edits[menu.current_option] and state.current_prompt.only(state.selection):
+        original = state.selection
+    job = prompt_queue.submit(prompt, state.inside_IDE, original)
+    if job is None:
+        show_text("Too many prompts waiting")
+        return
+    # The job and then the conversation keep it from here, the next prompt
+    # starts empty
+    state.current_prompt = Prompt()
+    state.selection = None
+    text = prompt_text(prompt)
+    print("Job", job.number, text)
+    state.viewing_response = True
+    state.browsing = False
+    state.listening_notification = False
+    state.option_selected = True
+    show_status(prompt_queue.status())
+    if not state.online:
+        # Sent once the network task starts
+        if wifi_manager is not None:
+            wifi_manager.wake()
+        show_text("Waiting for Wi-Fi...")
+    elif state.streaming:
+        # Back to the response streaming, this one comes after it
+        state.following = True
+        show_text("Job %d queued" % job.number)
+    else:
+        show_text(text)
 
 
-if __name__ == '__main__':
-    ret = connect_to_wifi(SSID, PASSWORD)
-    if not ret:
-        print("Connecting to aux wifi")
-        ret = connect_to_wifi(SSID_AUX, PASSWORD_AUX)
-    if not ret:
-        print("Couldn't connect to wifi")
-        exit()
-    menu = Menu()
-    pool = socketpool.SocketPool(wifi.radio)
-    socket = initialize_tcp_server(pool)
-    label = initialize_display()
-    requests = adafruit_requests.Session(pool, ssl.create_default_context())
-    current_uart_data = bytearray()
-    current_serial_data = ''
-    last_pressed_keycodes = []
-    last_pressed_characters = []
-    responses = []
-    current_prompt = ''
-    listening_for_prompt = False
-    listening_notification = False
-    viewing_response = False
-    call_api = False
-    LED.value = False
+async def keyboard_task(state, menu):
+    frame_decoder = FrameDecoder()
+    keys = ReportDecoder(HID_KEYCODE_TO_CHARACTER)
+    uart_buf = bytearray(RX_SIZE)
+    first_key = True
+    while True:
+        size = 0
+        if keyboard_uart.in_waiting:
+            start = uart_read_stage.start()
+            size = keyboard_uart.readinto(uart_buf) or 0
+            uart_read_stage.end(start)
+        # Decoding is what's left of the loop once the handling is taken out
+        start = frame_decode_stage.start()
+        handled = 0
+        for packet in frame_decoder.feed(uart_buf, size):
+            if len(packet) == 13:
+                modifier_pos, first_key_pos = 1, 3
+            elif len(packet) == 8:
+                modifier_pos, first_key_pos = 0, 2
+            else:
+                continue
+            memory.activity += 1
+            # Forward first, prompt capture and hotkeys only need to keep up
+            if forwarder is not None:
+                span = hid_forward_stage.start()
+                forwarder.forward(packet, modifier_pos, first_key_pos)
+                handled += hid_forward_stage.end(span)
+                if first_key:
+                    first_key = False
+                    boot_timer.mark("first_key")
+            span = parse_packet_stage.start()
+            keys.decode(packet, modifier_pos, first_key_pos, first_key_pos + 5)
+            handled += parse_packet_stage.end(span)
+
+            span = keys_stage.start()
+            process_keycodes(keys, state)
+            handled += keys_stage.end(span)
+            typing = not keys.idle
+            state.keys_held = typing
+            if typist is not None:
+                # The answer waits while keys are held or the next prompt is
+                # typed, it goes on after the submit or Escape
+                typist.hold(typing or state.listening_for_prompt)
+
+            if state.listening_for_clipboard and not typing:
+                state.listening_for_clipboard = False
+                clipboard_queue.put_nowait(True)
+
+            if state.call_api == True and not typing:
+                submit_prompt(state, menu)
+        if size:
+            frame_decode_stage.end(start, handled)
+
+        if state.listening_for_prompt:
+            if state.listening_notification == False:
+                show_text("Listening for prompt...")
+                state.listening_notification = True
+        await asyncio.sleep(0)
+
+
+async def console_task():
+    # "metrics" on the serial console prints the summary, "metrics reset"
+    # clears it
+    line = ""
+    while True:
+        exception, data = read_from_serial_monitor()
+        if exception is None and data:
+            line += data
+            while "\n" in line or "\r" in line:
+                command, _, line = line.replace("\r", "\n").partition("\n")
+                command = command.strip()
+                if command == "metrics reset":
+                    metrics.reset()
+                    print("Metrics reset")
+                elif command == "metrics":
+                    print(metrics.summary())
+            line = line[-32:]
+        await asyncio.sleep(0.1)
+
+
+async def input_task(state, menu):
     last_position = 0
     button_state = None
-    option_selected = True
-    typing = True
-    result = None
-    listening_for_clipboard = False
-    inside_IDE = False
     while True:
-        read_uart(current_uart_data)
-        # Skip initial packet
-        if len(current_uart_data) > 0 and current_uart_data[-1] == 255:
-            packet_count = 0
-            for i in range(len(current_uart_data)):
-                if current_uart_data[i] == 255:
-                    packet_count += 1
-            packet_length = len(current_uart_data) // packet_count
-            packets = [current_uart_data[i:i+packet_length]
-                       for i in range(0, len(current_uart_data), packet_length)]
-            for packet in packets:
-                if len(packet) == 14:
-                    keycodes, characters = parse_packet(
-                        packet, modifier_pos=1, first_key_pos=3, last_key_pos=7)
-                elif len(packet) == 9:
-                    keycodes, characters = parse_packet(
-                        packet, modifier_pos=0, first_key_pos=2, last_key_pos=6)
-                else:
-                    continue
-
-                listening_for_prompt, listening_for_clipboard, listening_notification, option_selected, inside_IDE, call_api, current_prompt, keycodes, characters = process_keycodes(
-                    keycodes,
-                    characters,
-                    current_prompt,
-                    listening_for_prompt,
-                    listening_for_clipboard,
-                    listening_notification,
-                    option_selected,
-                    inside_IDE,
-                    LED,
-                    call_api,
-                    label
-                )
-                last_pressed_keycodes = keycodes
-                last_pressed_characters = characters
-                typing = True
-                if all(i == 0 for i in keycodes):
-                    typing = False
-
-                if listening_for_clipboard and not typing:
-                    clipboard = accept_packet(socket)
-                    current_prompt += str(clipboard, 'utf-8')
-                    display_text(label, current_prompt)
-                    listening_for_clipboard = False
-                    del clipboard
-                    gc.collect()
-
-                if call_api == True and not typing:
-                    call_api = False
-                    current_prompt = menu.prompts[menu.current_option] + \
-                        current_prompt
-                    print(current_prompt)
-                    viewing_response = True
-                    listening_for_serial = False
-                    listening_notification = False
-                    option_selected = True
-                    display_text(label, current_prompt)
-                    result = call_chatgpt(current_prompt, requests, label, inside_IDE)
-                    current_prompt += result.full_prompt
-
-            current_uart_data = bytearray()
-
-        if listening_for_prompt:
-            if listening_notification == False:
-                display_text(label, "Listening for prompt...")
-                listening_notification = True
-            # exception, current_serial_data = read_from_serial_monitor()
-            # if len(current_serial_data) > 0 and exception == None:
-            #     print("Serial data: " + current_serial_data)
-            #     current_prompt += current_serial_data
-            #     display_text(label, current_prompt)
-            #     print(current_prompt)
-
         position = encoder.position
         if position != last_position:
-            if viewing_response and result is not None:
+            if state.viewing_response:
+                # Scrolling stops the streaming response from being drawn
+                state.browsing = True
+                state.following = False
+                # Past the first or last page it goes on to the neighbouring response
                 if position > last_position:
-                    result.display_next_prompt(label)
+                    page = state.history.next_page()
                 else:
-                    result.display_previous_prompt(label)
+                    page = state.history.previous_page()
+                if page is not None:
+                    show_text(page)
             else:
-                option_selected = True
+                state.option_selected = True
                 if position > last_position:
                     menu.next_option()
                 else:
@@ -505,9 +810,211 @@ if __name__ == '__main__':
         if button.value and button_state is None:
             button_state = "pressed"
         if not button.value and button_state == "pressed":
-            viewing_response = False
+            state.viewing_response = False
+            state.browsing = False
+            state.following = False
             button_state = None
 
-        if not listening_for_prompt and not viewing_response and option_selected:
-            option_selected = False
-            display_list(label, menu.options, menu.current_option)
+        if not state.listening_for_prompt and not state.viewing_response and state.option_selected:
+            state.option_selected = False
+            show_list(menu.options, menu.current_option)
+        await asyncio.sleep(0.01)
+
+
+async def warm_up(state, backend):
+    # Opens the connection for the prompt being typed once no key came in
+    # for PREWARM_GAP, not while a key is down. Nothing when the prompt was
+    # sent or dropped before that.
+    seen = memory.activity
+    quiet = time.monotonic()
+    while state.listening_for_prompt and not len(prompt_queue):
+        await asyncio.sleep(0.1)
+        if memory.activity != seen or state.keys_held:
+            seen = memory.activity
+            quiet = time.monotonic()
+        elif time.monotonic() - quiet >= PREWARM_GAP:
+            break
+    else:
+        return
+    # Only the endpoint the prompt is likely to go to
+    endpoint = backend.order()[0]
+    try:
+        if endpoint.connection.ensure_connected():
+            print("Connected to", endpoint.name, "in", endpoint.connection.connect_ms, "ms")
+    except Exception as e:
+        endpoint.failed()
+        print("Couldn't connect to", endpoint.name + ":", e)
+
+
+async def network_task(state, backend, cache):
+    while True:
+        item = await prompt_queue.get()
+        if item is None:
+            await warm_up(state, backend)
+            continue
+        job = item
+        if not wifi_manager.ready.is_set():
+            # Lost since, back once it connects again
+            wifi_manager.wake()
+            show_text("Waiting for Wi-Fi...")
+            await wifi_manager.ready.wait()
+        prompt, inside_IDE = job.prompt, job.inside_IDE
+        # An edit is typed once the whole answer is in
+        typed = job.original is None
+        state.streaming = True
+        state.cancel_stream = False
+        # Drawn unless the user is busy with the next prompt or scrolling
+        state.following = not state.listening_for_prompt and not state.browsing
+        show_status(prompt_queue.status())
+        conversation = state.conversation
+        message = conversation.add("user", prompt)
+        # The answer depends on the history sent along with the prompt. A
+        # prompt on flash goes by its checksum and size instead of its text.
+        text = prompt if isinstance(prompt, str) else "%08x %d" % (message.crc, message.size)
+        key = cache_key(backend.models, "%08x\n%s" % (conversation.digest, text))
+        status = FAILED
+        try:
+            cached = cache.get(key)
+            if cached is not None:
+                job.result = await replay_response(cached, state, inside_IDE, typed)
+            else:
+                job.result = await call_chatgpt(conversation, backend, state, inside_IDE, typed)
+                if job.result.complete:
+                    cache.put(key, job.result.tokens)
+                job.result.tokens = None
+            print("Cache:", cache.hits, "hits,", cache.misses, "misses,", len(cache), "entries")
+            if job.result.complete:
+                # Before the answer can push a selection on flash out of the
+                # conversation
+                if not typed:
+                    await type_edit(job.original, job.result.full_prompt)
+                conversation.add("assistant", job.result.full_prompt)
+                status = DONE
+            elif job.result.error is not None:
+                print("Request failed:", job.result.error)
+                # What came of the answer stays for the next prompt to build on
+                conversation.add("assistant", job.result.full_prompt)
+                status = FAILED
+            else:
+                conversation.pop()
+                status = CANCELLED
+        except Exception as e:
+            print("Request failed:", e)
+            backend.close()
+            conversation.pop()
+            if state.following:
+                show_text("Request failed")
+        if state.forget_conversation:
+            state.forget_conversation = False
+            conversation.clear()
+        print("Context:", len(conversation), "messages, about", conversation.tokens, "tokens")
+        # Only the status stays, the answer is in the history
+        job.result = None
+        job.original = None
+        prompt_queue.finish(job, status)
+        show_status(prompt_queue.status())
+        state.streaming = False
+
+
+async def clipboard_task(state, socket):
+    receiver = ClipboardReceiver(timeout=TIMEOUT)
+    while True:
+        # Until a clipboard is asked for, connections are metrics requests
+        while METRICS and not state.listening_for_clipboard and not len(clipboard_queue):
+            try:
+                conn, _ = socket.accept()
+            except OSError:
+                await asyncio.sleep(METRICS_POLL)
+                continue
+            try:
+                await serve(conn, metrics, TIMEOUT)
+            except OSError as e:
+                print("Metrics request failed:", e)
+        await clipboard_queue.get()
+        clipboard = await receiver.receive(socket)
+        if clipboard is None:
+            show_text("Clipboard transfer failed")
+            continue
+        state.selection = clipboard
+        state.current_prompt.paste(clipboard)
+        show_text(state.current_prompt.preview(CHARACTER_LIMIT))
+        del clipboard
+
+
+async def serial_task(state):
+    # Text from the data COM port joins the prompt like a clipboard does
+    receiver = SerialReceiver(serial_data)
+    while True:
+        if not receiver.waiting:
+            await asyncio.sleep(SERIAL_POLL)
+            continue
+        clipboard = await receiver.receive()
+        if clipboard is None:
+            show_text("Serial transfer failed")
+            continue
+        state.selection = clipboard
+        state.current_prompt.paste(clipboard)
+        show_text(state.current_prompt.preview(CHARACTER_LIMIT))
+        del clipboard
+
+
+async def start_features(state, menu):
+    # Everything past the keyboard, in the order it becomes useful. The
+    # keyboard task gets to run before every stage.
+    global wifi_manager
+    await asyncio.sleep(0)
+    text_area = initialize_display()
+    boot_timer.mark("display")
+    asyncio.create_task(display_scheduler.run(text_area))
+    await asyncio.sleep(0)
+    import_features()
+    state.history = ResponseHistory(DISPLAY_WIDTH / SCALE_FACTOR, MAX_ROWS, FONT_WIDTH)
+    state.conversation = Conversation(CONTEXT_BUDGET)
+    boot_timer.mark("features")
+    asyncio.create_task(input_task(state, menu))
+    if serial_data is not None:
+        asyncio.create_task(serial_task(state))
+    await asyncio.sleep(0)
+    configure_ipv4()
+    wifi_manager = WifiManager(wifi.radio, ((SSID, PASSWORD), (SSID_AUX, PASSWORD_AUX)),
+                               activity=lambda: memory.activity)
+    if len(prompt_queue):
+        wifi_manager.wake()
+    asyncio.create_task(wifi_manager.run())
+    await wifi_manager.ready.wait()
+    boot_timer.mark("wifi")
+    pool = socketpool.SocketPool(wifi.radio)
+    socket = initialize_tcp_server(pool)
+    backend = load_endpoints(pool, ssl.create_default_context())
+    metrics.reporters.append(backend.summary)
+    cache = ResponseCache(ttl=int(CACHE_TTL) if CACHE_TTL is not None else None)
+    asyncio.create_task(network_task(state, backend, cache))
+    asyncio.create_task(clipboard_task(state, socket))
+    state.online = True
+    boot_timer.mark("online")
+    print(boot_timer.summary())
+
+
+async def main():
+    # The keyboard comes first, the rest starts in the background
+    menu = Menu()
+    register_chords(chords, menu)
+    state = State()
+    LED.value = False
+    tasks = [
+        asyncio.create_task(keyboard_task(state, menu)),
+        asyncio.create_task(console_task()),
+        asyncio.create_task(memory.run()),
+    ]
+    if typist is not None:
+        tasks.append(asyncio.create_task(typist.run()))
+    boot_timer.mark("keyboard")
+    tasks.append(asyncio.create_task(start_features(state, menu)))
+    metrics.reporters.append(boot_timer.summary)
+    await asyncio.gather(*tasks)
+
+
+chords = ChordTable()
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,225 @@
+# Chat history for retained context, as role-tagged messages under a token
+# budget. The oldest turns are dropped once the estimate goes over it, long
+# messages are kept on flash instead of RAM, and the request body is written
+# out piece by piece instead of being built as one string. A prompt with a
+# clipboard on flash, see prompt.py, is kept as it is.
+import binascii
+import json
+import os
+from clipboard import Utf8Decoder
+
+# What gets sent along with a new prompt, leave room for the answer
+CONTEXT_TOKENS = 1500
+# Longer messages are moved to flash
+INLINE_LIMIT = 1024
+CONTEXT_DIR = "/context"
+# Characters escaped at a time while writing the body
+CHUNK_SIZE = 256
+# Tokens the API adds around every message, and to prime the answer
+MESSAGE_TOKENS = 4
+REPLY_TOKENS = 3
+
+_MESSAGES_END = b"]}"
+_SEPARATOR = b", "
+_CONTENT_END = b"\"}"
+
+
+def estimate_tokens(text):
+    # About 4 characters per token for English, but never fewer tokens than
+    # words. Code and other languages come out low, the budget has slack.
+    return _estimate(len(text), text.count(" ") + text.count("\n"))
+
+
+def _estimate(length, spaces):
+    return max((length + 3) // 4, spaces + 1)
+
+
+def _pieces(content):
+    # At most CHUNK_SIZE characters at a time
+    chunks = (content,) if isinstance(content, str) else content.chunks()
+    for chunk in chunks:
+        for i in range(0, len(chunk), CHUNK_SIZE):
+            yield chunk[i:i + CHUNK_SIZE]
+
+
+def _escape(text):
+    # The inside of the JSON string for text
+    return json.dumps(text)[1:-1].encode()
+
+
+def _role_start(role):
+    return ('{"role": "%s", "content": "' % role).encode()
+
+
+class Message:
+    def __init__(self, role, content, path, tokens, size, crc):
+        self.role = role
+        # Either the content, a prompt.Prompt, or the file it was moved to
+        self.content = content
+        self.path = path
+        self.tokens = tokens
+        # Length of the escaped content in the body
+        self.size = size
+        self.crc = crc
+
+    def chunks(self):
+        if self.path is None:
+            yield from _pieces(self.content)
+            return
+        decoder = Utf8Decoder()
+        buf = bytearray(CHUNK_SIZE)
+        with open(self.path, "rb") as f:
+            while True:
+                size = f.readinto(buf)
+                if not size:
+                    break
+                yield decoder.decode(buf, size)
+        yield decoder.finish()
+
+    def text(self):
+        return "".join(self.chunks())
+
+
+class Conversation:
+    def __init__(self, budget=CONTEXT_TOKENS, inline_limit=INLINE_LIMIT, directory=CONTEXT_DIR):
+        self.budget = budget
+        self.inline_limit = inline_limit
+        self.directory = directory
+        self.messages = []
+        self.tokens = REPLY_TOKENS
+        self.trimmed = 0
+        self._files = 0
+        self.writable = True
+        # Files left over from before a reset
+        try:
+            for name in os.listdir(directory):
+                os.remove(directory + "/" + name)
+        except OSError:
+            try:
+                os.mkdir(directory)
+            except OSError:
+                self.writable = False
+
+    def __len__(self):
+        return len(self.messages)
+
+    @property
+    def digest(self):
+        # Changes with every message that would be sent, for cache keys
+        crc = 0
+        for message in self.messages:
+            crc = binascii.crc32(message.role.encode(), crc)
+            crc = binascii.crc32(("%08x" % message.crc).encode(), crc)
+        return crc & 0xFFFFFFFF
+
+    def _store(self, content):
+        # Writes long content to flash, returns the path or None
+        if not self.writable:
+            return None
+        self._files += 1
+        path = "%s/%d.txt" % (self.directory, self._files)
+        try:
+            with open(path, "wb") as f:
+                for i in range(0, len(content), CHUNK_SIZE):
+                    f.write(content[i:i + CHUNK_SIZE].encode())
+        except OSError as e:
+            print("Keeping context in RAM:", e)
+            self.writable = False
+            return None
+        return path
+
+    def add(self, role, content):
+        # content is a str, or a Prompt whose files the message takes over
+        size = 0
+        crc = 0
+        length = 0
+        spaces = 0
+        for chunk in _pieces(content):
+            size += len(_escape(chunk))
+            crc = binascii.crc32(chunk.encode(), crc)
+            length += len(chunk)
+            spaces += chunk.count(" ") + chunk.count("\n")
+        path = None
+        if isinstance(content, str) and length > self.inline_limit:
+            path = self._store(content)
+        message = Message(role, content if path is None else None, path,
+                          _estimate(length, spaces) + MESSAGE_TOKENS, size, crc)
+        self.messages.append(message)
+        self.tokens += message.tokens
+        self.trim()
+        return message
+
+    def _drop(self, index):
+        message = self.messages.pop(index)
+        self.tokens -= message.tokens
+        if message.path is not None:
+            try:
+                os.remove(message.path)
+            except OSError:
+                pass
+        elif not isinstance(message.content, str):
+            message.content.remove()
+
+    def pop(self):
+        # Takes back the last message, for a prompt that got no answer
+        if self.messages:
+            self._drop(len(self.messages) - 1)
+
+    def trim(self):
+        # Drops the oldest messages until the rest fits, the newest one stays
+        # even when it is over the budget on its own
+        while self.tokens > self.budget and len(self.messages) > 1:
+            self._drop(0)
+            self.trimmed += 1
+        # A conversation can't start with an answer
+        while len(self.messages) > 1 and self.messages[0].role == "assistant":
+            self._drop(0)
+            self.trimmed += 1
+
+    def clear(self):
+        while self.messages:
+            self._drop(0)
+
+
+class RequestBody:
+    # A streamed chat completion request body for http_client. It can be
+    # iterated more than once, for a request that has to be sent again.
+
+    def __init__(self, conversation, model, extra=()):
+        self.conversation = conversation
+        self._head = ('{"model": %s, "stream": true, "messages": [' % json.dumps(model)).encode()
+        # (role, content) sent after the conversation without joining it
+        self.extra = extra
+
+    def __len__(self):
+        messages = self.conversation.messages
+        size = len(self._head) + len(_MESSAGES_END)
+        for i in range(len(messages)):
+            message = messages[i]
+            if i:
+                size += len(_SEPARATOR)
+            size += len(_role_start(message.role)) + message.size + len(_CONTENT_END)
+        for role, content in self.extra:
+            size += len(_SEPARATOR) + len(_role_start(role)) + len(_CONTENT_END)
+            for i in range(0, len(content), CHUNK_SIZE):
+                size += len(_escape(content[i:i + CHUNK_SIZE]))
+        return size
+
+    def __iter__(self):
+        yield self._head
+        messages = self.conversation.messages
+        for i in range(len(messages)):
+            message = messages[i]
+            if i:
+                yield _SEPARATOR
+            yield _role_start(message.role)
+            for chunk in message.chunks():
+                yield _escape(chunk)
+            yield _CONTENT_END
+        for role, content in self.extra:
+            yield _SEPARATOR
+            yield _role_start(role)
+            for i in range(0, len(content), CHUNK_SIZE):
+                yield _escape(content[i:i + CHUNK_SIZE])
+            yield _CONTENT_END
+        yield _MESSAGES_END
@@ -0,0 +1,62 @@
+# Screen updates decoupled from whoever produces them. Only the latest
+# update is kept, and it is drawn at most max_fps times a second, so a fast
+# stream skips the frames nobody would have seen and a slow one still shows
+# every token. The last update is never dropped, it is always drawn once the
+# frame time comes. The status row is kept apart, so setting it doesn't
+# replace the text waiting to be drawn, and goes out with the next frame.
+import asyncio
+import time
+
+MAX_FPS = 15
+
+
+class DisplayScheduler:
+    def __init__(self, max_fps=MAX_FPS):
+        self.interval = 1000000000 // max_fps
+        # (draw function, arguments) waiting for the next frame
+        self._pending = None
+        self._status = None
+        self._event = asyncio.Event()
+        self._next = 0
+        self.frames = 0
+        self.skipped = 0
+
+    @property
+    def pending(self):
+        return self._pending is not None or self._status is not None
+
+    def show_status(self, text):
+        self._status = text
+        self._event.set()
+
+    def show(self, draw, *args):
+        # Replaces an update that wasn't drawn yet
+        if self._pending is not None:
+            self.skipped += 1
+        self._pending = (draw, args)
+        self._event.set()
+
+    async def run(self, target):
+        while True:
+            while self._pending is None and self._status is None:
+                self._event.clear()
+                await self._event.wait()
+            wait = time.monotonic_ns() - self._next
+            if wait < 0:
+                await asyncio.sleep(-wait / 1000000000)
+            start = time.monotonic_ns()
+            if self._status is not None:
+                target.set_status(self._status)
+                self._status = None
+            if self._pending is not None:
+                draw, args = self._pending
+                self._pending = None
+                draw(target, *args)
+            else:
+                target.flush()
+            end = time.monotonic_ns()
+            self.frames += 1
+            # When drawing is slower than the frame rate, wait at least as long
+            # as it took, the stream gets half the time or more
+            self._next = end + max(self.interval - (end - start), end - start)
+            await asyncio.sleep(0)
@@ -0,0 +1,289 @@
+# The answer to an editing template (Refactor, Document, Correct) is the
+# text that was sent, changed here and there. Instead of typing all of it
+# again over the selection, it is diffed against that text line by line
+# and only the changes are typed: the cursor walks over unchanged lines
+# with End and Right, changed lines are selected and typed over, and a line
+# with a small change only has the changed characters replaced.
+#
+# The text must still be selected in the editor, Left puts the cursor at
+# the start of it. Lines are found with End, so the editor mustn't wrap
+# long lines. When the change is too big to diff on the board, or typing
+# it wouldn't take fewer keys than typing the whole answer, plan_edit
+# returns None and the answer is typed over the selection like before.
+from array import array
+from typist import SHIFT_FLAG
+
+# Keycodes, SHIFT_FLAG holds shift down as well
+RIGHT = 0x4F
+LEFT = 0x50
+END = 0x4D
+DELETE = 0x4C
+BACKSPACE = 0x2A
+
+# Lines inserted plus lines deleted, above this the whole answer is typed.
+# The diff keeps about 2 * MAX_EDITS ** 2 bytes while it runs.
+MAX_EDITS = 100
+
+
+def split_lines(text):
+    # Lines as the editor has them, the last one without a newline
+    return text.replace("\r\n", "\n").split("\n")
+
+
+def diff_lines(a, b, max_edits=MAX_EDITS):
+    # Opcodes like difflib's get_opcodes, (tag, i1, i2, j1, j2), None when
+    # more than max_edits lines are inserted or deleted. Myers' algorithm on
+    # what is left between the common first and last lines.
+    n, m = len(a), len(b)
+    start = 0
+    while start < n and start < m and a[start] == b[start]:
+        start += 1
+    end_a, end_b = n, m
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    width, height = end_a - start, end_b - start
+    limit = width + height
+    if limit > max_edits:
+        # The edits can't be fewer than the difference in lengths
+        if abs(width - height) > max_edits:
+            return None
+        limit = max_edits
+    offset = limit + 1
+    v = [0] * (2 * limit + 3)
+    # v around the diagonals reached before every round, for going back
+    trace = []
+    found = False
+    for d in range(limit + 1):
+        trace.append(array("H", v[offset - d - 1:offset + d + 2]))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < width and y < height and a[start + x] == b[start + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= width and y >= height:
+                found = True
+                break
+        if found:
+            break
+    if not found:
+        return None
+    del v
+    # Back from the end, True for a line of a kept, False deleted, None
+    # inserted
+    moves = []
+    x, y = width, height
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[d + k] < v[d + k + 2]):
+            previous = k + 1
+        else:
+            previous = k - 1
+        previous_x = v[d + 1 + previous]
+        previous_y = previous_x - previous
+        while x > previous_x and y > previous_y:
+            moves.append(True)
+            x -= 1
+            y -= 1
+        if d:
+            moves.append(None if x == previous_x else False)
+        x, y = previous_x, previous_y
+    del trace
+    opcodes = []
+    if start:
+        opcodes.append(("equal", 0, start, 0, start))
+    i = j = start
+    while moves:
+        i1, j1 = i, j
+        if moves[-1]:
+            while moves and moves[-1]:
+                moves.pop()
+                i += 1
+                j += 1
+            opcodes.append(("equal", i1, i, j1, j))
+            continue
+        while moves and not moves[-1]:
+            if moves.pop() is None:
+                j += 1
+            else:
+                i += 1
+        if i == i1:
+            tag = "insert"
+        elif j == j1:
+            tag = "delete"
+        else:
+            tag = "replace"
+        opcodes.append((tag, i1, i, j1, j))
+    if end_a < n:
+        opcodes.append(("equal", end_a, n, end_b, m))
+    return opcodes
+
+
+class Keystrokes:
+    # What the typist gets: bytes of keycodes to press, str to type
+    def __init__(self):
+        self.items = []
+        # Keys that go down, a character typed is one
+        self.presses = 0
+        self._keys = bytearray()
+
+    def press(self, keycode, times=1):
+        if times > 0:
+            self._keys.extend(bytes((keycode,)) * times)
+            self.presses += times
+
+    def type(self, text):
+        if text:
+            self._flush()
+            self.items.append(text)
+            self.presses += len(text)
+
+    def extend(self, other):
+        self._flush()
+        other._flush()
+        self.items.extend(other.items)
+        self.presses += other.presses
+
+    def _flush(self):
+        if self._keys:
+            self.items.append(bytes(self._keys))
+            self._keys = bytearray()
+
+    def done(self):
+        self._flush()
+        return self.items
+
+
+def _skip(keys, line):
+    # From the start of a line to the start of the next one
+    if len(line) < 2:
+        keys.press(RIGHT, len(line) + 1)
+    else:
+        keys.press(END)
+        keys.press(RIGHT)
+
+
+def _select(keys, line, last):
+    # The line and its newline, only up to its end for the last line, which
+    # can end before the editor's line does
+    if last:
+        keys.press(RIGHT | SHIFT_FLAG, len(line))
+    elif len(line) < 2:
+        keys.press(RIGHT | SHIFT_FLAG, len(line) + 1)
+    else:
+        keys.press(END | SHIFT_FLAG)
+        keys.press(RIGHT | SHIFT_FLAG)
+
+
+def _change(keys, old, new, last):
+    # Replaces what changed between the common start and end of a line
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    removed = len(old) - prefix - suffix
+    added = new[prefix:len(new) - suffix]
+    if last or prefix <= len(old) - prefix + 1:
+        keys.press(RIGHT, prefix)
+    else:
+        keys.press(END)
+        keys.press(LEFT, len(old) - prefix)
+    if not suffix and removed > 1 and not last:
+        keys.press(END | SHIFT_FLAG)
+        if not added:
+            keys.press(DELETE)
+    else:
+        keys.press(DELETE, removed)
+    keys.type(added)
+    if last:
+        return
+    if suffix < 2:
+        keys.press(RIGHT, suffix + 1)
+    else:
+        keys.press(END)
+        keys.press(RIGHT)
+
+
+def _change_line(keys, old, new):
+    # Whichever takes fewer keys, the changed characters or the whole line
+    changed = Keystrokes()
+    _change(changed, old, new, False)
+    if changed.presses < 3 + len(new):
+        keys.extend(changed)
+    else:
+        _select(keys, old, False)
+        keys.type(new + "\n")
+
+
+def plan_edit(original, answer, max_edits=MAX_EDITS):
+    # Keystrokes that turn the selected original into the answer, or None
+    # when typing the answer over the selection takes fewer
+    if not original or not answer:
+        return None
+    original = original.replace("\r\n", "\n")
+    # The answer ends with a newline when the selection did, then every line
+    # has one. Otherwise the last line is only ever changed up to its end.
+    if original.endswith("\n"):
+        if not answer.endswith("\n"):
+            answer += "\n"
+        old = split_lines(original[:-1])
+        new = split_lines(answer[:-1])
+        last = len(old)
+    else:
+        answer = answer.rstrip("\n")
+        old = split_lines(original)
+        new = split_lines(answer)
+        last = len(old) - 1
+    opcodes = diff_lines(old, new, max_edits)
+    if opcodes is None:
+        return None
+    # Nothing to do after the last change
+    while opcodes and opcodes[-1][0] == "equal":
+        opcodes.pop()
+    keys = Keystrokes()
+    keys.press(LEFT)
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            for i in range(i1, i2):
+                if i == last:
+                    # An insert after the last line follows
+                    keys.press(RIGHT, len(old[i]))
+                else:
+                    _skip(keys, old[i])
+        elif tag == "insert":
+            if i1 > last:
+                keys.type("\n" + "\n".join(new[j1:j2]))
+            else:
+                keys.type("\n".join(new[j1:j2]) + "\n")
+        elif tag == "replace" and i2 - i1 == j2 - j1:
+            for i in range(i1, i2):
+                if i == last:
+                    _change(keys, old[i], new[j1 + i - i1], True)
+                else:
+                    _change_line(keys, old[i], new[j1 + i - i1])
+        else:
+            for i in range(i1, i2):
+                _select(keys, old[i], i == last)
+            if tag == "replace":
+                if i2 > last:
+                    keys.type("\n".join(new[j1:j2]))
+                else:
+                    keys.type("\n".join(new[j1:j2]) + "\n")
+            else:
+                keys.press(BACKSPACE)
+                if i2 > last and i1:
+                    # The line before is the last one now, without a newline
+                    keys.press(BACKSPACE)
+        if keys.presses >= len(answer):
+            return None
+    return keys.done()
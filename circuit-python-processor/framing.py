@@ -0,0 +1,115 @@
+# Framing for the keyboard reports sent over UART by capture_hid_report.c.
+# Every report is COBS encoded (Consistent Overhead Byte Stuffing) and ends
+# with a 0x00 delimiter, so a report can contain any byte value and a read
+# that splits a report is picked up where it left off.
+
+FRAME_DELIMITER = 0x00
+MAX_FRAME = 64
+RX_SIZE = 256
+
+
+def cobs_encode(data):
+    out = bytearray(len(data) + len(data) // 254 + 2)
+    code_pos = 0
+    code = 1
+    write = 1
+    for byte in data:
+        if byte == 0:
+            out[code_pos] = code
+            code = 1
+            code_pos = write
+            write += 1
+        else:
+            out[write] = byte
+            write += 1
+            code += 1
+            if code == 0xFF:
+                out[code_pos] = code
+                code = 1
+                code_pos = write
+                write += 1
+    out[code_pos] = code
+    out[write] = FRAME_DELIMITER
+    return out[:write + 1]
+
+
+class FrameDecoder:
+    # State machine COBS decoder. Bytes are read with readinto into a
+    # preallocated receive buffer and decoded into a preallocated frame
+    # buffer, frames are handed out as memoryviews over it that stay valid
+    # until the next frame is requested.
+
+    def __init__(self, max_frame=MAX_FRAME, rx_size=RX_SIZE):
+        self._rx = bytearray(rx_size)
+        self._frame = bytearray(max_frame)
+        frame_view = memoryview(self._frame)
+        # One view per possible length, so handing out a frame doesn't allocate
+        self._views = [frame_view[:n] for n in range(max_frame + 1)]
+        self._length = 0
+        self._left = 0
+        self._code = 0
+        self._zero = False
+        # Until the first delimiter we might be in the middle of a frame
+        self._skip = True
+        self.frames = 0
+        self.errors = 0
+
+    def read_frames(self, uart):
+        waiting = uart.in_waiting
+        if not waiting:
+            return
+        size = uart.readinto(self._rx)
+        if size:
+            yield from self.feed(self._rx, size)
+
+    def feed(self, data, size):
+        frame = self._frame
+        max_frame = len(frame)
+        length = self._length
+        left = self._left
+        code = self._code
+        zero = self._zero
+        skip = self._skip
+        i = 0
+        while i < size:
+            byte = data[i]
+            i += 1
+            if byte == FRAME_DELIMITER:
+                if skip:
+                    skip = False
+                elif left or length == 0:
+                    # Truncated or empty frame
+                    self.errors += 1
+                else:
+                    self.frames += 1
+                    yield self._views[length]
+                length = left = 0
+                zero = False
+            elif skip:
+                continue
+            elif left == 0:
+                # Code byte, it starts a new block
+                if zero:
+                    if length >= max_frame:
+                        self.errors += 1
+                        skip = True
+                        continue
+                    frame[length] = 0
+                    length += 1
+                code = byte
+                left = byte - 1
+                zero = left == 0 and byte != 0xFF
+            elif length >= max_frame:
+                self.errors += 1
+                skip = True
+            else:
+                frame[length] = byte
+                length += 1
+                left -= 1
+                if left == 0:
+                    zero = code != 0xFF
+        self._length = length
+        self._left = left
+        self._code = code
+        self._zero = zero
+        self._skip = skip
@@ -187,4 +187,7 @@ DECODE_DIACRITICS = {
     'Ş': 'S',
     'ţ': 't',
     'Ţ': 'T',
-}
\ No newline at end of file
+}
+# Unshifted character for every keycode, 0 where there is none
+HID_KEYCODE_TO_CHARACTER = [entry[0] for entry in HID_KEYCODE_TO_ASCII] + \
+    [0] * (256 - len(HID_KEYCODE_TO_ASCII))
@@ -0,0 +1,130 @@
+# Keyboard report decoding into fixed, reused buffers. Held keys are kept
+# as a 256-bit bitmap indexed by keycode, so telling which keys were pressed
+# or released since the previous report is a bit test per key.
+
+# Modifier byte bit n is the modifier keycode 0xE0 + n, LEFT_CONTROL to
+# RIGHT_GUI, in the same order as L_MODIFIER_LIST + R_MODIFIER_LIST in hid.py
+FIRST_MODIFIER = 0xE0
+MODIFIER_KEYCODES = tuple(
+    tuple(FIRST_MODIFIER + bit for bit in range(8) if (byte >> bit) & 1)
+    for byte in range(256)
+)
+# The modifier keycodes all live in this byte of the bitmap, with the same
+# bit layout as the modifier byte of a report
+MODIFIER_BITMAP_BYTE = FIRST_MODIFIER >> 3
+
+# 8 modifiers and the key bytes of the longest report we handle
+KEY_SLOTS = 24
+# Keycodes 1-3 are error codes (rollover, POST fail), not keys
+FIRST_KEY = 4
+
+_EMPTY_BITMAP = bytes(32)
+
+
+class KeyReport:
+    def __init__(self):
+        self.keycodes = bytearray(KEY_SLOTS)
+        self.count = 0
+        self.bitmap = bytearray(32)
+
+    def is_pressed(self, keycode):
+        return (self.bitmap[keycode >> 3] >> (keycode & 7)) & 1
+
+    @property
+    def modifiers(self):
+        return self.bitmap[MODIFIER_BITMAP_BYTE]
+
+
+class ReportDecoder:
+    def __init__(self, character_table=None):
+        # 256 entries, keycode -> character or 0, see HID_KEYCODE_TO_CHARACTER
+        self.character_table = character_table
+        self.current = KeyReport()
+        self.previous = KeyReport()
+        self.pressed = bytearray(KEY_SLOTS)
+        self.pressed_count = 0
+        self.released = bytearray(KEY_SLOTS)
+        self.released_count = 0
+
+    def decode(self, report, modifier_pos, first_key_pos, last_key_pos):
+        previous = self.current
+        current = self.previous
+        self.previous = previous
+        self.current = current
+
+        keycodes = current.keycodes
+        bitmap = current.bitmap
+        bitmap[:] = _EMPTY_BITMAP
+        count = 0
+        modifiers = report[modifier_pos]
+        for keycode in MODIFIER_KEYCODES[modifiers]:
+            keycodes[count] = keycode
+            count += 1
+        bitmap[MODIFIER_BITMAP_BYTE] = modifiers
+        for i in range(first_key_pos, last_key_pos + 1):
+            keycode = report[i]
+            if keycode >= FIRST_KEY and count < KEY_SLOTS:
+                keycodes[count] = keycode
+                count += 1
+                bitmap[keycode >> 3] |= 1 << (keycode & 7)
+        current.count = count
+
+        pressed = self.pressed
+        n = 0
+        old_bitmap = previous.bitmap
+        for i in range(count):
+            keycode = keycodes[i]
+            if not (old_bitmap[keycode >> 3] >> (keycode & 7)) & 1:
+                pressed[n] = keycode
+                n += 1
+        self.pressed_count = n
+
+        released = self.released
+        n = 0
+        old_keycodes = previous.keycodes
+        for i in range(previous.count):
+            keycode = old_keycodes[i]
+            if not (bitmap[keycode >> 3] >> (keycode & 7)) & 1:
+                released[n] = keycode
+                n += 1
+        self.released_count = n
+
+    def is_pressed(self, keycode):
+        return self.current.is_pressed(keycode)
+
+    @property
+    def idle(self):
+        # No key or modifier held
+        return self.current.count == 0
+
+    def pressed_character(self):
+        # Character of the first newly pressed key that has one
+        table = self.character_table
+        for i in range(self.pressed_count):
+            character = table[self.pressed[i]]
+            if character != 0:
+                return character
+        return None
+
+
+class ReportForwarder:
+    # Sends keyboard reports to the PC as they come, in one send_report,
+    # instead of replaying the decoded key changes through Keyboard
+    def __init__(self, device):
+        self.device = device
+        self._report = bytearray(8)
+        self._keys = memoryview(self._report)[2:]
+
+    def forward(self, report, modifier_pos, first_key_pos):
+        if modifier_pos == 0 and len(report) == 8:
+            # Already a boot protocol report
+            out = report
+        else:
+            out = self._report
+            out[0] = report[modifier_pos]
+            self._keys[:] = report[first_key_pos:first_key_pos + 6]
+        try:
+            self.device.send_report(out)
+            return True
+        except Exception:
+            return False
@@ -0,0 +1,233 @@
+# Past responses on flash, browsed page by page with the encoder.
+#
+# Every response is a text file and an index file with the byte offset where
+# each page starts, as little endian u32. Pages are laid out once, while the
+# response streams in, not on demand while scrolling: the screen needs the
+# layout of the streaming page anyway, so the page breaks come for free, and
+# scrolling far back doesn't have to lay out everything before it again.
+# After that a page is only read back from its offsets when it is shown. A
+# few recently shown pages stay in RAM for scrolling back and forth. Nothing
+# kept in RAM grows with the responses.
+import os
+from text_layout import TextLayout
+
+HISTORY_DIR = "/history"
+MAX_RESPONSES = 20
+CACHED_PAGES = 3
+# Bytes collected before a write to flash
+WRITE_SIZE = 256
+
+
+class ResponseHistory:
+    def __init__(self, max_width, max_rows, char_width, directory=HISTORY_DIR,
+                 max_responses=MAX_RESPONSES, cached_pages=CACHED_PAGES):
+        self.max_width = max_width
+        self.max_rows = max_rows
+        self.char_width = char_width
+        self.directory = directory
+        self.max_responses = max_responses
+        self.cached_pages = cached_pages
+        # Response ids, oldest first
+        self.ids = []
+        self.writable = True
+        self._layout = None
+        self._text = None
+        self._index = None
+        self._pending = bytearray()
+        self._offset = 0
+        # [(id, page), text], most recently shown last
+        self._cache = []
+        # Pages of the last response when flash can't be written
+        self._memory_pages = []
+        # Shown page, as (position in ids, page)
+        self.response = -1
+        self.page = 0
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            try:
+                os.mkdir(directory)
+                names = []
+            except OSError:
+                self.writable = False
+                names = []
+        for name in names:
+            if name.endswith(".idx"):
+                try:
+                    self.ids.append(int(name[:-4]))
+                except ValueError:
+                    pass
+        self.ids.sort()
+        if self.ids:
+            self.response = len(self.ids) - 1
+            self.page = self.page_count(self.response) - 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _path(self, response_id, extension):
+        return "%s/%d.%s" % (self.directory, response_id, extension)
+
+    def _remove(self, response_id):
+        for extension in ("txt", "idx"):
+            try:
+                os.remove(self._path(response_id, extension))
+            except OSError:
+                pass
+        self._cache = [entry for entry in self._cache if entry[0][0] != response_id]
+
+    def begin(self, jump=True):
+        # Starts recording a new response, ending one that was cut off.
+        # Without jump the shown page stays, for browsing while it streams.
+        self._flush()
+        self._close_files()
+        self._layout = TextLayout(self.max_width, self.max_rows, self.char_width, keep_pages=False)
+        self._offset = 0
+        self._memory_pages = []
+        if not self.writable:
+            return
+        while len(self.ids) >= self.max_responses:
+            self._remove(self.ids.pop(0))
+            # The shown response moved up one
+            if self.response > 0:
+                self.response -= 1
+            else:
+                self.page = 0
+        response_id = self.ids[-1] + 1 if self.ids else 0
+        try:
+            self._text = open(self._path(response_id, "txt"), "wb")
+            self._index = open(self._path(response_id, "idx"), "wb")
+            self._index.write(bytes(4))
+        except OSError as e:
+            print("Response history disabled:", e)
+            self.writable = False
+            self._close_files()
+            return
+        self.ids.append(response_id)
+        if jump or self.response < 0:
+            self.response = len(self.ids) - 1
+            self.page = 0
+
+    def _close_files(self):
+        for f in (self._text, self._index):
+            if f is not None:
+                f.close()
+        self._text = None
+        self._index = None
+
+    def _flush(self):
+        if self._text is not None and self._pending:
+            self._text.write(self._pending)
+            self._pending = bytearray()
+            self._text.flush()
+            self._index.flush()
+
+    def add(self, token):
+        # Records a streamed token, returns the page it completed, if any
+        page = self._layout.add(token)
+        if self._text is None:
+            if page is not None:
+                self._memory_pages.append(page)
+            return page
+        data = token.encode()
+        if page is not None:
+            # The token starts the next page
+            self._index.write(self._offset.to_bytes(4, "little"))
+        self._offset += len(data)
+        self._pending.extend(data)
+        if len(self._pending) >= WRITE_SIZE:
+            self._flush()
+        return page
+
+    def text(self):
+        # The page of the response being recorded, as far as it got
+        if self._layout is None:
+            return ""
+        return self._layout.text()
+
+    def finish(self, jump=True):
+        # Ends the response, returns its last page
+        page = self._layout.finish()
+        self._layout = None
+        if self._text is None:
+            if page is not None:
+                self._memory_pages.append(page)
+            if jump:
+                self.page = len(self._memory_pages) - 1
+            return page
+        self._flush()
+        self._close_files()
+        if jump:
+            self.response = len(self.ids) - 1
+            self.page = self.page_count(self.response) - 1
+        return page
+
+    def page_count(self, response):
+        if not self.writable:
+            return len(self._memory_pages)
+        # No response yet, like on a fresh board before the first one begins
+        if not self.ids:
+            return 0
+        if self._index is not None:
+            self._index.flush()
+        try:
+            return os.stat(self._path(self.ids[response], "idx"))[6] // 4
+        except OSError:
+            return 0
+
+    def _read_page(self, response_id, page):
+        with open(self._path(response_id, "idx"), "rb") as f:
+            f.seek(page * 4)
+            offsets = f.read(8)
+        start = int.from_bytes(offsets[:4], "little")
+        if len(offsets) == 8:
+            end = int.from_bytes(offsets[4:], "little")
+        else:
+            end = os.stat(self._path(response_id, "txt"))[6]
+        with open(self._path(response_id, "txt"), "rb") as f:
+            f.seek(start)
+            return str(f.read(end - start), "utf-8")
+
+    def read(self, response, page):
+        if not self.writable:
+            return self._memory_pages[page]
+        response_id = self.ids[response]
+        key = (response_id, page)
+        for i in range(len(self._cache)):
+            if self._cache[i][0] == key:
+                entry = self._cache.pop(i)
+                self._cache.append(entry)
+                return entry[1]
+        self._flush()
+        text = self._read_page(response_id, page)
+        # The last page of a response still streaming isn't final yet
+        if not (response_id == self.ids[-1] and self._text is not None and page == self.page_count(response) - 1):
+            self._cache.append((key, text))
+            if len(self._cache) > self.cached_pages:
+                self._cache.pop(0)
+        return text
+
+    def current(self):
+        # The shown page, None when there is nothing to show
+        if self.writable and not self.ids:
+            return None
+        if self.page_count(self.response) == 0:
+            return None
+        return self.read(self.response, self.page)
+
+    def next_page(self):
+        # Moves one page on, into the next response after the last page
+        if self.page + 1 < self.page_count(self.response):
+            self.page += 1
+        elif self.writable and self.response + 1 < len(self.ids):
+            self.response += 1
+            self.page = 0
+        return self.current()
+
+    def previous_page(self):
+        if self.page > 0:
+            self.page -= 1
+        elif self.writable and self.response > 0:
+            self.response -= 1
+            self.page = max(self.page_count(self.response) - 1, 0)
+        return self.current()
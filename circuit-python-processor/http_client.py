@@ -0,0 +1,277 @@
+# Minimal HTTP/1.1 client for streamed responses that never blocks the
+# event loop while waiting for data. adafruit_requests blocks in recv until
+# data arrives, which stalls every other task for the whole time-to-first-
+# token. Here the socket is non-blocking after connect and every read that
+# would block yields to the scheduler instead.
+import asyncio
+import time
+
+EAGAIN = 11
+ETIMEDOUT = 116
+
+RAW_SIZE = 1024
+_CR = 13
+_LF = 10
+TIMEOUT = 15
+# Seconds connect may take, with TLS per step of the handshake. Short, a
+# server that is down would otherwise hold up the keyboard for the whole
+# TIMEOUT before the next endpoint gets a go.
+CONNECT_TIMEOUT = 3
+# Reconnect instead of reusing a connection idle for longer than this,
+# servers drop idle keep-alive connections without telling
+IDLE_TIMEOUT = 60
+
+
+class HTTPError(Exception):
+    pass
+
+
+def would_block(error):
+    code = getattr(error, "errno", None)
+    if code is None and error.args:
+        code = error.args[0]
+    return code in (EAGAIN, ETIMEDOUT)
+
+
+class HTTPConnection:
+    def __init__(self, pool, ssl_context, host, port=443, timeout=TIMEOUT, idle_timeout=IDLE_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT):
+        self.pool = pool
+        self.ssl_context = ssl_context
+        self.host = host
+        self.port = port
+        # The port goes in the Host header when it isn't the default one
+        self._host_header = host if port in (80, 443) else "%s:%d" % (host, port)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.socket = None
+        self._last_used = 0
+        self._close_after = False
+        # Milliseconds the last connect took, 0 when the request reused one
+        self.connect_ms = 0
+        self._raw = bytearray(RAW_SIZE)
+        self._raw_view = memoryview(self._raw)
+        self._start = 0
+        self._end = 0
+        self._chunked = False
+        self._remaining = None
+        self._done = True
+        self.status = None
+        self.headers = {}
+
+    def connect(self):
+        # Blocking, TLS needs the handshake to finish before anything else
+        start = time.monotonic_ns()
+        addr = self.pool.getaddrinfo(self.host, self.port)[0][-1]
+        sock = self.pool.socket(self.pool.AF_INET, self.pool.SOCK_STREAM)
+        if self.ssl_context is not None:
+            sock = self.ssl_context.wrap_socket(sock, server_hostname=self.host)
+            addr = (self.host, self.port)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect(addr)
+        except:
+            sock.close()
+            raise
+        sock.settimeout(0)
+        self.socket = sock
+        self._start = self._end = 0
+        self._done = True
+        self._close_after = False
+        self._last_used = time.monotonic()
+        self.connect_ms = (time.monotonic_ns() - start) // 1000000
+
+    def healthy(self):
+        # Whether the socket can take another request without reconnecting
+        if self.socket is None or not self._done or self._close_after:
+            return False
+        if time.monotonic() - self._last_used > self.idle_timeout:
+            return False
+        try:
+            n = self.socket.recv_into(self._raw_view[self._end:self._end + 1])
+        except OSError as e:
+            return would_block(e)
+        # 0 is the peer closing, anything else is a stray response
+        return False
+
+    def ensure_connected(self):
+        # Returns True when it had to open a new connection
+        if self.healthy():
+            return False
+        self.close()
+        self.connect()
+        return True
+
+    def close(self):
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+            self.socket = None
+        self._done = True
+
+    async def _send(self, data):
+        view = memoryview(data)
+        sent = 0
+        deadline = time.monotonic() + self.timeout
+        while sent < len(data):
+            try:
+                n = self.socket.send(view[sent:])
+            except OSError as e:
+                if not would_block(e):
+                    raise
+                n = 0
+            if n:
+                sent += n
+            else:
+                if time.monotonic() > deadline:
+                    raise OSError(ETIMEDOUT)
+                await asyncio.sleep(0)
+
+    async def _fill(self):
+        # Reads more raw bytes, returns how many, 0 when the peer closed
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._raw):
+            if self._start == 0:
+                raise HTTPError("Line too long")
+            size = self._end - self._start
+            # Copy out first, the two ranges can overlap
+            self._raw[:size] = bytes(self._raw_view[self._start:self._end])
+            self._start = 0
+            self._end = size
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                n = self.socket.recv_into(self._raw_view[self._end:])
+            except OSError as e:
+                if not would_block(e):
+                    raise
+                if time.monotonic() > deadline:
+                    raise OSError(ETIMEDOUT)
+                await asyncio.sleep(0)
+                continue
+            self._end += n
+            return n
+
+    def _find_line_end(self):
+        # Index of the next CR LF, -1 when it isn't in yet. By hand, a
+        # bytearray has no find() on MicroPython. Lines are short, the
+        # search stops at the first one.
+        raw = self._raw
+        for i in range(self._start, self._end - 1):
+            if raw[i] == _CR and raw[i + 1] == _LF:
+                return i
+        return -1
+
+    async def _readline(self):
+        while True:
+            i = self._find_line_end()
+            if i >= 0:
+                line = bytes(self._raw_view[self._start:i])
+                self._start = i + 2
+                return line
+            if await self._fill() == 0:
+                raise HTTPError("Connection closed")
+
+    async def request(self, method, path, headers, body=None):
+        # Sends the request and reads the status line and headers. A reused
+        # connection the server has dropped in the meantime is reopened and
+        # the request sent again. body is bytes, or an object with a len()
+        # that iterates over the body in pieces and can do so more than once.
+        if not self.ensure_connected():
+            self.connect_ms = 0
+            try:
+                return await self._request(method, path, headers, body)
+            except (OSError, HTTPError) as e:
+                print("Reconnecting,", e)
+                self.close()
+                self.connect()
+        return await self._request(method, path, headers, body)
+
+    async def _request(self, method, path, headers, body):
+        self._done = False
+        lines = ["%s %s HTTP/1.1\r\nHost: %s\r\n" % (method, path, self._host_header)]
+        for name in headers:
+            lines.append("%s: %s\r\n" % (name, headers[name]))
+        if body is not None:
+            lines.append("Content-Length: %d\r\n" % len(body))
+        lines.append("\r\n")
+        head = "".join(lines).encode()
+        # As few writes as possible, a small one waits for the ACK of the
+        # previous one (Nagle + delayed ACK) on a kept-alive connection
+        if body is None:
+            await self._send(head)
+        elif isinstance(body, (bytes, bytearray)):
+            await self._send(head + body)
+        else:
+            out = bytearray(head)
+            for piece in body:
+                out.extend(piece)
+                if len(out) >= RAW_SIZE:
+                    await self._send(out)
+                    out = bytearray()
+            await self._send(out)
+
+        status_line = await self._readline()
+        self.status = int(status_line.split(b" ", 2)[1])
+        self.headers = {}
+        while True:
+            line = await self._readline()
+            if not line:
+                break
+            name, _, value = line.partition(b":")
+            self.headers[str(name.strip().lower(), "utf-8")] = str(value.strip(), "utf-8")
+        self._chunked = self.headers.get("transfer-encoding", "").lower() == "chunked"
+        length = self.headers.get("content-length")
+        self._remaining = int(length) if length is not None else None
+        # Without a length the body ends when the server closes
+        self._close_after = self.headers.get("connection", "").lower() == "close" or \
+            (self._remaining is None and not self._chunked)
+        self._done = self._remaining == 0
+        return self.status
+
+    async def readinto(self, buf):
+        # Reads body bytes into buf, returns 0 at the end of the body
+        while not self._done:
+            if self._chunked and not self._remaining:
+                line = await self._readline()
+                # The empty line ends the previous chunk
+                while not line:
+                    line = await self._readline()
+                size = int(line.split(b";", 1)[0], 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while await self._readline():
+                        pass
+                    self._done = True
+                    break
+                self._remaining = size
+            if self._start == self._end and await self._fill() == 0:
+                if self._remaining is not None:
+                    raise HTTPError("Connection closed")
+                self._done = True
+                break
+            n = min(len(buf), self._end - self._start)
+            if self._remaining is not None:
+                n = min(n, self._remaining)
+                self._remaining -= n
+                if self._remaining == 0 and not self._chunked:
+                    self._done = True
+            buf[:n] = self._raw_view[self._start:self._start + n]
+            self._start += n
+            return n
+        self._last_used = time.monotonic()
+        return 0
+
+    async def read(self):
+        # The whole body, for short error responses
+        out = bytearray()
+        buf = bytearray(256)
+        while True:
+            n = await self.readinto(buf)
+            if n == 0:
+                return bytes(out)
+            out.extend(memoryview(buf)[:n])
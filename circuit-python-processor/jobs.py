@@ -0,0 +1,78 @@
+# Prompts waiting for the network task, run one after another in the order
+# they were sent. Sending a prompt only queues it, so the next one can be
+# typed, or earlier answers scrolled through, while one streams. One at a
+# time because they share the screen, the typist and the conversation.
+from queues import BoundedQueue
+
+# Prompts that can wait behind the one streaming
+MAX_JOBS = 4
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    def __init__(self, number, prompt, inside_IDE, original=None):
+        self.number = number
+        self.prompt = prompt
+        self.inside_IDE = inside_IDE
+        # The selection an editing template was sent, see edits.py
+        self.original = original
+        self.status = QUEUED
+        self.result = None
+
+
+class JobQueue:
+    def __init__(self, maxsize=MAX_JOBS):
+        # None asks to open the API connection ahead of time
+        self._queue = BoundedQueue(maxsize)
+        self._next = 1
+        # Jobs queued and not started yet
+        self.waiting = 0
+        self.running = None
+        # The last job that ended, for the status line
+        self.last = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    def submit(self, prompt, inside_IDE, original=None):
+        # The queued job, None when the queue is full
+        job = Job(self._next, prompt, inside_IDE, original)
+        if not self._queue.put_nowait(job):
+            return None
+        self._next += 1
+        self.waiting += 1
+        return job
+
+    def warm_up(self):
+        if self.running is None and not len(self._queue):
+            self._queue.put_nowait(None)
+
+    async def get(self):
+        item = await self._queue.get()
+        if item is not None:
+            self.waiting -= 1
+            item.status = RUNNING
+            self.running = item
+        return item
+
+    def finish(self, job, status):
+        job.status = status
+        self.running = None
+        self.last = job
+
+    def status(self):
+        # One line for the top of the screen
+        if self.running is not None:
+            line = "Job %d running" % self.running.number
+        elif self.last is not None:
+            line = "Job %d %s" % (self.last.number, self.last.status)
+        else:
+            return ""
+        if self.waiting:
+            line += ", %d queued" % self.waiting
+        return line
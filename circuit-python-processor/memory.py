@@ -0,0 +1,112 @@
+# Decides when the heap gets collected, instead of a gc.collect() after
+# every response. gc.threshold makes the allocator collect on its own once
+# the heap is down to a low watermark, and the threshold is set again after
+# every collection from what is free then. Garbage left below the watermark
+# is collected in idle gaps, when no keystroke or token came in for a poll
+# interval, so the pauses land where nobody waits on them.
+import asyncio
+import gc
+
+# Collect once fewer bytes than this are free
+LOW_WATER = 24 * 1024
+# Collect in an idle gap once this much was allocated since the last time
+IDLE_ALLOCATED = 8 * 1024
+# Seconds without activity that count as an idle gap
+IDLE_SECONDS = 0.5
+# The allocator collects at most this often, in bytes allocated
+MIN_THRESHOLD = 4 * 1024
+
+
+def mem_free():
+    try:
+        return gc.mem_free()
+    except AttributeError:
+        # Not on CircuitPython
+        return None
+
+
+def mem_alloc():
+    try:
+        return gc.mem_alloc()
+    except AttributeError:
+        return None
+
+
+class MemoryManager:
+    def __init__(self, low_water=LOW_WATER, idle_allocated=IDLE_ALLOCATED,
+                 idle_seconds=IDLE_SECONDS, stage=None):
+        self.low_water = low_water
+        self.idle_allocated = idle_allocated
+        self.idle_seconds = idle_seconds
+        # Metrics stage timing the collections, optional
+        self.stage = stage
+        # Bumped by whoever is busy, the run task looks for it standing still
+        self.activity = 0
+        self.collections = 0
+        self.idle_collections = 0
+        self.watermark_collections = 0
+        # Least free heap seen by the run task
+        self.lowest_free = None
+        self._allocated = 0
+        # Without gc.threshold the run task checks the watermark
+        self.has_threshold = hasattr(gc, "threshold")
+        self._update()
+
+    def _update(self):
+        # Called after a collection, everything allocated from here on
+        # counts towards the next one
+        self._allocated = mem_alloc() or 0
+        free = mem_free()
+        if free is None:
+            return
+        if self.lowest_free is None or free < self.lowest_free:
+            self.lowest_free = free
+        if self.has_threshold:
+            gc.threshold(max(MIN_THRESHOLD, free - self.low_water))
+
+    def collect(self):
+        start = self.stage.start() if self.stage is not None else 0
+        gc.collect()
+        if start:
+            self.stage.end(start)
+        self.collections += 1
+        self._update()
+
+    def check(self):
+        # Collects when the heap is below the watermark or, in an idle gap,
+        # when enough was allocated since the last collection. Returns
+        # whether it collected.
+        free = mem_free()
+        if free is None:
+            return False
+        if self.lowest_free is None or free < self.lowest_free:
+            self.lowest_free = free
+        if free < self.low_water:
+            self.watermark_collections += 1
+            self.collect()
+            return True
+        return False
+
+    async def run(self):
+        seen = self.activity
+        while True:
+            await asyncio.sleep(self.idle_seconds)
+            if self.activity != seen:
+                seen = self.activity
+                # Only the watermark, the allocator checks it otherwise
+                if not self.has_threshold:
+                    self.check()
+                continue
+            if self.check():
+                continue
+            allocated = mem_alloc()
+            if allocated is not None and allocated - self._allocated > self.idle_allocated:
+                self.idle_collections += 1
+                self.collect()
+
+    def summary(self):
+        line = "GC: %d collections, %d idle, %d at the watermark" % (
+            self.collections, self.idle_collections, self.watermark_collections)
+        if self.lowest_free is not None:
+            line += ", lowest free %d bytes" % self.lowest_free
+        return line
@@ -0,0 +1,164 @@
+# Timings of the hot paths, kept on the board. Every stage keeps its last
+# samples in a fixed ring buffer of microseconds, so recording never
+# allocates beyond the time.monotonic_ns() call, and a disabled stage only
+# checks a flag. Summaries are printed on the serial console and served on
+# the clipboard port, see code.py.
+#
+# With allocations on, every span also counts the heap it allocated. That
+# asks gc.mem_alloc() twice per span, which walks the heap's allocation
+# table, so it is only for finding where the garbage comes from.
+#
+#   curl http://<board ip>:5000/metrics
+import array
+import asyncio
+import gc
+import time
+from http_client import would_block
+from memory import mem_alloc
+
+SAMPLES = 64
+# Bytes of request read before answering
+REQUEST_SIZE = 256
+
+
+class Stage:
+    def __init__(self, name, samples=SAMPLES, enabled=True, allocations=False):
+        self.name = name
+        self.enabled = enabled
+        self.allocations = allocations
+        self._samples = array.array("L", [0] * samples)
+        self.count = 0
+        self.max_us = 0
+        # Bytes allocated inside the spans, with allocations on
+        self.allocated = 0
+        self._alloc_start = 0
+
+    def start(self):
+        # 0 when disabled, end then records nothing
+        if not self.enabled:
+            return 0
+        if self.allocations:
+            self._alloc_start = mem_alloc() or 0
+        return time.monotonic_ns()
+
+    def end(self, start, exclude=0):
+        # Records the time since start less exclude, returns it in ns so
+        # an enclosing stage can exclude it
+        if not start:
+            return 0
+        elapsed = time.monotonic_ns() - start - exclude
+        if self.allocations:
+            # Less than before when a collection ran inside the span
+            self.allocated += max(0, (mem_alloc() or 0) - self._alloc_start)
+        us = elapsed // 1000
+        self._samples[self.count % len(self._samples)] = us
+        self.count += 1
+        if us > self.max_us:
+            self.max_us = us
+        return elapsed
+
+    def percentiles(self):
+        # (p50, p99) of the samples in the ring, in us
+        size = min(self.count, len(self._samples))
+        if not size:
+            return 0, 0
+        samples = sorted(self._samples[:size])
+        return samples[size // 2], samples[min(size - 1, size * 99 // 100)]
+
+    def reset(self):
+        self.count = 0
+        self.max_us = 0
+        self.allocated = 0
+
+
+class TimedDevice:
+    # A HID device whose reports are timed by a stage
+    def __init__(self, device, stage):
+        self.device = device
+        self.stage = stage
+
+    def send_report(self, report):
+        start = self.stage.start()
+        self.device.send_report(report)
+        self.stage.end(start)
+
+
+class Metrics:
+    def __init__(self, enabled=True, samples=SAMPLES, allocations=False):
+        self.enabled = enabled
+        self.samples = samples
+        self.allocations = allocations
+        self.stages = []
+        # Extra lines for the summary, like the heap manager's
+        self.reporters = []
+
+    def stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        stage = Stage(name, self.samples, self.enabled, self.allocations)
+        self.stages.append(stage)
+        return stage
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def summary(self):
+        lines = ["stage          count   p50 us   p99 us   max us" + ("   alloc B" if self.allocations else "")]
+        for stage in self.stages:
+            p50, p99 = stage.percentiles()
+            line = "%-12s %7d %8d %8d %8d" % (stage.name, stage.count, p50, p99, stage.max_us)
+            if self.allocations:
+                line += " %9d" % stage.allocated
+            lines.append(line)
+        try:
+            lines.append("heap %d bytes free, %d used" % (gc.mem_free(), gc.mem_alloc()))
+        except AttributeError:
+            # Not on CircuitPython
+            pass
+        for reporter in self.reporters:
+            lines.append(reporter())
+        if not self.enabled:
+            lines.append("metrics disabled, set METRICS = 1 in settings.toml")
+        return "\n".join(lines) + "\n"
+
+
+async def serve(conn, metrics, timeout):
+    # Answers one request on an accepted connection, HTTP or a bare line
+    conn.settimeout(0)
+    # bytes, a bytearray has no find() on MicroPython. Requests are short.
+    request = b""
+    buf = bytearray(64)
+    deadline = time.monotonic() + timeout
+    try:
+        while b"\n" not in request and len(request) < REQUEST_SIZE:
+            try:
+                size = conn.recv_into(buf)
+            except OSError as e:
+                if not would_block(e):
+                    raise
+                if time.monotonic() > deadline:
+                    return False
+                await asyncio.sleep(0.01)
+                continue
+            if size == 0:
+                break
+            request += bytes(buf[:size])
+        http = request.startswith(b"GET ")
+        if request.find(b"metrics") < 0:
+            body = "Unknown request\n"
+            status = "404 Not Found"
+        else:
+            if request.find(b"reset") >= 0:
+                metrics.reset()
+            body = metrics.summary()
+            status = "200 OK"
+        conn.settimeout(timeout)
+        if http:
+            conn.send(("HTTP/1.0 %s\r\nContent-Type: text/plain\r\nContent-Length: %d\r\nConnection: close\r\n\r\n"
+                       % (status, len(body))).encode())
+        conn.send(body.encode())
+        return True
+    finally:
+        conn.close()
@@ -0,0 +1,77 @@
+# The prompt being put together before it is sent: keys typed on the
+# keyboard and text from the PC. A clipboard too big for RAM, see
+# clipboard.py, stays on flash as a part of its own. It is only ever read
+# piece by piece, for the screen and while the request body is written, so
+# a big paste never has to fit on the heap.
+
+
+class Prompt:
+    def __init__(self, parts=None):
+        # Text as str, clipboards on flash as clipboard.Clipboard
+        self.parts = [] if parts is None else parts
+
+    def type(self, text):
+        if self.parts and isinstance(self.parts[-1], str):
+            self.parts[-1] += text
+        else:
+            self.parts.append(text)
+
+    def paste(self, clipboard):
+        if clipboard.path is None:
+            self.type(clipboard.read())
+        else:
+            self.parts.append(clipboard)
+
+    def backspace(self):
+        if not self.parts:
+            return
+        part = self.parts[-1]
+        if isinstance(part, str) and len(part) > 1:
+            self.parts[-1] = part[:-1]
+            return
+        # A clipboard on flash goes as a whole
+        self.parts.pop()
+        if not isinstance(part, str):
+            part.remove()
+
+    def only(self, clipboard):
+        # Whether nothing but the clipboard was put in
+        if clipboard is None or len(self.parts) != 1:
+            return False
+        if clipboard.path is None:
+            return self.parts[0] == clipboard.read()
+        return self.parts[0] is clipboard
+
+    def build(self, template):
+        # What is sent, the template first. A str unless a clipboard is on
+        # flash, then a Prompt that owns the clipboard files from here.
+        parts = [template] + self.parts if template else list(self.parts)
+        for part in parts:
+            if not isinstance(part, str):
+                return Prompt(parts)
+        return "".join(parts)
+
+    def chunks(self):
+        for part in self.parts:
+            if isinstance(part, str):
+                yield part
+            else:
+                yield from part.chunks()
+
+    def preview(self, limit):
+        # The first limit characters, for the screen and the console
+        text = ""
+        chunks = self.chunks()
+        for chunk in chunks:
+            text += chunk[:limit - len(text)]
+            if len(text) >= limit:
+                break
+        # Closes a clipboard file left open
+        chunks.close()
+        return text
+
+    def remove(self):
+        for part in self.parts:
+            if not isinstance(part, str):
+                part.remove()
+        self.parts = []
@@ -0,0 +1,50 @@
+# CircuitPython's asyncio has no Queue, this is the small subset the tasks
+# in code.py need. Queues are bounded so a slow consumer can't eat the heap.
+import asyncio
+
+
+class BoundedQueue:
+    def __init__(self, maxsize, drop_oldest=False):
+        self.maxsize = maxsize
+        # When full, drop the oldest item instead of refusing the new one.
+        # For things like screen updates where only the latest one matters.
+        self.drop_oldest = drop_oldest
+        self._items = []
+        self._event = asyncio.Event()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def full(self):
+        return len(self._items) >= self.maxsize
+
+    def put_nowait(self, item):
+        if len(self._items) >= self.maxsize:
+            self.dropped += 1
+            if not self.drop_oldest:
+                return False
+            self._items.pop(0)
+        self._items.append(item)
+        self._event.set()
+        return True
+
+    async def put(self, item):
+        while len(self._items) >= self.maxsize:
+            await asyncio.sleep(0)
+        self.put_nowait(item)
+
+    def get_nowait(self):
+        # None when empty
+        if not self._items:
+            return None
+        return self._items.pop(0)
+
+    async def get(self):
+        while not self._items:
+            self._event.clear()
+            await self._event.wait()
+        return self._items.pop(0)
+
+    def clear(self):
+        del self._items[:]
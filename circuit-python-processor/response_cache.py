@@ -0,0 +1,173 @@
+# Responses kept on flash, so sending the same prompt again replays the
+# answer instead of going to the API.
+#
+# One file per entry, named after the crc32 of the key. The file starts with
+# the time it was written, the boot it was written in and the key itself,
+# which is compared on lookup since crc32 can collide. The index of sizes
+# and last use stays in RAM and is rebuilt from the directory at boot.
+#
+# Without a set RTC the clock starts over at boot, so the age of an entry
+# from an earlier boot is unknown. With a TTL those count as expired.
+import binascii
+import os
+import time
+
+CACHE_DIR = "/cache"
+MAX_BYTES = 64 * 1024
+# Stored after every token, pages break between tokens so a replay has to
+# add the same tokens to page and type exactly like the stream did
+TOKEN_SEPARATOR = "\x1e"
+# Different at every boot
+BOOT = binascii.hexlify(os.urandom(4)).decode()
+
+
+def cache_key(model, prompt):
+    # The template is already the start of the prompt
+    return model + "\n" + prompt
+
+
+def iter_tokens(text):
+    start = 0
+    while True:
+        end = text.find(TOKEN_SEPARATOR, start)
+        if end < 0:
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+class ResponseCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, ttl=None, boot=BOOT):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Seconds an entry stays valid, None to keep entries until evicted
+        self.ttl = ttl
+        self.boot = boot
+        # name -> [size, written at, last use, boot]
+        self._index = {}
+        self._clock = 0
+        self.total = 0
+        self.writable = True
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    def __len__(self):
+        return len(self._index)
+
+    def _name(self, key):
+        return "%08x" % (binascii.crc32(key.encode()) & 0xFFFFFFFF)
+
+    def _path(self, name):
+        return self.directory + "/" + name
+
+    def _load(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            try:
+                os.mkdir(self.directory)
+            except OSError:
+                # Read-only filesystem, see boot.py
+                self.writable = False
+            return
+        for name in names:
+            try:
+                size = os.stat(self._path(name))[6]
+                with open(self._path(name), "rb") as f:
+                    fields = f.readline().decode().split()
+                written = int(fields[0])
+            except (OSError, ValueError, IndexError):
+                continue
+            # Entries from before the boot was stored have none
+            boot = fields[1] if len(fields) > 1 else None
+            self._clock += 1
+            self._index[name] = [size, written, self._clock, boot]
+            self.total += size
+
+    def _expired(self, entry):
+        if self.ttl is None:
+            return False
+        # From an earlier boot, its age is unknown
+        if entry[3] != self.boot:
+            return True
+        return time.time() - entry[1] > self.ttl
+
+    def _remove(self, name):
+        entry = self._index.pop(name, None)
+        if entry is not None:
+            self.total -= entry[0]
+        try:
+            os.remove(self._path(name))
+        except OSError:
+            pass
+
+    def get(self, key):
+        # The cached response for key, None on a miss
+        name = self._name(key)
+        entry = self._index.get(name)
+        if entry is None or self._expired(entry):
+            if entry is not None:
+                self._remove(name)
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(name), "rb") as f:
+                f.readline()
+                key_length = int(f.readline().decode())
+                stored_key = f.read(key_length)
+                if stored_key != key.encode():
+                    self.misses += 1
+                    return None
+                text = str(f.read(), "utf-8")
+        except (OSError, ValueError):
+            self._remove(name)
+            self.misses += 1
+            return None
+        self._clock += 1
+        entry[2] = self._clock
+        self.hits += 1
+        return text
+
+    def _evict(self, size):
+        while self._index and self.total + size > self.max_bytes:
+            oldest = None
+            for name in self._index:
+                if oldest is None or self._index[name][2] < self._index[oldest][2]:
+                    oldest = name
+            self._remove(oldest)
+            self.evictions += 1
+
+    def put(self, key, text):
+        if not self.writable:
+            return False
+        key_bytes = key.encode()
+        data = text.encode()
+        written = int(time.time())
+        header = ("%d %s\n%d\n" % (written, self.boot, len(key_bytes))).encode()
+        size = len(header) + len(key_bytes) + len(data)
+        # An entry that would push out most of the others isn't worth it
+        if size > self.max_bytes // 2:
+            return False
+        name = self._name(key)
+        self._remove(name)
+        self._evict(size)
+        try:
+            with open(self._path(name), "wb") as f:
+                f.write(header)
+                f.write(key_bytes)
+                f.write(data)
+        except OSError as e:
+            print("Response cache disabled:", e)
+            self.writable = False
+            self._remove(name)
+            return False
+        self._clock += 1
+        self._index[name] = [size, written, self._clock, self.boot]
+        self.total += size
+        return True
+
+    def clear(self):
+        for name in list(self._index):
+            self._remove(name)
@@ -0,0 +1,92 @@
+# Picking an answer up again when its stream breaks off. The part already
+# shown and typed stays where it is, the request is sent again with that
+# part as the assistant's message and a request to go on from there.
+#
+# Models often start the answer over, or repeat its last words, so the
+# start of the continuation is held back until it is clear where it joins
+# the answer so far. Only what comes after that goes out.
+
+# Times a broken answer is picked up again before it is left cut short
+RETRIES = 3
+# Pause before the first try, doubled every try up to the max
+RETRY_SECONDS = 1
+MAX_RETRY_SECONDS = 8
+CONTINUE_PROMPT = "Your answer was cut off. Continue it exactly where it stops, without repeating anything."
+# Characters at the end of the answer so far a continuation may repeat
+WINDOW = 1024
+# Shorter repeats are taken as chance, like a space or a common word
+MIN_OVERLAP = 8
+
+
+def continuation(answer):
+    # Messages sent after the conversation, see conversation.RequestBody
+    return (("assistant", answer), ("user", CONTINUE_PROMPT))
+
+
+class Overlap:
+    def __init__(self, answer, window=WINDOW, min_overlap=MIN_OVERLAP):
+        self.answer = answer
+        # Where the continuation can pick up from: the start of the answer,
+        # or a late enough point to repeat at least min_overlap characters
+        self._candidates = [0] + list(range(max(1, len(answer) - window), len(answer) - min_overlap + 1))
+        self._pending = ""
+        # Characters of the continuation dropped as a repeat
+        self.repeated = 0
+
+    def _join(self, start):
+        text = self._pending[len(self.answer) - start:]
+        self.repeated = len(self._pending) - len(text)
+        self._candidates = None
+        self._pending = ""
+        return text
+
+    def feed(self, text):
+        # What of text goes out, "" while it is held back. Starting over is
+        # taken once the whole answer came again. Otherwise the shortest
+        # repeat of its end is, text that really repeats itself, like a
+        # line of a list, stays.
+        if self._candidates is None:
+            return text
+        self._pending += text
+        pending = self._pending
+        answer = self.answer
+        possible = []
+        shortest = None
+        for start in self._candidates:
+            if len(pending) >= len(answer) - start:
+                if not pending.startswith(answer[start:]):
+                    continue
+                if start == 0:
+                    return self._join(0)
+                shortest = start
+                possible.append(start)
+            elif answer.startswith(pending, start):
+                possible.append(start)
+        if possible and possible[0] == 0:
+            # Could still be starting over
+            self._candidates = possible
+            return ""
+        if shortest is not None:
+            return self._join(shortest)
+        if possible:
+            self._candidates = possible
+            return ""
+        # New text from the first character
+        return self._join(len(answer))
+
+    def finish(self):
+        # What is still held back when the continuation ends
+        if self._candidates is None:
+            return ""
+        answer = self.answer
+        shortest = None
+        for start in self._candidates:
+            if self._pending.startswith(answer[start:]):
+                if start == 0:
+                    return self._join(0)
+                shortest = start
+        if shortest is not None:
+            return self._join(shortest)
+        # Only looked like a repeat so far, like a "." that is somewhere in
+        # the answer too. It is new text, the last of the answer.
+        return self._join(len(answer))
@@ -0,0 +1,60 @@
+# Text on the screen as one label per row, instead of one label for all of
+# it. Only rows whose text changed are set, so displayio only marks those
+# areas dirty, and the screen is refreshed once per update instead of after
+# every change. An optional status row above the text is refreshed along
+# with it.
+
+
+class RowDisplay:
+    def __init__(self, rows, refresh=None, status=None):
+        # Objects with a text attribute, top to bottom
+        self.rows = rows
+        # Called once after rows changed, display.refresh with auto_refresh off
+        self.refresh = refresh
+        self.status = status
+        self._status_text = ""
+        self._status_changed = False
+        self._texts = [""] * len(rows)
+        # Rows set and refreshes done, for measuring
+        self.updates = 0
+        self.refreshes = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def show_lines(self, lines):
+        # Lines past the last row are dropped, returns the rows that changed
+        changed = 0
+        for i in range(len(self.rows)):
+            text = lines[i] if i < len(lines) else ""
+            if text != self._texts[i]:
+                self._texts[i] = text
+                self.rows[i].text = text
+                changed += 1
+        if changed:
+            self.updates += changed
+        if changed or self._status_changed:
+            self._refresh()
+        return changed
+
+    def set_status(self, text):
+        # Shown with the next refresh, see flush
+        if self.status is None or text == self._status_text:
+            return
+        self._status_text = text
+        self.status.text = text
+        self._status_changed = True
+
+    def flush(self):
+        # Refreshes for a status change alone
+        if self._status_changed:
+            self._refresh()
+
+    def _refresh(self):
+        self._status_changed = False
+        self.refreshes += 1
+        if self.refresh is not None:
+            self.refresh()
+
+    def clear(self):
+        return self.show_lines(())
@@ -0,0 +1,76 @@
+# Prompts and selections sent from the PC over the USB serial data channel,
+# the second COM port that boot.py enables next to the console. Transfers
+# use the clipboard format with END after the payload, see clipboard.py:
+#   b"PNP", flags, length as a big endian u32, payload, END
+# and are answered with ACK or NAK on the same port. Text written without
+# the header, like send-selection-to-com-port.ahk does, ends once nothing
+# more came in for RAW_IDLE seconds.
+#
+# Reads take everything waiting at once into the receiver's buffer, the
+# task only polls in_waiting while nothing comes in.
+import time
+from clipboard import ClipboardReceiver, END, TIMEOUT
+from http_client import EAGAIN
+
+# Seconds without data that end a transfer without a header
+RAW_IDLE = 0.25
+# Seconds between polls while the channel is quiet
+POLL = 0.05
+SPILL_DIR = "/serial"
+
+
+class SerialStream:
+    # A usb_cdc.Serial with the socket calls ClipboardReceiver makes. A read
+    # with nothing waiting would block, after RAW_IDLE it's the end.
+    def __init__(self, serial, idle=RAW_IDLE):
+        self.serial = serial
+        self.idle = idle
+        serial.timeout = 0
+        self._last = 0
+        self.bytes = 0
+
+    def begin(self):
+        self._last = time.monotonic()
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv_into(self, view):
+        waiting = self.serial.in_waiting
+        if not waiting:
+            if time.monotonic() - self._last > self.idle:
+                return 0
+            raise OSError(EAGAIN)
+        size = self.serial.readinto(view[:min(waiting, len(view))])
+        self._last = time.monotonic()
+        self.bytes += size
+        return size
+
+    def send(self, data):
+        return self.serial.write(data)
+
+    def close(self):
+        pass
+
+
+class SerialReceiver:
+    def __init__(self, serial, spill_dir=SPILL_DIR, timeout=TIMEOUT):
+        self.stream = SerialStream(serial)
+        self.receiver = ClipboardReceiver(spill_dir=spill_dir, timeout=timeout, end=END)
+        self.transfers = 0
+        self.failures = 0
+
+    @property
+    def waiting(self):
+        return self.stream.serial.in_waiting
+
+    async def receive(self):
+        # Returns a Clipboard, or None when the transfer failed
+        self.stream.begin()
+        clipboard = await self.receiver.receive_from(self.stream)
+        self.transfers += 1
+        if clipboard is None:
+            self.failures += 1
+            # The rest of a broken transfer would look like a new one
+            self.stream.serial.reset_input_buffer()
+        return clipboard
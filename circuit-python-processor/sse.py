@@ -0,0 +1,148 @@
+import json
+
+# Size of the chunks pulled from the response stream. Chunks are not padded,
+# a read returns as soon as the socket has some data, so this only bounds
+# the work done per read.
+SSE_CHUNK_SIZE = 512
+# Lines longer than this are dropped. OpenAI chat chunks are ~200 bytes.
+SSE_LINE_LIMIT = 2048
+
+_NEWLINE = b"\n"
+_DATA_PREFIX = b"data:"
+_DONE = b"[DONE]"
+_CONTENT_KEY = b'"delta":{"content":"'
+_QUOTE = b'"'
+_BACKSLASH = 92
+_CR = 13
+_SPACE = 32
+
+
+def _slow_content(line, start, end):
+    # Anything that isn't the standard delta shape: role chunk, finish chunk,
+    # content null, errors. These are a handful per response.
+    try:
+        data = json.loads(bytes(line[start:end]))
+        return data["choices"][0]["delta"].get("content")
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+def extract_content(line, start=0, end=None):
+    # Pull choices[0].delta.content out of a chat completion chunk without
+    # parsing the whole object. Falls back to json.loads when the payload
+    # doesn't have the expected shape.
+    if end is None:
+        end = len(line)
+    i = line.find(_CONTENT_KEY, start, end)
+    if i < 0:
+        return _slow_content(line, start, end)
+    i += len(_CONTENT_KEY)
+    j = line.find(_QUOTE, i, end)
+    escaped = False
+    while j > 0 and line[j - 1] == _BACKSLASH:
+        # A quote is only escaped by an odd number of backslashes
+        k = j - 1
+        while line[k] == _BACKSLASH:
+            k -= 1
+        if (j - 1 - k) % 2 == 0:
+            break
+        escaped = True
+        j = line.find(_QUOTE, j + 1, end)
+    if j < 0:
+        return _slow_content(line, start, end)
+    if escaped or line.find(b"\\", i, j) >= 0:
+        # Let json decode \n, \", \uXXXX, but only for the string itself
+        try:
+            return json.loads(bytes(line[i - 1:j + 1]))
+        except ValueError:
+            return _slow_content(line, start, end)
+    return str(line[i:j], "utf-8")
+
+
+class SSEDecoder:
+    # Splits a chunked Server-Sent-Events stream into "data:" payloads.
+    # Lines that sit entirely inside one chunk are handled in place in the
+    # bytes of the chunk, only the tail of a line that straddles two chunks
+    # is copied into a preallocated carry buffer.
+
+    def __init__(self, line_limit=SSE_LINE_LIMIT):
+        self._carry = bytearray(line_limit)
+        self._carry_view = memoryview(self._carry)
+        self._carry_len = 0
+        self._overflow = False
+        self.done = False
+        self.lines = 0
+
+    def reset(self):
+        self._carry_len = 0
+        self._overflow = False
+        self.done = False
+        self.lines = 0
+
+    def _stash(self, chunk, start, end):
+        n = end - start
+        if self._overflow or self._carry_len + n > len(self._carry):
+            self._overflow = True
+            return
+        self._carry_view[self._carry_len:self._carry_len + n] = memoryview(chunk)[start:end]
+        self._carry_len += n
+
+    def _data(self, chunk, size):
+        # Yields (buffer, start, end) for every data payload in chunk[:size].
+        # The buffer is only valid until the next item is requested.
+        if not isinstance(chunk, bytes):
+            # A bytearray has no find() on MicroPython, one copy per read
+            # leaves the searching to bytes
+            chunk = bytes(memoryview(chunk)[:size])
+        pos = 0
+        while pos < size:
+            nl = chunk.find(_NEWLINE, pos, size)
+            if nl < 0:
+                self._stash(chunk, pos, size)
+                return
+            if self._carry_len or self._overflow:
+                self._stash(chunk, pos, nl)
+                overflow = self._overflow
+                line = bytes(self._carry_view[:self._carry_len])
+                self._carry_len = 0
+                self._overflow = False
+                pos = nl + 1
+                if overflow:
+                    continue
+                start, end = 0, len(line)
+            else:
+                line = chunk
+                start, end = pos, nl
+                pos = nl + 1
+            if end > start and line[end - 1] == _CR:
+                end -= 1
+            if line.find(_DATA_PREFIX, start, start + len(_DATA_PREFIX)) != start:
+                continue
+            start += len(_DATA_PREFIX)
+            if start < end and line[start] == _SPACE:
+                start += 1
+            self.lines += 1
+            if end - start == len(_DONE) and line.find(_DONE, start, end) == start:
+                self.done = True
+                return
+            yield line, start, end
+
+    def iter_data(self, chunks):
+        for chunk in chunks:
+            yield from self._data(chunk, len(chunk))
+            if self.done:
+                return
+
+    def iter_content(self, chunks):
+        # Yields the delta content string of every chunk that has one
+        for line, start, end in self.iter_data(chunks):
+            content = extract_content(line, start, end)
+            if content is not None:
+                yield content
+
+    def feed(self, buf, size):
+        # Same as iter_content for one read of size bytes into buf
+        for line, start, end in self._data(buf, size):
+            content = extract_content(line, start, end)
+            if content is not None:
+                yield content
@@ -0,0 +1,139 @@
+# Incremental word wrapping for streamed text on a monospaced font.
+# Gives the same line breaks as adafruit_display_text.wrap_text_to_pixels,
+# including its quirks, but only ever looks at the newly added token.
+
+
+class TextLayout:
+    def __init__(self, max_width, max_rows, char_width=6, keep_pages=True):
+        self.max_width = max_width
+        self.max_rows = max_rows
+        self.char_width = char_width
+        # Without it pages are only returned, for callers that store them
+        self.keep_pages = keep_pages
+        # Characters that fit on one hyphenated line of a long word
+        self._hyphen_line = int(max_width // char_width) - 1
+        self.pages = []
+        self.reset_page()
+
+    def reset_page(self):
+        self._tokens = []
+        # Finished lines on this page
+        self.lines = 0
+        # Same meaning as `width` in wrap_text_to_pixels, it can be one
+        # space wider than the line really is
+        self.width = 0
+        # Characters really on the current line
+        self._partial = 0
+        self._firstword = True
+        self._index = 0
+        self._newline = True
+        # Length of the word still being streamed
+        self._word = 0
+
+    def _long_word(self, length):
+        # Returns (line breaks, characters on the last line) for a word that
+        # doesn't fit on a line and gets hyphenated
+        cw = self.char_width
+        extra = 0 if self._newline else cw
+        fits = int((self.max_width - extra) // cw) - self._partial - 1
+        if fits < 0:
+            fits = 0
+        if length <= fits:
+            return 0, length
+        rest = length - fits
+        breaks = (rest - 1) // self._hyphen_line
+        return breaks + 1, rest - breaks * self._hyphen_line
+
+    def _word_breaks(self, length):
+        ww = length * self.char_width
+        if ww > self.max_width:
+            return self._long_word(length)[0]
+        if self._firstword or self.width + self.char_width + ww < self.max_width:
+            return 0
+        return 1
+
+    def _commit_word(self, length):
+        cw = self.char_width
+        ww = length * cw
+        if ww > self.max_width:
+            breaks, last = self._long_word(length)
+            self.lines += breaks
+            self._partial = last
+            self.width = last * cw
+            self._firstword = False
+        elif self._firstword:
+            self._partial += length
+            self.width += ww
+            self._firstword = False
+        elif self.width + cw + ww < self.max_width:
+            if self._index > 0:
+                self._partial += 1
+            self._partial += length
+            self.width += ww + cw
+        else:
+            self.lines += 1
+            self._partial = length
+            self.width = ww
+        self._newline = False
+        self._index += 1
+
+    def _end_line(self):
+        self.lines += 1
+        self._partial = 0
+        self.width = 0
+        self._newline = True
+        self._index = 0
+
+    def _feed(self, text):
+        pos = 0
+        size = len(text)
+        while pos < size:
+            space = text.find(" ", pos)
+            newline = text.find("\n", pos)
+            if space < 0 and newline < 0:
+                self._word += size - pos
+                return
+            if newline < 0 or 0 <= space < newline:
+                end = space
+            else:
+                end = newline
+            self._commit_word(self._word + end - pos)
+            self._word = 0
+            if end == newline:
+                self._end_line()
+            pos = end + 1
+
+    @property
+    def rows(self):
+        # Lines the current page would wrap to right now
+        return self.lines + self._word_breaks(self._word) + 1
+
+    def text(self):
+        return "".join(self._tokens)
+
+    def add(self, token):
+        # Adds a streamed token. When it doesn't fit on the page anymore,
+        # the page is committed without it and returned, and the token
+        # starts the next page.
+        self._tokens.append(token)
+        self._feed(token)
+        if self.rows <= self.max_rows + 1 or len(self._tokens) == 1:
+            return None
+        self._tokens.pop()
+        page = "".join(self._tokens)
+        if self.keep_pages:
+            self.pages.append(page)
+        self.reset_page()
+        self._tokens.append(token)
+        self._feed(token)
+        return page
+
+    def finish(self):
+        # Commits whatever is left on the last page
+        page = self.text()
+        if page != "":
+            if self.keep_pages:
+                self.pages.append(page)
+            self.reset_page()
+            return page
+        return None
@@ -0,0 +1,62 @@
+# Rewrites streamed text into characters that can be shown with the built-in
+# font and typed on a US layout. One pass over the token with one dictionary
+# lookup per non-ASCII character, tokens that are all ASCII come back as is.
+#
+# The table maps code points to replacements and is loaded from a text file,
+# see transliteration.txt for the format.
+
+TRANSLITERATION_FILE = "/transliteration.txt"
+# What replaces a character missing from the table, None keeps it unchanged
+FALLBACK = "?"
+
+
+def load_table(path=TRANSLITERATION_FILE):
+    # Code point -> replacement, None when the file can't be read
+    table = {}
+    # Most replacements are the same few letters, share the strings
+    replacements = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                fields = line.rstrip("\r\n").split("\t", 1)
+                if len(fields) != 2:
+                    continue
+                try:
+                    code = int(fields[0], 16)
+                except ValueError:
+                    continue
+                replacement = replacements.get(fields[1])
+                if replacement is None:
+                    replacement = replacements[fields[1]] = fields[1]
+                table[code] = replacement
+    except OSError:
+        return None
+    return table
+
+
+class Transliterator:
+    def __init__(self, table, fallback=FALLBACK):
+        self.table = table
+        self.fallback = fallback
+        # Characters that had no replacement, to spot what the table lacks
+        self.unmapped = 0
+
+    def __call__(self, text):
+        # Only ASCII when every character is one byte in UTF-8
+        if len(text.encode()) == len(text):
+            return text
+        table = self.table
+        out = []
+        for character in text:
+            code = ord(character)
+            if code < 128:
+                out.append(character)
+                continue
+            replacement = table.get(code)
+            if replacement is None:
+                self.unmapped += 1
+                replacement = character if self.fallback is None else self.fallback
+            out.append(replacement)
+        return "".join(out)
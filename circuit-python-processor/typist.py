@@ -0,0 +1,164 @@
+# Types streamed text on the PC from its own task, so the response reader
+# only queues tokens and never waits for USB.
+#
+# Every character is one boot keyboard report that presses its key, which
+# also releases the previous one. A release report goes in only between two
+# presses of the same key and once the queue runs dry. Reports are paced to
+# at most keys_per_second, some applications drop keys when typed faster.
+#
+# The keyboard's own reports go to the PC on the same device, see hold.
+import asyncio
+import time
+from queues import BoundedQueue
+
+SHIFT_FLAG = 0x80
+LEFT_SHIFT = 0x02
+# Non-US # and ~, there is no such key on a US keyboard
+NON_US_HASH = 0x32
+
+KEYS_PER_SECOND = 100
+# Tokens are a few characters each
+QUEUE_SIZE = 256
+
+
+def build_report_table(keycode_to_ascii):
+    # ASCII character -> keycode, with SHIFT_FLAG set when it needs shift.
+    # 0 for characters that can't be typed.
+    table = bytearray(128)
+    for shifted in (0, 1):
+        for keycode in range(len(keycode_to_ascii)):
+            character = keycode_to_ascii[keycode][shifted]
+            if keycode == NON_US_HASH or not isinstance(character, str):
+                continue
+            code = ord(character)
+            if code >= 128 or (code < 32 and character not in "\n\t"):
+                continue
+            if not table[code]:
+                table[code] = keycode | (SHIFT_FLAG if shifted else 0)
+    return table
+
+
+class Typist:
+    def __init__(self, device, table, keys_per_second=KEYS_PER_SECOND, queue_size=QUEUE_SIZE):
+        self.device = device
+        self.table = table
+        self.queue = BoundedQueue(queue_size)
+        self.interval_ns = 1000000000 // keys_per_second
+        self.paused = False
+        # While the keyboard is in use, see hold
+        self.held = False
+        self.typing = False
+        self.typed = 0
+        self.reports = 0
+        self._report = bytearray(8)
+        self._next_ns = 0
+        # Bumped by cancel, a token being typed stops when it changes
+        self._generation = 0
+
+    @property
+    def busy(self):
+        return self.typing or len(self.queue) > 0
+
+    async def put(self, text):
+        # Waits while the queue is full, text put before a cancel is dropped.
+        # bytes are keycodes, pressed with shift when SHIFT_FLAG is set.
+        generation = self._generation
+        while self.queue.full():
+            await asyncio.sleep(0)
+        if generation == self._generation:
+            self.queue.put_nowait(text)
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def hold(self, held):
+        # Stops typing between two keys while keys on the keyboard are held
+        # or the next prompt is typed, they'd end up inside the answer. A
+        # report from the keyboard already let go of the typist's key, its
+        # own release would let go of the keyboard's.
+        if held and not self.held:
+            self._report[0] = 0
+            self._report[2] = 0
+        self.held = held
+
+    def cancel(self):
+        # Drops everything that isn't typed yet
+        self.queue.clear()
+        self._generation += 1
+        self.paused = False
+
+    async def flush(self):
+        # Returns once everything queued so far is typed
+        while self.busy:
+            await asyncio.sleep(0.01)
+
+    async def _send(self):
+        now = time.monotonic_ns()
+        if now < self._next_ns:
+            await asyncio.sleep((self._next_ns - now) / 1e9)
+            now = self._next_ns
+        else:
+            await asyncio.sleep(0)
+        # After an idle spell the next report goes out right away, the ceiling
+        # still holds while catching up
+        self._next_ns = now + self.interval_ns
+        if self.held:
+            # The keyboard took over while waiting, the report isn't sent
+            return False
+        try:
+            self.device.send_report(self._report)
+            self.reports += 1
+        except Exception:
+            pass
+        return True
+
+    async def _release(self):
+        if self._report[0] or self._report[2]:
+            self._report[0] = 0
+            self._report[2] = 0
+            await self._send()
+
+    async def _type(self, text):
+        # bytes are keycodes to press, see edits.py
+        keycodes = isinstance(text, bytes)
+        generation = self._generation
+        report = self._report
+        table = self.table
+        for character in text:
+            if keycodes:
+                code = character
+            else:
+                code = ord(character)
+                code = table[code] if code < 128 else 0
+            if not code:
+                continue
+            keycode = code & 0x7F
+            while True:
+                if self.paused or self.held:
+                    # A key held down while paused would auto-repeat
+                    await self._release()
+                    while (self.paused or self.held) and generation == self._generation:
+                        await asyncio.sleep(0.05)
+                if generation != self._generation:
+                    return
+                if keycode == report[2]:
+                    await self._release()
+                report[0] = LEFT_SHIFT if code & SHIFT_FLAG else 0
+                report[2] = keycode
+                # Held meanwhile, the key goes again once the keyboard is done
+                if await self._send():
+                    break
+            self.typed += 1
+
+    async def run(self):
+        while True:
+            text = self.queue.get_nowait()
+            if text is None:
+                self.typing = False
+                await self._release()
+                text = await self.queue.get()
+            self.typing = True
+            await self._type(text)
@@ -0,0 +1,164 @@
+# Wi-Fi in the background, so the keyboard works from the moment the board
+# boots whether or not a network is around. Connects to the first network
+# that answers, tries again a few times with a growing pause in between, and
+# connects again when the link drops.
+#
+# Every round blocks the keyboard for up to CONNECT_TIMEOUT per network, so
+# with no network in range it stops after ROUNDS rounds. It only tries again
+# when woken, for a prompt waiting to be sent, or once nothing was typed for
+# IDLE_SECONDS.
+#
+# The channel and BSSID of the last network joined are kept on flash, the
+# next boot connects to them directly instead of scanning for the SSID.
+# wifi.radio.connect still blocks for as long as an attempt takes, the
+# attempts are only spread out so the other tasks run in between.
+import asyncio
+import binascii
+import time
+
+CACHE_PATH = "/wifi.txt"
+# Seconds an attempt may take
+CONNECT_TIMEOUT = 5
+# Pause after a round of failed attempts, doubled every round up to the max
+RETRY_SECONDS = 1
+MAX_RETRY_SECONDS = 30
+# Failed rounds before it waits to be woken
+ROUNDS = 3
+# Seconds without typing before a round while waiting
+IDLE_SECONDS = 60
+# Seconds between checks while waiting
+WAKE_POLL = 1
+# Seconds between checks that the link is still up
+CHECK_SECONDS = 5
+
+
+def load_cache(path=CACHE_PATH):
+    # (ssid, channel, bssid) of the last network joined, or None
+    try:
+        with open(path, "r") as f:
+            ssid, channel, bssid = f.read().rstrip("\n").split("\t")
+        return ssid, int(channel), binascii.unhexlify(bssid)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cache(ssid, channel, bssid, path=CACHE_PATH):
+    try:
+        with open(path, "w") as f:
+            f.write("%s\t%d\t%s\n" % (ssid, channel, binascii.hexlify(bssid).decode()))
+    except OSError:
+        # Read-only filesystem, see boot.py. The next boot scans again.
+        pass
+
+
+class WifiManager:
+    def __init__(self, radio, networks, cache_path=CACHE_PATH, timeout=CONNECT_TIMEOUT,
+                 activity=None, rounds=ROUNDS, idle_seconds=IDLE_SECONDS):
+        self.radio = radio
+        # (ssid, password), the first one is tried first
+        self.networks = [network for network in networks if network[0]]
+        self.cache_path = cache_path
+        self.timeout = timeout
+        # Returns a count that changes with every key, see memory.py
+        self.activity = activity if activity is not None else lambda: 0
+        self.rounds = rounds
+        self.idle_seconds = idle_seconds
+        self.ready = asyncio.Event()
+        self.woken = False
+        self.ssid = None
+        self.attempts = 0
+        self.connects = 0
+        # Milliseconds the last successful connect took
+        self.connect_ms = None
+
+    @property
+    def connected(self):
+        connected = getattr(self.radio, "connected", None)
+        if connected is None:
+            connected = self.radio.ipv4_address is not None
+        return connected and self.ssid is not None
+
+    def _attempt(self, ssid, password, channel=0, bssid=None):
+        self.attempts += 1
+        start = time.monotonic_ns()
+        try:
+            if bssid is not None:
+                self.radio.connect(ssid, password, channel=channel, bssid=bssid, timeout=self.timeout)
+            else:
+                self.radio.connect(ssid, password, timeout=self.timeout)
+        except Exception as e:
+            print("Couldn't connect to", ssid + ":", e)
+            return False
+        self.connect_ms = (time.monotonic_ns() - start) // 1000000
+        self.ssid = ssid
+        self.connects += 1
+        try:
+            info = self.radio.ap_info
+            if bssid is None and info is not None:
+                save_cache(ssid, info.channel, info.bssid, self.cache_path)
+        except AttributeError:
+            pass
+        print("Connected to", ssid, "in", self.connect_ms, "ms, IP address is", self.radio.ipv4_address)
+        return True
+
+    async def connect(self):
+        # One round over the networks, the cached access point first
+        cached = load_cache(self.cache_path)
+        if cached is not None:
+            ssid, channel, bssid = cached
+            for network in self.networks:
+                if network[0] == ssid:
+                    if self._attempt(ssid, network[1], channel, bssid):
+                        return True
+                    await asyncio.sleep(0)
+        for ssid, password in self.networks:
+            if self._attempt(ssid, password):
+                return True
+            # Let the keyboard catch up between attempts
+            await asyncio.sleep(0)
+        return False
+
+    def wake(self):
+        # A prompt is waiting, try again now instead of at the next idle gap
+        if not self.ready.is_set():
+            self.woken = True
+
+    async def _wait(self):
+        # Until woken or nothing was typed for idle_seconds
+        seen = self.activity()
+        quiet = time.monotonic()
+        while not self.woken:
+            await asyncio.sleep(WAKE_POLL)
+            activity = self.activity()
+            if activity != seen:
+                seen = activity
+                quiet = time.monotonic()
+            elif time.monotonic() - quiet >= self.idle_seconds:
+                break
+
+    async def run(self):
+        retry = RETRY_SECONDS
+        failed = 0
+        while True:
+            if self.connected:
+                retry = RETRY_SECONDS
+                failed = 0
+                await asyncio.sleep(CHECK_SECONDS)
+                continue
+            if self.ssid is not None:
+                print("Wi-Fi connection lost")
+                self.ssid = None
+                self.ready.clear()
+            if failed >= self.rounds:
+                await self._wait()
+            self.woken = False
+            if await self.connect():
+                self.ready.set()
+                continue
+            failed += 1
+            if failed >= self.rounds:
+                print("No Wi-Fi, trying again once a prompt is sent")
+                continue
+            print("No Wi-Fi, trying again in", retry, "s")
+            await asyncio.sleep(retry)
+            retry = min(retry * 2, MAX_RETRY_SECONDS)
@@ -14,8 +14,37 @@
 #define UART_TX_PIN 4
 #define UART_RX_PIN 5
 
+#define FRAME_DELIMITER 0x00
+
 static usb_device_t *usb_device = NULL;
 
+// Consistent Overhead Byte Stuffing: the encoded report never contains
+// FRAME_DELIMITER, so the receiver can always tell where a report ends.
+// dst needs room for len + len / 254 + 1 bytes.
+static size_t cobs_encode(const uint8_t *src, size_t len, uint8_t *dst) {
+  size_t code_pos = 0;
+  size_t write = 1;
+  uint8_t code = 1;
+
+  for (size_t read = 0; read < len; read++) {
+    if (src[read] == 0) {
+      dst[code_pos] = code;
+      code = 1;
+      code_pos = write++;
+    } else {
+      dst[write++] = src[read];
+      code++;
+      if (code == 0xFF) {
+        dst[code_pos] = code;
+        code = 1;
+        code_pos = write++;
+      }
+    }
+  }
+  dst[code_pos] = code;
+  return write;
+}
+
 void core1_main() {
   sleep_ms(10);
 
@@ -41,6 +70,8 @@ int main() {
   uart_init(UART_ID, BAUD_RATE);
   gpio_set_function(UART_TX_PIN, GPIO_FUNC_UART);
   gpio_set_function(UART_RX_PIN, GPIO_FUNC_UART);
+  // Lets the receiver sync up without waiting for the end of a first report
+  uart_putc(UART_ID, FRAME_DELIMITER);
 
   sleep_ms(10);
 
@@ -65,7 +96,7 @@ int main() {
           }
 
           uint8_t temp[64];
-          char out[64];
+          uint8_t out[sizeof(temp) + sizeof(temp) / 254 + 2];
           int len = pio_usb_get_in_data(ep, temp, sizeof(temp));
 
           if (len > 0) {
@@ -73,9 +104,10 @@ int main() {
                    ep->ep_num);
             for (int i = 0; i < len; i++) {
               printf("%02x ", temp[i]);
-              uart_putc(UART_ID, temp[i]);
             }
-            uart_putc(UART_ID, 0xFF);
+            size_t out_len = cobs_encode(temp, len, out);
+            out[out_len++] = FRAME_DELIMITER;
+            uart_write_blocking(UART_ID, out, out_len);
             printf("\n");
           }
         }
@@ -0,0 +1,30 @@
+Param (
+        [Parameter(Position=0)]
+        [string]
+        $PortName = "COM8"
+)
+
+# The data COM port of the Pico W, the one after the console
+$Port = New-Object System.IO.Ports.SerialPort($PortName, 115200)
+$Port.ReadTimeout = 7000
+$Port.Open()
+
+$clipboard_text = Get-Clipboard
+$concatenated_string = $clipboard_text -join "`r`n"
+$concatenated_string = $concatenated_string -replace "`r", ""
+
+# Header: "PNP", flags, payload length as a big endian u32, then the payload
+# and ETX
+$Bytes = [System.Text.Encoding]::UTF8.GetBytes($concatenated_string)
+$Length = [System.BitConverter]::GetBytes([System.Net.IPAddress]::HostToNetworkOrder([int]$Bytes.Length))
+$Header = [byte[]]((0x50, 0x4E, 0x50, 0x00) + $Length)
+$Port.Write($Header, 0, $Header.Length)
+$Port.Write($Bytes, 0, $Bytes.Length)
+$Port.Write([byte[]](0x03), 0, 1)
+
+# Wait for the device to acknowledge the whole selection
+$Reply = $Port.ReadByte()
+if ($Reply -ne 6) {
+    Write-Error "Serial transfer failed"
+}
+$Port.Close()
@@ -19,15 +19,20 @@ Function Send-TCPMessage {
         $Address = [System.Net.IPAddress]::Parse($IP) 
         $Socket = New-Object System.Net.Sockets.TCPClient($Address,$Port) 
     
-        # Setup stream wrtier 
         $Stream = $Socket.GetStream() 
-        $Writer = New-Object System.IO.StreamWriter($Stream)
 
-        # Remove carriage returns
-        # Write message to stream
-        $Message | % {
-            $Writer.WriteLine($_)
-            $Writer.Flush()
+        # Header: "PNP", flags, payload length as a big endian u32
+        $Bytes = [System.Text.Encoding]::UTF8.GetBytes($Message)
+        $Length = [System.BitConverter]::GetBytes([System.Net.IPAddress]::HostToNetworkOrder([int]$Bytes.Length))
+        $Header = [byte[]]((0x50, 0x4E, 0x50, 0x00) + $Length)
+        $Stream.Write($Header, 0, $Header.Length)
+        $Stream.Write($Bytes, 0, $Bytes.Length)
+        $Stream.Flush()
+
+        # Wait for the device to acknowledge the whole clipboard
+        $Reply = $Stream.ReadByte()
+        if ($Reply -ne 6) {
+            Write-Error "Clipboard transfer failed"
         }
     
         # Close connection and stream
@@ -1,13 +1,17 @@
 setlocal enabledelayedexpansion
 set /a chunk_size=200
 set "filename=text.txt"
+rem The data COM port of the Pico W, the one after the console, see boot.py.
+rem Another one can be given as the first argument.
+set "port=COM8"
+if not "%~1"=="" set "port=%~1"
 
 powershell.exe -command "Get-Clipboard > %filename%"
 pause
 
 for /F "usebackq delims=" %%A in (`powershell -Command "Get-Content -Raw -Path '%filename%' | foreach { $chunk = $_.ToCharArray(); $i = 0; while ($i -lt $chunk.Length) { $start = $i; $end = $i + %chunk_size% - 1; if ($end -ge $chunk.Length) { $end = $chunk.Length - 1 }; $chunk[$start..$end] -join ''; $i += %chunk_size% } }"`) do (
-    mode COM7: baud=115200 data=8 parity=n stop=1 xon=on to=off 
-    echo %%A >COM7
-    mode COM7: baud=115200 data=8 parity=n stop=1 xon=off to=off 
-    mode COM7: baud=115200 data=8 parity=n stop=1 xon=off to=off 
+    mode %port%: baud=115200 data=8 parity=n stop=1 xon=on to=off 
+    echo %%A >%port%
+    mode %port%: baud=115200 data=8 parity=n stop=1 xon=off to=off 
+    mode %port%: baud=115200 data=8 parity=n stop=1 xon=off to=off 
 )
\ No newline at end of file